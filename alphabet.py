@@ -0,0 +1,158 @@
+from string import ascii_lowercase
+from text_normalizer import TextNormalizer
+import math
+import re
+
+################################################################################
+#
+# Alphabet
+#
+# The symbols a cipher works on.  Everything a cipher needs to know about
+#  them is worked out once here: which symbol is at each index, the index of
+#  each byte, the normalizer that turns text into symbols and the shift
+#  tables used by Caesar and Vigenere.  The default is lowercase a-z:
+#
+#   Alphabet('abcdefghijklmnopqrstuvwxyz0123456789')      6x6 Playfair
+#   Alphabet(pass_through=True)                          keeps spaces, etc.
+#
+# Symbols must be ascii.  With pass_through every other char is left where
+#  it is instead of being stripped.
+#
+################################################################################
+class Alphabet:
+    ############################################################################
+    #
+    # Function: __init__
+    #
+    # Purpose: Builds the index arrays and the normalizer
+    #
+    # Input:
+    #   letters -- string: The symbols in order, each one once
+    #   merges -- dict: Chars to treat as another symbol, e.g. {'j': 'i'}
+    #   pass_through -- bool: Leave chars that are not symbols in place
+    #
+    # Output:
+    #   None
+    #
+    ############################################################################
+    def __init__(self, letters=ascii_lowercase, merges=None, pass_through=False):
+        if not letters or not letters.isascii() or len(set(letters)) != len(letters):
+            raise ValueError('Alphabet needs distinct ascii symbols, got %r' % (letters,))
+        self.letters = letters
+        self.size = len(letters)
+        self.pass_through = pass_through
+        # index -> symbol and byte -> index, -1 for bytes that are not symbols
+        self.chars = letters.encode('ascii')
+        self.indexes = [-1] * 256
+        for i, letter in enumerate(self.chars):
+            self.indexes[letter] = i
+        self.normalizer = TextNormalizer(merges, letters, pass_through)
+        # Pass through text can hold any unicode char, which utf-8 keeps
+        #  out of the ascii range the tables change
+        self.encoding = 'utf-8' if pass_through else 'ascii'
+        # Every byte that is not a symbol, for pulling the symbols out of
+        #  pass through text
+        self.others = bytes([x for x in range(256) if self.indexes[x] < 0])
+        self.others_pattern = re.compile(b'([^' + re.escape(self.chars) + b']+)')
+        # Maps shift -> (encrypt_table, decrypt_table)
+        self.shift_tables = {}
+
+    ############################################################################
+    #
+    # Function: ShiftTables
+    #
+    # Purpose: Returns the encrypt and decrypt tables for a rotation through
+    #           the symbols.  Tables are built the first time a rotation is
+    #           used and cached afterwards.
+    #
+    # Input:
+    #   shift -- int: Amount to rotate by, 0 - size - 1
+    #
+    # Output:
+    #   (encrypt_table, decrypt_table) -- tuple (bytes, bytes): 256 byte tables
+    #                                      for use with bytes.translate
+    #
+    ############################################################################
+    def ShiftTables(self, shift):
+        if shift not in self.shift_tables:
+            encrypt_table = bytearray(range(256))
+            decrypt_table = bytearray(range(256))
+            for i, letter in enumerate(self.chars):
+                encrypt_table[letter] = self.chars[(i + shift) % self.size]
+                decrypt_table[letter] = self.chars[(i - shift) % self.size]
+            self.shift_tables[shift] = (bytes(encrypt_table), bytes(decrypt_table))
+        return self.shift_tables[shift]
+
+    ############################################################################
+    #
+    # Function: GridSize
+    #
+    # Purpose: Gives the side of the square table the symbols fill, for
+    #           Playfair
+    #
+    # Input:
+    #   None
+    #
+    # Output:
+    #   size -- int
+    #
+    ############################################################################
+    def GridSize(self):
+        side = math.isqrt(self.size)
+        if side * side != self.size:
+            raise ValueError('A %d symbol alphabet does not fill a square table' % self.size)
+        return side
+
+    ############################################################################
+    #
+    # Function: Letters
+    #
+    # Purpose: Pulls the symbols out of normalized pass through data
+    #
+    # Input:
+    #   data -- bytes: Normalized data
+    #
+    # Output:
+    #   letters -- bytes: Only the symbols, in order
+    #
+    ############################################################################
+    def Letters(self, data):
+        return data.translate(None, self.others)
+
+    ############################################################################
+    #
+    # Function: Scatter
+    #
+    # Purpose: Puts translated symbols back where the symbols of data were,
+    #           leaving everything else in place.  Undoes Letters.
+    #
+    # Input:
+    #   data -- bytes: Normalized data
+    #   letters -- bytes: One translated symbol for each symbol in data
+    #
+    # Output:
+    #   data -- bytes
+    #
+    ############################################################################
+    def Scatter(self, data, letters):
+        # Splitting on runs of other chars leaves symbol runs at the even
+        #  indexes, which are swapped for the same length of letters
+        pieces = self.others_pattern.split(data)
+        start = 0
+        for i in range(0, len(pieces), 2):
+            end = start + len(pieces[i])
+            pieces[i] = letters[start:end]
+            start = end
+        return b''.join(pieces)
+
+################################################################################
+#
+# end Alphabet
+#
+################################################################################
+
+# Plain a-z, used by most ciphers
+LOWERCASE = Alphabet()
+
+# a-z without j, which Playfair merges into i to fill a 5x5 table
+PLAYFAIR = Alphabet('abcdefghiklmnopqrstuvwxyz', {'j': 'i'})
@@ -0,0 +1,1141 @@
+from alphabet import Alphabet
+from caesar_cipher import CaesarCipher
+from cipher_chain import CipherChain
+from playfair_cipher import PlayfairCipher
+from rail_fence_cipher import RailFenceCipher
+from vigenre_cipher import VigenreCipher
+import argparse
+import bulk_encrypt
+import cipher_cache
+import cryptanalysis
+import json
+import metrics
+import numpy_backend
+import os
+import platform
+import playfair_cipher
+import playfair_search
+import rail_fence_cipher
+import random
+import re
+import sys
+import tempfile
+import text_normalizer
+import time
+import tracemalloc
+
+################################################################################
+#
+# Benchmarks
+#
+# Run with:
+#   python benchmark.py [size_in_mb]
+#       Compares the current code against the older implementations
+#   python benchmark.py suite [--sizes 1K,1M] [--output results.json]
+#                             [--baseline old.json] [--threshold 0.1]
+#       Runs every cipher over every size and key setting, writes the
+#       results as JSON and optionally fails on a throughput regression
+#
+################################################################################
+
+# Input sizes the suite runs by default
+SUITE_SIZES = '1K,10K,100K,1M,10M,100M'
+
+# Second dimension of the suite for each cipher.  Key length for Vigenre and
+#  Playfair, rail count for RailFence.  Caesar keys are all the same cost.
+SUITE_PARAMS = {
+    'CaesarCipher': [1],
+    'VigenreCipher': [1, 8, 64],
+    'RailFenceCipher': [2, 5, 20],
+    'PlayfairCipher': [5, 25],
+}
+
+# Number of SetKey calls timed per suite entry
+SETKEY_RUNS = 200
+
+# Stop repeating a measurement after this many seconds
+RUN_BUDGET = 2.0
+
+# Smallest text BenchChain times past the cached permutation length
+CHAIN_MIN_SIZE = 10 ** 6
+
+# Common English words.  Text made of them has English bigrams and doubled
+#  letters, which random letters with English frequencies do not.
+ENGLISH_WORDS = (
+    'the of and to in is it that was for on are with as his they be at one have this from or had by hot word but '
+    'what some we can out other were all there when up use your how said an each she which do their time if will '
+    'way about many then them write would like so these her long make thing see him two has look more day could '
+    'go come did number sound no most people my over know water than call first who may down side been now find '
+    'any new work part take get place made live where after back little only round man year came show every good '
+    'me give our under name very through just form sentence great think say help low line differ turn cause much '
+    'mean before move right boy old too same tell does set three want air well also play small end put home read '
+    'hand port large spell add even land here must big high such follow act why ask men change went light kind '
+    'off need house picture try us again animal point mother world near build self earth father'
+).split()
+
+################################################################################
+#
+# Function: LegacyCaesarEncrypt
+#
+# Purpose: The per character CaesarCipher.Encrypt that the translation tables
+#           replaced.  Kept here so the speedup can be measured.
+#
+# Input:
+#   plaintext -- string: Text to be encrypted
+#   rot_amount -- int: amount to rotate by
+#
+# Output:
+#   Encrypted text -- string
+#
+################################################################################
+def LegacyCaesarEncrypt(plaintext, rot_amount):
+    return ''.join([chr(((ord(x.lower()) - 97 + rot_amount) % 26) + 97) for x in re.sub(r'[\W0-9 ]', '', plaintext.lower())])
+
+################################################################################
+#
+# Function: LegacyRailFenceEncrypt
+#
+# Purpose: The rail by rail string building RailFenceCipher.Encrypt that the
+#           cached permutations replaced.  It lays letters out round robin
+#           instead of in a zigzag but does the same amount of work.
+#
+# Input:
+#   plaintext -- string: Text to be encrypted, already prepped
+#   num_rails -- int: Number of rails
+#
+# Output:
+#   Encrypted text -- string
+#
+################################################################################
+def LegacyRailFenceEncrypt(plaintext, num_rails):
+    rails = []
+    for i in range(num_rails):
+        rails.append('')
+    i = 0
+    while i < len(plaintext):
+        rails[i % num_rails] += plaintext[i]
+        i += 1
+    return ''.join(rails)
+
+################################################################################
+#
+# Function: MakeText
+#
+# Purpose: Builds mixed case text with spaces and punctuation
+#
+# Input:
+#   size -- int: Length of the text in chars
+#
+# Output:
+#   text -- string
+#
+################################################################################
+def MakeText(size):
+    sample = 'The Quick Brown Fox, jumps over 13 lazy dogs! '
+    return (sample * (size // len(sample) + 1))[:size]
+
+################################################################################
+#
+# Function: Throughput
+#
+# Purpose: Times func(text) and reports throughput
+#
+# Input:
+#   func -- function: Function to time
+#   text -- string: Input passed to func
+#   repeat -- int: Number of runs, the best one is reported
+#
+# Output:
+#   MB/s -- float
+#
+################################################################################
+def Throughput(func, text, repeat=3):
+    best = None
+    for i in range(repeat):
+        start = time.perf_counter()
+        func(text)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None or elapsed < best else best
+    return len(text) / best / 1e6
+
+################################################################################
+#
+# Function: BenchCaesar
+#
+# Purpose: Compares the table driven CaesarCipher against the legacy path
+#
+# Input:
+#   size -- int: Length of the text in chars
+#
+# Output:
+#   None
+#
+################################################################################
+def BenchCaesar(size):
+    text = MakeText(size)
+    cipher = CaesarCipher()
+    cipher.SetKey('3')
+    assert cipher.Encrypt(text) == LegacyCaesarEncrypt(text, 3)
+
+    legacy = Throughput(lambda x: LegacyCaesarEncrypt(x, 3), text)
+    table = Throughput(cipher.Encrypt, text)
+    print('caesar encrypt  legacy %8.2f MB/s  table %8.2f MB/s  (%.1fx)' % (legacy, table, table / legacy))
+    print('caesar decrypt                       table %8.2f MB/s' % Throughput(cipher.Decrypt, text))
+
+################################################################################
+#
+# Function: BenchRailFence
+#
+# Purpose: Compares the permutation based RailFenceCipher against the legacy
+#           string building path.  The first call includes building the
+#           permutation, later calls hit the cache.
+#
+# Input:
+#   size -- int: Length of the text in chars
+#
+# Output:
+#   None
+#
+################################################################################
+def BenchRailFence(size):
+    cipher = RailFenceCipher()
+    cipher.SetKey('5')
+    text = cipher.PrepStringForCipher(MakeText(size))
+
+    legacy = Throughput(lambda x: LegacyRailFenceEncrypt(x, 5), text, repeat=1)
+    cold = Throughput(cipher.Encrypt, text, repeat=1)
+    warm = Throughput(cipher.Encrypt, text)
+    print('rail encrypt    legacy %8.2f MB/s  cold  %8.2f MB/s  warm %8.2f MB/s' % (legacy, cold, warm))
+    print('rail decrypt                         warm  %8.2f MB/s' % Throughput(cipher.Decrypt, cipher.Encrypt(text)))
+
+################################################################################
+#
+# Function: BenchPlayfair
+#
+# Purpose: Times SetKey with a new key and with a cached key, then the
+#           table driven encrypt and decrypt
+#
+# Input:
+#   size -- int: Length of the text in chars
+#
+# Output:
+#   None
+#
+################################################################################
+def BenchPlayfair(size):
+    cipher = PlayfairCipher()
+    start = time.perf_counter()
+    cipher.SetKey('benchmark playfair key')
+    cold = time.perf_counter() - start
+    start = time.perf_counter()
+    cipher.SetKey('benchmark playfair key')
+    warm = time.perf_counter() - start
+    print('playfair setkey cold %8.1f us  cached %8.1f us' % (cold * 1e6, warm * 1e6))
+
+    text = MakeText(size)
+    print('playfair encrypt %8.2f MB/s  decrypt %8.2f MB/s' % (Throughput(cipher.Encrypt, text), Throughput(cipher.Decrypt, cipher.Encrypt(text))))
+
+################################################################################
+#
+# Function: BenchBackends
+#
+# Purpose: Compares numpy backend throughput against python.  The outputs
+#           are checked against each other in test_backends.py
+#
+# Input:
+#   size -- int: Length of the text in chars
+#
+# Output:
+#   None
+#
+################################################################################
+def BenchBackends(size):
+    if numpy_backend.numpy is None:
+        print('numpy is not installed, skipping backend comparison')
+        return
+    text = MakeText(size)
+    for cipher_class, key in [(CaesarCipher, '3'), (VigenreCipher, 'lemon'), (RailFenceCipher, '5'), (PlayfairCipher, 'monarchy')]:
+        cipher = cipher_class()
+        cipher.SetKey(key)
+        results = []
+        for backend in ('python', 'numpy'):
+            cipher.SetBackend(backend)
+            results.append(Throughput(cipher.Encrypt, text, repeat=1))
+        print('%-15s python %8.2f MB/s  numpy %8.2f MB/s' % (cipher_class.__name__, results[0], results[1]))
+
+################################################################################
+#
+# Function: BenchBatch
+#
+# Purpose: Compares calling Encrypt once per message against EncryptMany
+#           for batches of short messages
+#
+# Input:
+#   counts -- list: Batch sizes to run -- int
+#
+# Output:
+#   None
+#
+################################################################################
+def BenchBatch(counts):
+    sample = MakeText(4096)
+    for count in counts:
+        messages = [sample[i % 4000:i % 4000 + 32] for i in range(count)]
+        for cipher_class, key in [(CaesarCipher, '3'), (VigenreCipher, 'lemon'), (RailFenceCipher, '5'), (PlayfairCipher, 'monarchy')]:
+            cipher = cipher_class()
+            cipher.SetKey(key)
+            start = time.perf_counter()
+            [cipher.Encrypt(x) for x in messages]
+            loop = time.perf_counter() - start
+            start = time.perf_counter()
+            cipher.EncryptMany(messages)
+            batch = time.perf_counter() - start
+            print('%-15s %8d msgs  loop %10.0f msg/s  batch %10.0f msg/s' % (cipher_class.__name__, count, count / loop, count / batch))
+
+################################################################################
+#
+# Function: BenchParallel
+#
+# Purpose: Compares the serial path against EncryptParallel for 1 to N
+#           worker processes
+#
+# Input:
+#   size -- int: Length of the text in chars
+#   max_workers -- int: Largest pool to try, None for one per cpu
+#
+# Output:
+#   None
+#
+################################################################################
+def BenchParallel(size, max_workers=None):
+    text = MakeText(size)
+    max_workers = max_workers or os.cpu_count()
+    for cipher_class, key in [(CaesarCipher, '3'), (VigenreCipher, 'lemon'), (PlayfairCipher, 'monarchy')]:
+        cipher = cipher_class()
+        cipher.SetKey(key)
+        expected = cipher.Encrypt(text)
+        line = '%-15s serial %8.2f MB/s' % (cipher_class.__name__, Throughput(cipher.Encrypt, text, repeat=1))
+        for workers in range(1, max_workers + 1):
+            chunk_size = max(64 * 1024, size // (workers * 4))
+            assert cipher.EncryptParallel(text, workers, chunk_size) == expected
+            line += '  %dw %8.2f' % (workers, Throughput(lambda x: cipher.EncryptParallel(x, workers, chunk_size), text, repeat=1))
+        print(line)
+
+################################################################################
+#
+# Function: BenchNormalizer
+#
+# Purpose: Compares the translate based normalizer against the regex passes
+#           PrepStringForCipher used to run
+#
+# Input:
+#   size -- int: Length of the text in chars
+#
+# Output:
+#   None
+#
+################################################################################
+def BenchNormalizer(size):
+    text = MakeText(size)
+    playfair = PlayfairCipher.normalizer
+    assert text_normalizer.LETTERS.Normalize(text) == re.sub(r'[\W0-9 ]+', '', text.lower())
+    assert playfair.Normalize(text) == re.sub(r'[^a-z]+', '', re.sub(r'j', 'i', text.lower()))
+
+    regex = Throughput(lambda x: re.sub(r'[\W0-9 ]+', '', x.lower()), text)
+    table = Throughput(text_normalizer.LETTERS.Normalize, text)
+    print('normalize       regex  %8.2f MB/s  table %8.2f MB/s' % (regex, table))
+    regex = Throughput(lambda x: re.sub(r'[^a-z]+', '', re.sub(r'j', 'i', x.lower())), text)
+    table = Throughput(playfair.Normalize, text)
+    print('normalize j->i  regex  %8.2f MB/s  table %8.2f MB/s' % (regex, table))
+
+################################################################################
+#
+# Function: BenchBytes
+#
+# Purpose: Compares str input against bytes input and EncryptInto a
+#           preallocated buffer
+#
+# Input:
+#   size -- int: Length of the text in chars
+#
+# Output:
+#   None
+#
+################################################################################
+def BenchBytes(size):
+    text = MakeText(size)
+    data = text.encode('ascii')
+    out = bytearray(2 * len(data) + 1)
+    for cipher_class, key in [(CaesarCipher, '3'), (VigenreCipher, 'lemon'), (RailFenceCipher, '5'), (PlayfairCipher, 'monarchy')]:
+        cipher = cipher_class()
+        cipher.SetKey(key)
+        print('%-15s str %8.2f MB/s  bytes %8.2f MB/s  into %8.2f MB/s' % (cipher_class.__name__,
+              Throughput(cipher.Encrypt, text), Throughput(cipher.Encrypt, data), Throughput(lambda x: cipher.EncryptInto(x, out), data)))
+
+################################################################################
+#
+# Function: MakeEnglishText
+#
+# Purpose: Builds random letters with English letter frequencies.  Unlike
+#           MakeText it does not repeat, so key length estimates are not
+#           thrown off by the period of the sample.
+#
+# Input:
+#   size -- int: Number of letters
+#   seed -- int: Seed for the random letters
+#
+# Output:
+#   text -- string
+#
+################################################################################
+def MakeEnglishText(size, seed=0):
+    rng = random.Random(seed)
+    return ''.join(rng.choices('abcdefghijklmnopqrstuvwxyz', cryptanalysis.ENGLISH_FREQUENCIES, k=size))
+
+################################################################################
+#
+# Function: MakeEnglishWords
+#
+# Purpose: Builds text from random common English words
+#
+# Input:
+#   size -- int: Number of letters, rounded up to a whole word
+#   seed -- int: Seed for the words
+#
+# Output:
+#   text -- string: Words separated by spaces
+#
+################################################################################
+def MakeEnglishWords(size, seed=0):
+    rng = random.Random(seed)
+    words = []
+    letters = 0
+    while letters < size:
+        words.append(rng.choice(ENGLISH_WORDS))
+        letters += len(words[-1])
+    return ' '.join(words)
+
+################################################################################
+#
+# Function: BruteForceCaesar
+#
+# Purpose: Older way of finding a Caesar key, decrypts the whole text once
+#           per rotation and scores each result
+#
+# Input:
+#   ciphertext -- string: Ciphertext
+#
+# Output:
+#   shift -- int
+#
+################################################################################
+def BruteForceCaesar(ciphertext):
+    cipher = CaesarCipher()
+    scores = []
+    for shift in range(26):
+        cipher.SetKey(shift)
+        plaintext = cipher.Decrypt(ciphertext).encode('ascii')
+        scores.append(cryptanalysis.ChiSquared(cryptanalysis.ResidueHistograms(plaintext, 1)[0], 0))
+    return scores.index(min(scores))
+
+################################################################################
+#
+# Function: BenchCryptanalysis
+#
+# Purpose: Times key recovery for Caesar and Vigenre ciphertexts and checks
+#           the recovered keys
+#
+# Input:
+#   size -- int: Number of letters of ciphertext
+#
+# Output:
+#   None
+#
+################################################################################
+def BenchCryptanalysis(size):
+    text = MakeEnglishText(size)
+    caesar = CaesarCipher()
+    caesar.SetKey(11)
+    ciphertext = caesar.Encrypt(text)
+    start = time.perf_counter()
+    brute_shift = BruteForceCaesar(ciphertext)
+    brute_time = time.perf_counter() - start
+    start = time.perf_counter()
+    shift, plaintext = cryptanalysis.CrackCaesar(ciphertext)
+    crack_time = time.perf_counter() - start
+    print('Caesar      %.1f MB  brute force %.3f s  histogram %.3f s  key ok: %s' %
+          (size / 1e6, brute_time, crack_time, shift == brute_shift == 11 and plaintext == text))
+
+    vigenre = VigenreCipher()
+    for key in ['lemon', 'cryptanalysis', 'thequickbrownfoxjum']:
+        vigenre.SetKey(key)
+        ciphertext = vigenre.EncryptBytes(text.encode('ascii'))
+        start = time.perf_counter()
+        found, plaintext = cryptanalysis.CrackVigenre(ciphertext)
+        print('Vigenre %2d  %.1f MB  %8.2f MB/s  key ok: %s' %
+              (len(key), size / 1e6, size / (time.perf_counter() - start) / 1e6, found == key and plaintext == text.encode('ascii')))
+
+################################################################################
+#
+# Function: BenchPlayfairSearch
+#
+# Purpose: Reports how many candidate key tables the Playfair key search
+#           scores per second, in one process and across a pool.  The
+#           quadgrams come from MakeEnglishText, which is enough to time
+#           the search but not to recover a key; that needs a table built
+#           from real English.
+#
+# Input:
+#   length -- int: Number of letters of ciphertext
+#   iterations -- int: Candidates scored per climb
+#
+# Output:
+#   None
+#
+################################################################################
+def BenchPlayfairSearch(length=800, iterations=5000):
+    quadgrams = playfair_search.BuildQuadgrams(MakeEnglishText(100000))
+    cipher = PlayfairCipher()
+    cipher.SetKey('playfairexample')
+    ciphertext = cipher.Encrypt(MakeEnglishText(length, 1))
+    workers = os.cpu_count() or 1
+    for pool_size, restarts in [(1, 2), (workers, 2 * workers)]:
+        key, plaintext, stats = playfair_search.SearchKey(ciphertext, quadgrams, restarts, iterations, pool_size, seed=0)
+        print('Playfair search  %3d workers  %8d candidates  %10.0f candidates/s' % (pool_size, stats['candidates'], stats['candidates_per_second']))
+
+################################################################################
+#
+# Function: BenchCache
+#
+# Purpose: Compares building and keying a cipher for every request against
+#           taking it from a CipherCache
+#
+# Input:
+#   requests -- int: Number of requests
+#   keys -- int: Number of different keys the requests use, more than
+#                 playfair_cipher keeps tables for by default
+#
+# Output:
+#   None
+#
+################################################################################
+def BenchCache(requests=20000, keys=1000):
+    rng = random.Random(0)
+    message = MakeText(64)
+    for name, cipher_class in [('vigenere', VigenreCipher), ('playfair', PlayfairCipher)]:
+        key_list = [MakeSuiteKey(cipher_class.__name__, 8, rng) for i in range(keys)]
+        picks = [rng.choice(key_list) for i in range(requests)]
+        # Playfair keeps its own table cache, clear it so both runs build
+        #  the same tables
+        playfair_cipher.key_tables.clear()
+        start = time.perf_counter()
+        for key in picks:
+            cipher = cipher_class()
+            cipher.SetKey(key)
+            cipher.Encrypt(message)
+        fresh_time = time.perf_counter() - start
+
+        playfair_cipher.key_tables.clear()
+        cache = cipher_cache.CipherCache()
+        start = time.perf_counter()
+        for key in picks:
+            cache.Get(name, key).Encrypt(message)
+        cached_time = time.perf_counter() - start
+        print('%-9s new instance %8.0f req/s  cached %8.0f req/s  %s' %
+              (name, requests / fresh_time, requests / cached_time, cache.Stats()))
+
+################################################################################
+#
+# Function: BenchVigenreLetters
+#
+# Purpose: Compares the per letter EncryptLetter loop against the
+#           strided translate that Encrypt uses
+#
+# Input:
+#   size -- int: Number of chars of plaintext
+#
+# Output:
+#   None
+#
+################################################################################
+def BenchVigenreLetters(size):
+    cipher = VigenreCipher()
+    cipher.SetKey('lemon')
+    text = MakeText(size)
+
+    def ByLetter(plaintext):
+        return ''.join([cipher.EncryptLetter(x, i) for i, x in enumerate(cipher.PrepStringForCipher(plaintext))])
+
+    print('Vigenre EncryptLetter %8.2f MB/s  Encrypt %8.2f MB/s' % (Throughput(ByLetter, text, 1), Throughput(cipher.Encrypt, text)))
+
+################################################################################
+#
+# Function: BenchMetrics
+#
+# Purpose: Times small calls with metrics off and on, then prints the
+#           profile of a mixed block of calls
+#
+# Input:
+#   size -- int: Length of the text for the profiled block
+#
+# Output:
+#   None
+#
+################################################################################
+def BenchMetrics(size):
+    message = MakeText(64)
+    ciphers = []
+    for cipher_class, key in [(CaesarCipher, '3'), (VigenreCipher, 'lemon'), (RailFenceCipher, '5'), (PlayfairCipher, 'monarchy')]:
+        cipher = cipher_class()
+        cipher.SetKey(key)
+        ciphers.append(cipher)
+
+    def SmallCalls():
+        start = time.perf_counter()
+        for i in range(20000):
+            for cipher in ciphers:
+                cipher.Encrypt(message)
+        return (time.perf_counter() - start) / (20000 * len(ciphers)) * 1e6
+
+    disabled = min([SmallCalls() for i in range(3)])
+    with metrics.Profile():
+        enabled = min([SmallCalls() for i in range(3)])
+    print('Metrics off %.2f us/call  on %.2f us/call' % (disabled, enabled))
+
+    text = MakeText(size)
+    with metrics.Profile() as profile:
+        for cipher in ciphers:
+            cipher.Decrypt(cipher.Encrypt(text))
+            cipher.EncryptBytes(text.encode('ascii'))
+        PlayfairCipher().SetKey('a fresh key')
+    print(profile.Report())
+
+################################################################################
+#
+# Function: BenchAlphabet
+#
+# Purpose: Checks that other alphabets round trip and compares their speed
+#           against the default a-z tables
+#
+# Input:
+#   size -- int: Length of the text in chars
+#
+# Output:
+#   None
+#
+################################################################################
+def BenchAlphabet(size):
+    text = MakeText(size) + ' 2024'
+    alphabets = [
+        ('default', None),
+        ('a-z0-9', Alphabet('abcdefghijklmnopqrstuvwxyz0123456789')),
+        ('pass through', Alphabet(pass_through=True)),
+    ]
+    for cipher_class, key in [(CaesarCipher, '3'), (VigenreCipher, 'lemon'), (PlayfairCipher, 'monarchy')]:
+        for name, alphabet in alphabets:
+            cipher = cipher_class()
+            if alphabet is not None:
+                if cipher_class is PlayfairCipher and alphabet.pass_through:
+                    continue
+                cipher.SetAlphabet(alphabet)
+            cipher.SetKey(key)
+            encrypted = cipher.Encrypt(text)
+            decrypted = cipher.Decrypt(encrypted)
+            if cipher_class is PlayfairCipher:
+                assert decrypted.replace('x', '') == cipher.PrepStringForCipher(text).replace('x', '')
+            else:
+                assert decrypted == cipher.PrepStringForCipher(text)
+            print('%-14s %-12s %8.2f MB/s' % (cipher_class.__name__, name, Throughput(cipher.Encrypt, text)))
+
+################################################################################
+#
+# Function: BenchChain
+#
+# Purpose: Compares CipherChain against calling each stage in turn for 2, 3
+#           and 5 stage chains.  Runs once at CACHED_PERMUTATION_LENGTH,
+#           where Rail Fence steps gather through a cached permutation, and
+#           once at size but at least CHAIN_MIN_SIZE, where they slice.
+#           test_cipher_chain.py checks the outputs match.
+#
+# Input:
+#   size -- int: Length of the text in chars
+#
+# Output:
+#   None
+#
+################################################################################
+def BenchChain(size):
+    chains = [
+        [(VigenreCipher, 'lemon'), (RailFenceCipher, '3')],
+        [(CaesarCipher, '3'), (VigenreCipher, 'lemon'), (RailFenceCipher, '3')],
+        [(CaesarCipher, '3'), (VigenreCipher, 'lemon'), (RailFenceCipher, '3'), (VigenreCipher, 'key'), (RailFenceCipher, '5')],
+    ]
+    for length in (rail_fence_cipher.CACHED_PERMUTATION_LENGTH, max(size, CHAIN_MIN_SIZE)):
+        text = MakeText(length)
+        for stage_keys in chains:
+            stages = [cipher_class() for cipher_class, key in stage_keys]
+            chain = CipherChain(stages, tuple([key for cipher_class, key in stage_keys]))
+
+            def NaiveEncrypt(plaintext):
+                for stage in chain.stages:
+                    plaintext = stage.Encrypt(plaintext)
+                return plaintext
+
+            def NaiveDecrypt(ciphertext):
+                for stage in reversed(chain.stages):
+                    ciphertext = stage.Decrypt(ciphertext)
+                return ciphertext
+
+            encrypted = chain.Encrypt(text)
+            print('Chain %d stages %d steps %9d chars  encrypt naive %8.2f MB/s  fused %8.2f MB/s  decrypt naive %8.2f MB/s  fused %8.2f MB/s' %
+                  (len(stages), len(chain.plan), length, Throughput(NaiveEncrypt, text), Throughput(chain.Encrypt, text),
+                   Throughput(NaiveDecrypt, encrypted), Throughput(chain.Decrypt, encrypted)))
+
+################################################################################
+#
+# Function: BenchDecryptRange
+#
+# Purpose: Times reading a 1 KB window from the middle of a ciphertext file
+#           with DecryptFileRange against decrypting the whole file
+#
+# Input:
+#   size -- int: Length of the ciphertext in chars
+#   window -- int: Length of the window in chars
+#
+# Output:
+#   None
+#
+################################################################################
+def BenchDecryptRange(size, window=1024):
+    text = MakeText(size)
+    for cipher_class, key in [(CaesarCipher, '3'), (VigenreCipher, 'lemon'), (RailFenceCipher, '5'), (PlayfairCipher, 'monarchy')]:
+        cipher = cipher_class()
+        cipher.SetKey(key)
+        ciphertext = cipher.EncryptBytes(text.encode('ascii'))
+        start = len(ciphertext) // 2 + 1
+        with tempfile.NamedTemporaryFile() as ciphertext_file:
+            ciphertext_file.write(ciphertext)
+            ciphertext_file.flush()
+            full_start = time.perf_counter()
+            full = cipher.DecryptBytes(ciphertext)[start:start + window]
+            full_seconds = time.perf_counter() - full_start
+            range_start = time.perf_counter()
+            for i in range(100):
+                ranged = cipher.DecryptFileRange(ciphertext_file.name, start, window)
+            range_seconds = (time.perf_counter() - range_start) / 100
+        assert ranged == full
+        print('%-15s %d KB from %.1f MB  whole %9.3f ms  range %7.3f ms' %
+              (cipher_class.__name__, window // 1024, len(ciphertext) / 1e6, full_seconds * 1e3, range_seconds * 1e3))
+
+################################################################################
+#
+# Function: BenchSplices
+#
+# Purpose: Times EncryptSplices on a large document against encrypting the
+#           whole document again, after checking the two agree on a small one
+#
+# Input:
+#   doc_size -- int: Letters in the document
+#   edit -- int: Letters in each edit
+#   edits -- int: Number of edits timed
+#
+# Output:
+#   None
+#
+################################################################################
+def BenchSplices(doc_size=100 * 10 ** 6, edit=1024, edits=20):
+    rng = random.Random(0)
+    for cipher_class, key in [(CaesarCipher, '3'), (VigenreCipher, 'lemon'), (RailFenceCipher, '5'), (PlayfairCipher, 'monarchy')]:
+        cipher = cipher_class()
+        cipher.SetKey(key)
+        small = bytearray(cipher.PrepStringForCipher(MakeText(20000)).encode('ascii'))
+        small_ciphertext = bytearray(cipher.EncryptBytes(small))
+        for i in range(20):
+            start = rng.randrange(len(small) - 100)
+            cipher.EncryptSplices(small, small_ciphertext, [(start, start + rng.randrange(100), MakeText(rng.randrange(100)))])
+        assert bytes(small_ciphertext) == cipher.EncryptBytes(bytes(small))
+
+        # Playfair needs doubled letters, which MakeText never has, for the
+        #  pairing after a change in length to line up with the old one
+        plaintext = bytearray(cipher.PrepStringForCipher(MakeEnglishText(doc_size)).encode('ascii'))
+        full_start = time.perf_counter()
+        index = cipher.SpliceIndex(plaintext)
+        if index is None:
+            # One splice over an empty document encrypts it without the
+            #  position list Rail Fence's EncryptBytes builds
+            ciphertext = cipher.EncryptSplices(bytearray(), bytearray(), [(0, 0, bytes(plaintext))])
+        else:
+            # Encrypting each indexed piece on its own keeps Playfair's pair
+            #  list small; the pieces start on pair boundaries so they join up
+            bounds = [x for x, y in index] + [len(plaintext)]
+            ciphertext = bytearray().join([cipher.EncryptBytes(bytes(plaintext[bounds[i]:bounds[i + 1]])) for i in range(len(index))])
+        full_seconds = time.perf_counter() - full_start
+
+        same_length = []
+        resized = []
+        for i in range(edits):
+            start = rng.randrange(len(plaintext) - edit)
+            letters = cipher.PrepStringForCipher(MakeEnglishText(edit if i % 2 else edit + rng.randrange(1, 16), i))
+            edit_start = time.perf_counter()
+            cipher.EncryptSplices(plaintext, ciphertext, [(start, start + edit, letters)], index)
+            (resized if i % 2 == 0 else same_length).append(time.perf_counter() - edit_start)
+        print('%-15s %d KB edits in %.0f MB  whole %8.3f s  same length %8.3f ms  resized %8.3f ms' %
+              (cipher_class.__name__, edit // 1024, len(plaintext) / 1e6, full_seconds,
+               Percentile(same_length, 50) * 1e3, Percentile(resized, 50) * 1e3))
+        del plaintext, ciphertext
+
+################################################################################
+#
+# Function: BenchIdentify
+#
+# Purpose: Times IdentifyCiphers over many ciphertexts from all four ciphers
+#           with random keys, in one process and across a pool, and checks
+#           the ciphers and Rail Fence keys it finds
+#
+# Input:
+#   count -- int: Number of ciphertexts
+#   length -- int: Letters in each plaintext
+#
+# Output:
+#   None
+#
+################################################################################
+def BenchIdentify(count=4000, length=300):
+    rng = random.Random(0)
+    names = ['caesar', 'vigenere', 'railfence', 'playfair']
+    keys = {
+        'caesar': lambda: rng.randrange(1, 26),
+        'vigenere': lambda: ''.join([rng.choice('abcdefghijklmnopqrstuvwxyz') for i in range(rng.randrange(3, 15))]),
+        'railfence': lambda: rng.randrange(2, 12),
+        'playfair': lambda: ''.join([rng.choice('abcdefghijklmnopqrstuvwxyz') for i in range(10)]),
+    }
+    expected = []
+    ciphertexts = []
+    for i in range(count):
+        name = names[i % len(names)]
+        cipher = cipher_cache.CIPHERS[name]()
+        key = keys[name]()
+        cipher.SetKey(key)
+        ciphertexts.append(cipher.Encrypt(MakeEnglishWords(length, i)))
+        expected.append((name, key))
+    workers = os.cpu_count() or 1
+    for pool_size in sorted(set([1, workers])):
+        results, stats = cryptanalysis.IdentifyCiphers(ciphertexts, find_keys=True, workers=pool_size)
+        right = sum([name == found for (name, key), (found, found_stats) in zip(expected, results)])
+        rails = [key == found_stats.get('key') for (name, key), (found, found_stats) in zip(expected, results) if name == found == 'railfence']
+        print('Identify  %3d workers  %d texts of %d letters  %8.0f texts/s  cipher ok %.1f%%  rails ok %.1f%%' %
+              (pool_size, count, length, stats['texts_per_second'], 100.0 * right / count, 100.0 * sum(rails) / max(1, len(rails))))
+
+################################################################################
+#
+# Function: BenchBulk
+#
+# Purpose: Times bulk_encrypt.RunJob over a tree of small files and a few
+#           large ones against keying a new cipher for every file.
+#           test_bulk_encrypt.py checks the outputs and the manifest.
+#
+# Input:
+#   files -- int: Number of small files
+#   small_size -- int: Largest small file in chars
+#   large_files -- int: Number of large files
+#   large_size -- int: Size of each large file in chars
+#
+# Output:
+#   None
+#
+################################################################################
+def BenchBulk(files=5000, small_size=4096, large_files=4, large_size=8 * 1024 * 1024):
+    rng = random.Random(0)
+    with tempfile.TemporaryDirectory() as root:
+        in_dir = os.path.join(root, 'in')
+        paths = []
+        for i in range(files + large_files):
+            directory = os.path.join(in_dir, 'd%02d' % (i % 50))
+            os.makedirs(directory, exist_ok=True)
+            paths.append(os.path.join(directory, 'f%05d.txt' % i))
+            with open(paths[-1], 'w') as outfile:
+                outfile.write(MakeText(rng.randrange(small_size) if i < files else large_size))
+        # Write the inputs back now so it does not land in the first timing
+        os.sync()
+
+        for name, key in [('vigenere', 'lemon'), ('playfair', 'monarchy')]:
+            cipher_class = cipher_cache.CIPHERS[name]
+            naive_dir = os.path.join(root, 'naive_%s' % name)
+            start = time.perf_counter()
+            for path in paths:
+                cipher = cipher_class()
+                cipher.SetKey(key)
+                out_path = path.replace(in_dir, naive_dir)
+                os.makedirs(os.path.dirname(out_path), exist_ok=True)
+                with open(path, 'rb') as infile, open(out_path, 'wb') as outfile:
+                    outfile.write(cipher.EncryptBytes(infile.read()))
+            naive_seconds = time.perf_counter() - start
+
+            workers = os.cpu_count() or 1
+            for pool_size in sorted(set([1, workers])):
+                out_dir = os.path.join(root, 'out_%s_%d' % (name, pool_size))
+                totals = bulk_encrypt.RunJob(cipher_class, key, in_dir, out_dir, pool_size)
+                print('Bulk %-8s %3d workers  %d files  %.1f MB  naive %8.0f files/s  runner %8.0f files/s  %7.2f MB/s' %
+                      (name, pool_size, totals['files'], totals['bytes_in'] / 1e6, len(paths) / naive_seconds,
+                       totals['files_per_second'], totals['mb_per_second']))
+
+################################################################################
+#
+# Function: ParseSize
+#
+# Purpose: Turns a size like 10K or 100M into a number of chars
+#
+# Input:
+#   text -- string: Number with an optional K, M or G suffix
+#
+# Output:
+#   size -- int
+#
+################################################################################
+def ParseSize(text):
+    units = {'K': 1024, 'M': 1024 ** 2, 'G': 1024 ** 3}
+    text = text.strip().upper()
+    if text[-1:] in units:
+        return int(float(text[:-1]) * units[text[-1]])
+    return int(text)
+
+################################################################################
+#
+# Function: Percentile
+#
+# Purpose: Picks the pct percentile out of a list of timings
+#
+# Input:
+#   values -- list: Timings -- float
+#   pct -- float: Percentile, 0 - 100
+#
+# Output:
+#   value -- float
+#
+################################################################################
+def Percentile(values, pct):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(pct / 100.0 * (len(values) - 1))))]
+
+################################################################################
+#
+# Function: MakeSuiteKey
+#
+# Purpose: Builds a key for a cipher from the suite's second dimension
+#
+# Input:
+#   cipher_name -- string: Class name of the cipher
+#   param -- int: Entry from SUITE_PARAMS
+#   rng -- random.Random: Source of key letters
+#
+# Output:
+#   key -- string
+#
+################################################################################
+def MakeSuiteKey(cipher_name, param, rng):
+    if cipher_name == 'CaesarCipher':
+        return str(rng.randint(1, 25))
+    if cipher_name == 'RailFenceCipher':
+        return str(param)
+    return ''.join(rng.choice('abcdefghiklmnopqrstuvwxyz') for i in range(param))
+
+################################################################################
+#
+# Function: Measure
+#
+# Purpose: Calls func repeatedly and times each call.  Runs at least
+#           min_runs times and then keeps going until max_runs or the time
+#           budget runs out.  Peak memory is taken from one extra traced
+#           call so tracing does not skew the timings.
+#
+# Input:
+#   func -- function: Called with no arguments
+#   min_runs -- int: Fewest calls to time
+#   max_runs -- int: Most calls to time
+#
+# Output:
+#   (timings, peak_bytes) -- tuple (list, int)
+#
+################################################################################
+def Measure(func, min_runs, max_runs):
+    timings = []
+    budget_end = time.perf_counter() + RUN_BUDGET
+    while len(timings) < max_runs and (len(timings) < min_runs or time.perf_counter() < budget_end):
+        start = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - start)
+
+    tracemalloc.start()
+    func()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return (timings, peak)
+
+################################################################################
+#
+# Function: RunSuite
+#
+# Purpose: Runs every cipher over every size and key setting and measures
+#           SetKey, Encrypt and Decrypt on their own
+#
+# Input:
+#   sizes -- list: Input sizes in chars -- int
+#   ciphers -- list: Cipher classes to run
+#
+# Output:
+#   results -- list: One dict per measurement
+#
+################################################################################
+def RunSuite(sizes, ciphers):
+    rng = random.Random(0)
+    results = []
+    for cipher_class in ciphers:
+        name = cipher_class.__name__
+        for param in SUITE_PARAMS[name]:
+            # SetKey does not depend on the input size.  New keys are used
+            #  each time so caches are not what gets measured
+            cipher = cipher_class()
+            keys = [MakeSuiteKey(name, param, rng) for i in range(SETKEY_RUNS)]
+            keys_iter = iter(keys * 2)
+            timings, peak = Measure(lambda: cipher.SetKey(next(keys_iter)), SETKEY_RUNS, SETKEY_RUNS)
+            results.append(MakeResult(name, param, 0, 'setkey', timings, peak))
+
+            cipher.SetKey(keys[0])
+            for size in sizes:
+                text = MakeText(size)
+                # One warm up call fills the per length caches
+                ciphertext = cipher.Encrypt(text)
+                for op, func, data in [('encrypt', cipher.Encrypt, text), ('decrypt', cipher.Decrypt, ciphertext)]:
+                    timings, peak = Measure(lambda: func(data), 3, 100)
+                    results.append(MakeResult(name, param, size, op, timings, peak))
+                    print('%-15s %4d %10d %-8s %10.2f MB/s  p50 %10.6f s  p99 %10.6f s  peak %12d B' %
+                          (name, param, size, op, results[-1]['throughput_mbs'], results[-1]['p50'], results[-1]['p99'], peak))
+    return results
+
+################################################################################
+#
+# Function: MakeResult
+#
+# Purpose: Packs one measurement into a dict for the JSON output
+#
+# Input:
+#   cipher_name -- string: Class name of the cipher
+#   param -- int: Entry from SUITE_PARAMS
+#   size -- int: Input size in chars, 0 for SetKey
+#   op -- string: 'setkey', 'encrypt' or 'decrypt'
+#   timings -- list: Seconds per call -- float
+#   peak -- int: Peak bytes allocated during one call
+#
+# Output:
+#   result -- dict
+#
+################################################################################
+def MakeResult(cipher_name, param, size, op, timings, peak):
+    p50 = Percentile(timings, 50)
+    return {
+        'cipher': cipher_name,
+        'param': param,
+        'size': size,
+        'op': op,
+        'runs': len(timings),
+        'p50': p50,
+        'p99': Percentile(timings, 99),
+        # SetKey has no input to measure throughput against
+        'throughput_mbs': size / p50 / 1e6 if size and p50 else None,
+        'peak_bytes': peak,
+    }
+
+################################################################################
+#
+# Function: FindRegressions
+#
+# Purpose: Compares throughput against an earlier run
+#
+# Input:
+#   baseline -- list: Results from an earlier run
+#   results -- list: Results from this run
+#   threshold -- float: Allowed drop, 0.1 means 10% slower is fine
+#
+# Output:
+#   regressions -- list: (result, baseline throughput) for each entry that
+#                         got slower than allowed
+#
+################################################################################
+def FindRegressions(baseline, results, threshold):
+    earlier = dict([((x['cipher'], x['param'], x['size'], x['op']), x) for x in baseline])
+    regressions = []
+    for result in results:
+        match = earlier.get((result['cipher'], result['param'], result['size'], result['op']))
+        if not match or not match['throughput_mbs'] or not result['throughput_mbs']:
+            continue
+        if result['throughput_mbs'] < match['throughput_mbs'] * (1 - threshold):
+            regressions.append((result, match['throughput_mbs']))
+    return regressions
+
+################################################################################
+#
+# Function: SuiteMain
+#
+# Purpose: Runs the suite from the command line
+#
+# Input:
+#   argv -- list: Arguments after 'suite'
+#
+# Output:
+#   Exit code -- int: 1 if a regression was found
+#
+################################################################################
+def SuiteMain(argv):
+    parser = argparse.ArgumentParser(prog='python benchmark.py suite')
+    parser.add_argument('--sizes', default=SUITE_SIZES, help='comma separated sizes, K/M/G suffixes allowed')
+    parser.add_argument('--ciphers', default=','.join(SUITE_PARAMS), help='comma separated class names')
+    parser.add_argument('--output', help='write results to this JSON file')
+    parser.add_argument('--baseline', help='JSON file from an earlier run to check against')
+    parser.add_argument('--threshold', type=float, default=0.1, help='allowed throughput drop (default 0.1)')
+    args = parser.parse_args(argv)
+
+    classes = dict([(x.__name__, x) for x in (CaesarCipher, VigenreCipher, RailFenceCipher, PlayfairCipher)])
+    results = RunSuite([ParseSize(x) for x in args.sizes.split(',')], [classes[x] for x in args.ciphers.split(',')])
+
+    if args.output:
+        with open(args.output, 'w') as outfile:
+            json.dump({
+                'python': platform.python_version(),
+                'platform': platform.platform(),
+                'time': time.strftime('%Y-%m-%dT%H:%M:%S'),
+                'results': results,
+            }, outfile, indent=2)
+
+    if args.baseline:
+        with open(args.baseline) as infile:
+            regressions = FindRegressions(json.load(infile)['results'], results, args.threshold)
+        for result, before in regressions:
+            print('REGRESSION %s %d %d %s: %.2f MB/s, was %.2f MB/s' %
+                  (result['cipher'], result['param'], result['size'], result['op'], result['throughput_mbs'], before))
+        if regressions:
+            return 1
+    return 0
+
+if __name__ == '__main__':
+    if sys.argv[1:2] == ['suite']:
+        sys.exit(SuiteMain(sys.argv[2:]))
+    size_mb = float(sys.argv[1]) if len(sys.argv) > 1 else 4
+    BenchNormalizer(int(size_mb * 1e6))
+    BenchCaesar(int(size_mb * 1e6))
+    BenchRailFence(int(size_mb * 1e6))
+    BenchPlayfair(int(size_mb * 1e6))
+    BenchBackends(int(size_mb * 1e6))
+    BenchBatch([10 ** 4, 10 ** 5, 10 ** 6])
+    BenchBytes(int(size_mb * 1e6))
+    BenchCryptanalysis(int(size_mb * 1e6))
+    BenchMetrics(int(size_mb * 1e6))
+    BenchAlphabet(int(size_mb * 1e6))
+    BenchChain(int(size_mb * 1e6))
+    BenchDecryptRange(int(size_mb * 1e6))
+    BenchSplices()
+    BenchIdentify()
+    BenchBulk()
+    BenchVigenreLetters(int(size_mb * 1e6))
+    BenchCache()
+    BenchPlayfairSearch()
+    BenchParallel(int(size_mb * 1e6))
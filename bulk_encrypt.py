@@ -0,0 +1,467 @@
+from cipher_cache import CIPHERS
+from cipher_interface import PARALLEL_CHUNK_SIZE
+from ciphers import TranslateFile
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+import argparse
+import hashlib
+import json
+import os
+import sys
+import threading
+import time
+
+################################################################################
+#
+# Bulk encryption job runner
+#
+# Encrypts or decrypts every file under a directory into the same layout
+#  under another one.  Files are batched into tasks for a pool of worker
+#  processes that each key one cipher when they start.  Every output is
+#  written to a .partial file and renamed into place, and every finished
+#  file is appended to a manifest, so a job that is killed can be run again
+#  and only does what is left.
+#
+# Usage:
+#   python bulk_encrypt.py in_dir out_dir --cipher vigenere --key lemon
+#                          [--workers 8] [--decrypt] [--suffix .enc]
+#
+# The manifest holds one JSON line per finished file: [path, size, mtime_ns]
+#  of the input.  A file that changed since is done again.  Outputs are not
+#  synced to disk, so the job survives being killed but not power loss.
+#
+################################################################################
+
+# Small files are put in one task until it holds this many bytes.  Anything
+#  bigger is a task of its own.
+BATCH_BYTES = 4 * 1024 * 1024
+
+# Most files in one task, so progress reaches the manifest often
+BATCH_FILES = 256
+
+# Files at least this big are mapped instead of read whole
+MAP_SIZE = 1024 * 1024
+
+# Name of the manifest in the output directory
+MANIFEST_NAME = '.bulk_manifest'
+
+# Added to an output's name while it is being written
+PARTIAL_SUFFIX = '.partial'
+
+# Seconds between progress reports
+REPORT_INTERVAL = 1.0
+
+# Seconds between a worker's checks that the runner is still alive
+PARENT_CHECK_INTERVAL = 1.0
+
+# Tasks queued per worker.  Keeps the workers busy without walking the
+#  whole tree up front.
+TASKS_PER_WORKER = 2
+
+# Cipher keyed once in each worker process by InitWorker
+worker_cipher = None
+
+# Output directories a worker process has already made
+worker_dirs = set()
+
+################################################################################
+#
+# Function: JobId
+#
+# Purpose: Names a cipher, key and direction without putting the key in
+#           the manifest
+#
+# Input:
+#   cipher_class -- class: CipherInterface subclass
+#   key -- Key passed to SetKey
+#   command -- string: 'encrypt' or 'decrypt'
+#
+# Output:
+#   job_id -- string
+#
+################################################################################
+def JobId(cipher_class, key, command):
+    name = '%s.%s' % (cipher_class.__module__, cipher_class.__qualname__)
+    return '%s %s %s' % (command, name, hashlib.sha256(repr(key).encode('utf-8')).hexdigest())
+
+################################################################################
+#
+# Function: LoadManifest
+#
+# Purpose: Reads the files a previous run of the same job finished
+#
+# Input:
+#   path -- string: Manifest file
+#   job_id -- string: From JobId
+#
+# Output:
+#   done -- dict: Maps path -> (size, mtime_ns), None when there is no
+#                  manifest yet
+#
+################################################################################
+def LoadManifest(path, job_id):
+    if not os.path.exists(path):
+        return None
+    done = {}
+    with open(path, 'r', encoding='utf-8') as manifest:
+        header = manifest.readline()
+        # A run killed before the header was written finished nothing
+        if not header.endswith('\n'):
+            return None
+        if json.loads(header).get('job') != job_id:
+            raise ValueError('%s belongs to another cipher, key or command, remove it to start over' % path)
+        for line in manifest:
+            # A run that was killed can leave half a line, which the next
+            #  run ends with a newline
+            try:
+                relpath, size, mtime_ns = json.loads(line)
+            except ValueError:
+                continue
+            done[relpath] = (size, mtime_ns)
+    return done
+
+################################################################################
+#
+# Function: WalkFiles
+#
+# Purpose: Lists the files under a directory in a fixed order.  Manifests
+#           are left out so the output of one job can be the input of the
+#           next.
+#
+# Input:
+#   root -- string: Directory to walk
+#   skip -- string: Directory to leave out, e.g. the output inside the input
+#
+# Output:
+#   files -- generator: (path relative to root, size, mtime_ns) tuples
+#
+################################################################################
+def WalkFiles(root, skip=None):
+    stack = ['']
+    while stack:
+        relative = stack.pop()
+        with os.scandir(os.path.join(root, relative)) as entries:
+            entries = sorted(entries, key=lambda x: x.name)
+        subdirs = []
+        for entry in entries:
+            relpath = os.path.join(relative, entry.name)
+            if entry.is_dir(follow_symlinks=False):
+                if entry.path != skip:
+                    subdirs.append(relpath)
+            elif entry.is_file() and entry.name != MANIFEST_NAME:
+                info = entry.stat()
+                yield (relpath, info.st_size, info.st_mtime_ns)
+        stack.extend(reversed(subdirs))
+
+################################################################################
+#
+# Function: MakeBatches
+#
+# Purpose: Groups the files that are left into worker tasks
+#
+# Input:
+#   files -- iterable: From WalkFiles
+#   done -- dict: From LoadManifest
+#   batch_bytes -- int: Bytes of small files put in one task
+#   totals -- dict: Its 'skipped' count goes up for every file already done
+#
+# Output:
+#   batches -- generator: Lists of file tuples
+#
+################################################################################
+def MakeBatches(files, done, batch_bytes, totals):
+    batch = []
+    batch_size = 0
+    for relpath, size, mtime_ns in files:
+        if done.get(relpath) == (size, mtime_ns):
+            totals['skipped'] += 1
+            continue
+        if size >= batch_bytes:
+            yield [(relpath, size, mtime_ns)]
+            continue
+        batch.append((relpath, size, mtime_ns))
+        batch_size += size
+        if batch_size >= batch_bytes or len(batch) >= BATCH_FILES:
+            yield batch
+            batch = []
+            batch_size = 0
+    if batch:
+        yield batch
+
+################################################################################
+#
+# Function: WatchParent
+#
+# Purpose: Ends a worker process once the runner that started it is gone.
+#           A runner that is killed outright never tells its workers, which
+#           would otherwise wait for tasks forever.
+#
+# Input:
+#   parent -- int: Process id of the runner
+#
+# Output:
+#   None
+#
+################################################################################
+def WatchParent(parent):
+    while os.getppid() == parent:
+        time.sleep(PARENT_CHECK_INTERVAL)
+    os._exit(1)
+
+################################################################################
+#
+# Function: InitWorker
+#
+# Purpose: Keys the cipher a worker process uses for every file
+#
+# Input:
+#   cipher_class -- class: CipherInterface subclass
+#   key -- Key passed to SetKey
+#   parent -- int: Process id of the runner, None when running in it
+#
+# Output:
+#   None
+#
+################################################################################
+def InitWorker(cipher_class, key, parent=None):
+    global worker_cipher
+    worker_cipher = cipher_class()
+    worker_cipher.SetKey(key)
+    if parent is not None:
+        threading.Thread(target=WatchParent, args=(parent,), daemon=True).start()
+
+################################################################################
+#
+# Function: RunBatch
+#
+# Purpose: Translates a batch of files with the worker's cipher.  Each
+#           output is written next to where it goes and renamed into place
+#           once it is complete.
+#
+# Input:
+#   in_dir -- string: Input root
+#   out_dir -- string: Output root
+#   batch -- list: File tuples from MakeBatches
+#   command -- string: 'encrypt' or 'decrypt'
+#   suffix -- string: Added to each output name
+#
+# Output:
+#   results -- list: (relpath, size, mtime_ns, bytes_out, error) for each
+#                     file.  error is None or the message of what failed.
+#
+################################################################################
+def RunBatch(in_dir, out_dir, batch, command, suffix):
+    translate = worker_cipher.EncryptBytes if command == 'encrypt' else worker_cipher.DecryptBytes
+    results = []
+    for relpath, size, mtime_ns in batch:
+        in_path = os.path.join(in_dir, relpath)
+        out_path = os.path.join(out_dir, relpath + suffix)
+        partial_path = out_path + PARTIAL_SUFFIX
+        try:
+            out_subdir = os.path.dirname(out_path)
+            if out_subdir not in worker_dirs:
+                os.makedirs(out_subdir, exist_ok=True)
+                worker_dirs.add(out_subdir)
+            if size >= MAP_SIZE:
+                bytes_out = TranslateFile(worker_cipher, command, in_path, partial_path, 1, PARALLEL_CHUNK_SIZE)[1]
+            else:
+                with open(in_path, 'rb') as infile:
+                    data = translate(infile.read())
+                with open(partial_path, 'wb') as outfile:
+                    outfile.write(data)
+                bytes_out = len(data)
+            os.replace(partial_path, out_path)
+            results.append((relpath, size, mtime_ns, bytes_out, None))
+        except (OSError, ValueError) as error:
+            if os.path.exists(partial_path):
+                os.remove(partial_path)
+            results.append((relpath, size, mtime_ns, 0, '%s: %s' % (type(error).__name__, error)))
+    return results
+
+################################################################################
+#
+# Function: Rates
+#
+# Purpose: Adds throughput to the running totals
+#
+# Input:
+#   totals -- dict: Counts so far
+#   start -- float: perf_counter when the job started
+#
+# Output:
+#   totals -- dict: The same dict with seconds, files_per_second and
+#                    mb_per_second set
+#
+################################################################################
+def Rates(totals, start):
+    elapsed = time.perf_counter() - start
+    totals['seconds'] = elapsed
+    totals['files_per_second'] = totals['files'] / elapsed if elapsed else 0.0
+    totals['mb_per_second'] = totals['bytes_in'] / elapsed / 1e6 if elapsed else 0.0
+    return totals
+
+################################################################################
+#
+# Function: RunJob
+#
+# Purpose: Translates every file under in_dir into out_dir, skipping the
+#           files an earlier run of the same job finished
+#
+# Input:
+#   cipher_class -- class: CipherInterface subclass, e.g. VigenreCipher
+#   key -- Key passed to SetKey
+#   in_dir -- string: Directory to read
+#   out_dir -- string: Directory to write, created if needed
+#   workers -- int: Number of processes, 1 runs in this process, None for
+#                    one per cpu
+#   command -- string: 'encrypt' or 'decrypt'
+#   suffix -- string: Added to each output name
+#   manifest_path -- string: Manifest file, None for one in out_dir
+#   batch_bytes -- int: Bytes of small files put in one task
+#   report -- function: Called with the totals about every
+#                        REPORT_INTERVAL seconds and once at the end
+#
+# Output:
+#   totals -- dict: files, bytes_in, bytes_out, skipped, failed, seconds,
+#                    files_per_second and mb_per_second.  errors lists
+#                    (path, message) for every file that failed.
+#
+################################################################################
+def RunJob(cipher_class, key, in_dir, out_dir, workers=None, command='encrypt', suffix='', manifest_path=None,
+           batch_bytes=BATCH_BYTES, report=None):
+    if command not in ('encrypt', 'decrypt'):
+        raise ValueError('unknown command %r' % command)
+    in_dir = os.path.abspath(in_dir)
+    out_dir = os.path.abspath(out_dir)
+    os.makedirs(out_dir, exist_ok=True)
+    if manifest_path is None:
+        manifest_path = os.path.join(out_dir, MANIFEST_NAME)
+    job_id = JobId(cipher_class, key, command)
+    done = LoadManifest(manifest_path, job_id)
+
+    totals = {'files': 0, 'bytes_in': 0, 'bytes_out': 0, 'skipped': 0, 'failed': 0, 'errors': []}
+    batches = MakeBatches(WalkFiles(in_dir, out_dir), done or {}, batch_bytes, totals)
+    start = time.perf_counter()
+    last_report = [start]
+
+    ended = True
+    if done is not None:
+        with open(manifest_path, 'rb') as manifest:
+            manifest.seek(-1, os.SEEK_END)
+            ended = manifest.read(1) == b'\n'
+
+    with open(manifest_path, 'w' if done is None else 'a', encoding='utf-8') as manifest:
+        if done is None:
+            manifest.write(json.dumps({'job': job_id}) + '\n')
+        elif not ended:
+            manifest.write('\n')
+
+        def Record(results):
+            for relpath, size, mtime_ns, bytes_out, error in results:
+                if error:
+                    totals['failed'] += 1
+                    totals['errors'].append((relpath, error))
+                    continue
+                manifest.write(json.dumps([relpath, size, mtime_ns]) + '\n')
+                totals['files'] += 1
+                totals['bytes_in'] += size
+                totals['bytes_out'] += bytes_out
+            manifest.flush()
+            if report and time.perf_counter() - last_report[0] >= REPORT_INTERVAL:
+                last_report[0] = time.perf_counter()
+                report(Rates(totals, start))
+
+        if workers == 1:
+            InitWorker(cipher_class, key)
+            for batch in batches:
+                Record(RunBatch(in_dir, out_dir, batch, command, suffix))
+        else:
+            max_pending = TASKS_PER_WORKER * (workers or os.cpu_count() or 1)
+            with ProcessPoolExecutor(workers, initializer=InitWorker, initargs=(cipher_class, key, os.getpid())) as pool:
+                pending = set()
+                for batch in batches:
+                    pending.add(pool.submit(RunBatch, in_dir, out_dir, batch, command, suffix))
+                    if len(pending) >= max_pending:
+                        finished, pending = wait(pending, return_when=FIRST_COMPLETED)
+                        for future in finished:
+                            Record(future.result())
+                for future in pending:
+                    Record(future.result())
+
+    Rates(totals, start)
+    if report:
+        report(totals)
+    return totals
+
+################################################################################
+#
+# Function: PrintProgress
+#
+# Purpose: Writes a one line progress report to stderr
+#
+# Input:
+#   totals -- dict: From RunJob
+#
+# Output:
+#   None
+#
+################################################################################
+def PrintProgress(totals):
+    sys.stderr.write('\r%d files  %.1f MB  %d skipped  %d failed  %.0f files/s  %.2f MB/s ' %
+                     (totals['files'], totals['bytes_in'] / 1e6, totals['skipped'], totals['failed'],
+                      totals['files_per_second'], totals['mb_per_second']))
+    sys.stderr.flush()
+
+################################################################################
+#
+# Function: ParseArgs
+#
+# Purpose: Parses the command line
+#
+# Input:
+#   argv -- list: Arguments without the program name
+#
+# Output:
+#   args -- argparse.Namespace
+#
+################################################################################
+def ParseArgs(argv):
+    parser = argparse.ArgumentParser(prog='python bulk_encrypt.py', description='Encrypt or decrypt a directory tree, resuming where a killed run stopped.')
+    parser.add_argument('in_dir')
+    parser.add_argument('out_dir')
+    parser.add_argument('--cipher', required=True, choices=sorted(CIPHERS))
+    parser.add_argument('--key', required=True, help='shift for caesar, rail count for railfence, a word otherwise')
+    parser.add_argument('--decrypt', action='store_true', help='decrypt instead of encrypt')
+    parser.add_argument('--workers', type=int, default=None, help='worker processes (default one per cpu)')
+    parser.add_argument('--suffix', default='', help='added to every output name')
+    parser.add_argument('--manifest', default=None, help='progress file (default %s in out_dir)' % MANIFEST_NAME)
+    parser.add_argument('--batch-bytes', type=int, default=BATCH_BYTES, help='bytes of small files per task')
+    return parser.parse_args(argv)
+
+################################################################################
+#
+# Function: Main
+#
+# Purpose: Runs the job runner from the command line
+#
+# Input:
+#   argv -- list: Arguments without the program name, None for sys.argv
+#
+# Output:
+#   Exit code -- int: 1 if any file failed, 2 if the job could not start
+#
+################################################################################
+def Main(argv=None):
+    args = ParseArgs(sys.argv[1:] if argv is None else argv)
+    try:
+        totals = RunJob(CIPHERS[args.cipher], args.key, args.in_dir, args.out_dir, args.workers,
+                        'decrypt' if args.decrypt else 'encrypt', args.suffix, args.manifest, args.batch_bytes, PrintProgress)
+    except ValueError as error:
+        sys.stderr.write('%s\n' % error)
+        return 2
+    sys.stderr.write('\n')
+    for relpath, error in totals['errors']:
+        sys.stderr.write('%s: %s\n' % (relpath, error))
+    return 1 if totals['failed'] else 0
+
+if __name__ == '__main__':
+    sys.exit(Main())
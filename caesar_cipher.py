@@ -1,5 +1,5 @@
-from cipher_interface import CipherInterface
-import re
+from cipher_interface import CipherInterface, ReadWindow
+import numpy_backend
 
 ################################################################################
 #
@@ -11,7 +11,8 @@ class CaesarCipher(CipherInterface):
     #
     # Function: SetKey
     #
-    # Purpose: Sets key for cipher
+    # Purpose: Sets key for cipher and looks up the alphabet's translation
+    #           tables for the rotation
     #
     # Input:
     #   key -- string: numerical amount to rotate by
@@ -22,9 +23,30 @@ class CaesarCipher(CipherInterface):
     #
     ############################################################################
     def SetKey(self, key):
-        # Mod by 26 to keep within proper range
-        self.rot_amount = int(key) % 26
-    
+        # Mod by the alphabet size to keep within proper range
+        self.rot_amount = int(key) % self.alphabet.size
+        self.encrypt_table, self.decrypt_table = self.alphabet.ShiftTables(self.rot_amount)
+
+    ############################################################################
+    #
+    # Function: Translate
+    #
+    # Purpose: Strips all nonalpha chars from text and rotates what is left
+    #           using table.  The normalizer folds both into one pass.  With
+    #           a pass through alphabet nothing is stripped and the other
+    #           chars are left as they are.
+    #
+    # Input:
+    #   text -- string: Text to be translated
+    #   table -- bytes: Translation table from Alphabet.ShiftTables
+    #
+    # Output:
+    #   Translated text -- string
+    #
+    ############################################################################
+    def Translate(self, text, table):
+        return self.normalizer.Translate(text, table)
+
     ############################################################################
     #
     # Function: Encrypt
@@ -32,15 +54,26 @@ class CaesarCipher(CipherInterface):
     # Purpose: Encrypts plaintext
     #
     # Input:
-    #   plaintext -- string: Text to be encrypted
+    #   plaintext -- string: Text to be encrypted.  bytes, bytearray and
+    #                         memoryview go through EncryptBytes
     #
     # Output:
-    #   Encrypted text -- string
+    #   Encrypted text -- string, or bytes for bytes input
     #
     ############################################################################
     def Encrypt(self, plaintext):
-        return ''.join([chr(((ord(x.lower()) - 97 + self.rot_amount) % 26) + 97) for x in re.sub(r'[\W0-9 ]', '', plaintext.lower())])
-    
+        if not isinstance(plaintext, str):
+            return self.EncryptBytes(plaintext)
+        timer = self.StartTimer('encrypt')
+        if self.UseNumpy():
+            encrypted = numpy_backend.Shift(self.PrepStringForCipher(plaintext), [self.rot_amount])
+        else:
+            encrypted = self.Translate(plaintext, self.encrypt_table)
+        if timer:
+            timer.Stage('numpy' if self.UseNumpy() else 'translate')
+            timer.Done(chars_in=len(plaintext), chars_out=len(encrypted))
+        return encrypted
+
     ############################################################################
     #
     # Function: Decrypt
@@ -48,15 +81,191 @@ class CaesarCipher(CipherInterface):
     # Purpose: Decrypts ciphertext
     #
     # Input:
-    #   ciphertext -- string: Text to be decrypted
+    #   ciphertext -- string: Text to be decrypted.  bytes, bytearray and
+    #                          memoryview go through DecryptBytes
     #
     # Output:
-    #   Decrypted text -- string
+    #   Decrypted text -- string, or bytes for bytes input
     #
     ############################################################################
     def Decrypt(self, ciphertext):
-        return ''.join([chr(((ord(x.lower()) - 97 - self.rot_amount) + 97)) if (ord(x.lower()) - 97 - self.rot_amount) >= 0 else chr(((ord(x.lower()) - 97 - self.rot_amount) + 26) + 97) for x in re.sub(r'[\W0-9 ]', '', ciphertext.lower())])
-    
+        if not isinstance(ciphertext, str):
+            return self.DecryptBytes(ciphertext)
+        timer = self.StartTimer('decrypt')
+        if self.UseNumpy():
+            decrypted = numpy_backend.Shift(self.PrepStringForCipher(ciphertext), [-self.rot_amount])
+        else:
+            decrypted = self.Translate(ciphertext, self.decrypt_table)
+        if timer:
+            timer.Stage('numpy' if self.UseNumpy() else 'translate')
+            timer.Done(chars_in=len(ciphertext), chars_out=len(decrypted))
+        return decrypted
+
+    ############################################################################
+    #
+    # Function: EncryptBytes
+    #
+    # Purpose: Encrypts ascii data in one bytes.translate pass
+    #
+    # Input:
+    #   data -- bytes, bytearray or memoryview: Data to be encrypted
+    #
+    # Output:
+    #   Encrypted data -- bytes
+    #
+    ############################################################################
+    def EncryptBytes(self, data):
+        timer = self.StartTimer('encrypt_bytes')
+        encrypted = self.normalizer.TranslateBytes(data, self.encrypt_table)
+        if timer:
+            timer.Stage('translate')
+            timer.Done(chars_in=len(data), chars_out=len(encrypted))
+        return encrypted
+
+    ############################################################################
+    #
+    # Function: DecryptBytes
+    #
+    # Purpose: Decrypts ascii data in one bytes.translate pass
+    #
+    # Input:
+    #   data -- bytes, bytearray or memoryview: Data to be decrypted
+    #
+    # Output:
+    #   Decrypted data -- bytes
+    #
+    ############################################################################
+    def DecryptBytes(self, data):
+        timer = self.StartTimer('decrypt_bytes')
+        decrypted = self.normalizer.TranslateBytes(data, self.decrypt_table)
+        if timer:
+            timer.Stage('translate')
+            timer.Done(chars_in=len(data), chars_out=len(decrypted))
+        return decrypted
+
+    ############################################################################
+    #
+    # Function: ParallelAlignment
+    #
+    # Purpose: Every letter is rotated on its own so text can be split anywhere
+    #
+    # Input:
+    #   None
+    #
+    # Output:
+    #   alignment -- int: Always 1
+    #
+    ############################################################################
+    def ParallelAlignment(self):
+        return 1
+
+    ############################################################################
+    #
+    # Function: RangeAlignment
+    #
+    # Purpose: Every letter is rotated on its own so a range can start
+    #           anywhere
+    #
+    # Input:
+    #   None
+    #
+    # Output:
+    #   alignment -- int: Always 1
+    #
+    ############################################################################
+    def RangeAlignment(self):
+        return 1
+
+    ############################################################################
+    #
+    # Function: DecryptWindow
+    #
+    # Purpose: Decrypts only the chars of the window
+    #
+    # Input:
+    #   ciphertext -- string, bytes or mmap: Ciphertext as Encrypt returned
+    #                  it
+    #   start -- int: First position wanted
+    #   end -- int: Position after the last one wanted
+    #
+    # Output:
+    #   Decrypted window -- string for string input, otherwise bytes
+    #
+    ############################################################################
+    def DecryptWindow(self, ciphertext, start, end):
+        return self.Decrypt(ReadWindow(ciphertext, start, end))
+
+    ############################################################################
+    #
+    # Function: EncryptSplice
+    #
+    # Purpose: Letters do not depend on their neighbours, so only the new
+    #           letters are encrypted
+    #
+    # Input:
+    #   plaintext -- bytearray: Normalized letters, updated in place
+    #   ciphertext -- bytearray: Encrypted letters, updated in place
+    #   start -- int: First letter replaced
+    #   end -- int: Letter after the last one replaced
+    #   letters -- bytes: Normalized letters put in their place
+    #   index -- Not used
+    #
+    # Output:
+    #   None
+    #
+    ############################################################################
+    def EncryptSplice(self, plaintext, ciphertext, start, end, letters, index):
+        plaintext[start:end] = letters
+        ciphertext[start:end] = letters.translate(self.encrypt_table)
+
+    ############################################################################
+    #
+    # Function: KeySchedule
+    #
+    # Purpose: Every letter is shifted by the same amount
+    #
+    # Input:
+    #   None
+    #
+    # Output:
+    #   shifts -- list: The rotation, once
+    #
+    ############################################################################
+    def KeySchedule(self):
+        return [self.rot_amount]
+
+    ############################################################################
+    #
+    # Function: EncryptBatch
+    #
+    # Purpose: Encrypts a list of messages in one pass
+    #
+    # Input:
+    #   messages -- list: Strings to be encrypted
+    #
+    # Output:
+    #   Encrypted messages -- list
+    #
+    ############################################################################
+    def EncryptBatch(self, messages):
+        return self.normalizer.TranslateMany(messages, self.encrypt_table)
+
+    ############################################################################
+    #
+    # Function: DecryptBatch
+    #
+    # Purpose: Decrypts a list of messages in one pass
+    #
+    # Input:
+    #   messages -- list: Strings to be decrypted
+    #
+    # Output:
+    #   Decrypted messages -- list
+    #
+    ############################################################################
+    def DecryptBatch(self, messages):
+        return self.normalizer.TranslateMany(messages, self.decrypt_table)
+
 ################################################################################
 #
 # end CAESAR CIPHER
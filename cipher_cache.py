@@ -0,0 +1,192 @@
+from caesar_cipher import CaesarCipher
+from collections import OrderedDict
+from playfair_cipher import PlayfairCipher
+from rail_fence_cipher import RailFenceCipher
+from vigenre_cipher import VigenreCipher
+import threading
+import time
+
+# Name used to ask for a cipher -> cipher class
+CIPHERS = {
+    'caesar': CaesarCipher,
+    'vigenere': VigenreCipher,
+    'railfence': RailFenceCipher,
+    'playfair': PlayfairCipher,
+}
+
+# Default number of keyed instances kept
+CACHE_SIZE = 1024
+
+# Default number of seconds an instance is kept after it was keyed, None
+#  keeps it until it is pushed out
+CACHE_TTL = 3600.0
+
+################################################################################
+#
+# CipherCache
+#
+# Hands out ciphers with their key already set.  Instances are kept in a
+#  least recently used cache bounded by size and age, so asking for a key
+#  again skips SetKey.  Instances are shared between callers and threads;
+#  call Encrypt and Decrypt on them but never SetKey or SetBackend.
+#
+################################################################################
+class CipherCache:
+    ############################################################################
+    #
+    # Function: __init__
+    #
+    # Purpose: Sets up an empty cache
+    #
+    # Input:
+    #   max_size -- int: Most instances to keep
+    #   ttl -- float: Seconds an instance is kept, None for no limit
+    #
+    # Output:
+    #   None
+    #
+    ############################################################################
+    def __init__(self, max_size=CACHE_SIZE, ttl=CACHE_TTL):
+        if max_size < 1:
+            raise ValueError('Cache size must be at least 1, got %r' % (max_size,))
+        self.max_size = max_size
+        self.ttl = ttl
+        # Maps (cipher class, key) -> (instance, time it was keyed)
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    ############################################################################
+    #
+    # Function: GetCipherClass
+    #
+    # Purpose: Looks up a cipher class by name
+    #
+    # Input:
+    #   name -- string: A name from CIPHERS, or a cipher class
+    #
+    # Output:
+    #   cipher_class -- class
+    #
+    ############################################################################
+    def GetCipherClass(self, name):
+        if isinstance(name, type):
+            return name
+        if name not in CIPHERS:
+            raise ValueError('Unknown cipher %r, expected one of %s' % (name, ', '.join(sorted(CIPHERS))))
+        return CIPHERS[name]
+
+    ############################################################################
+    #
+    # Function: Get
+    #
+    # Purpose: Returns a cipher keyed with key.  SetKey runs outside of the
+    #           lock so a slow key does not hold up other callers; if two
+    #           threads miss on the same key at once the first instance
+    #           stored wins.
+    #
+    # Input:
+    #   name -- string: A name from CIPHERS, or a cipher class
+    #   key -- string: Key for the cipher
+    #
+    # Output:
+    #   cipher -- CipherInterface: Shared instance, do not change its key
+    #
+    ############################################################################
+    def Get(self, name, key):
+        cipher_class = self.GetCipherClass(name)
+        cache_key = (cipher_class, key)
+        now = time.monotonic()
+        with self.lock:
+            entry = self.entries.get(cache_key)
+            if entry is not None:
+                if self.ttl is None or now - entry[1] < self.ttl:
+                    self.entries.move_to_end(cache_key)
+                    self.hits += 1
+                    return entry[0]
+                del self.entries[cache_key]
+                self.expirations += 1
+            self.misses += 1
+
+        cipher = cipher_class()
+        cipher.SetKey(key)
+
+        with self.lock:
+            entry = self.entries.get(cache_key)
+            if entry is not None:
+                return entry[0]
+            self.entries[cache_key] = (cipher, now)
+            while len(self.entries) > self.max_size:
+                self.entries.popitem(last=False)
+                self.evictions += 1
+        return cipher
+
+    ############################################################################
+    #
+    # Function: Stats
+    #
+    # Purpose: Reports how well the cache is doing
+    #
+    # Input:
+    #   None
+    #
+    # Output:
+    #   stats -- dict: size, hits, misses, evictions and expirations
+    #
+    ############################################################################
+    def Stats(self):
+        with self.lock:
+            return {
+                'size': len(self.entries),
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'expirations': self.expirations,
+            }
+
+    ############################################################################
+    #
+    # Function: Clear
+    #
+    # Purpose: Drops every instance and resets the counters
+    #
+    # Input:
+    #   None
+    #
+    # Output:
+    #   None
+    #
+    ############################################################################
+    def Clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.hits = self.misses = self.evictions = self.expirations = 0
+
+################################################################################
+#
+# end CipherCache
+#
+################################################################################
+
+# Cache used by GetCipher
+default_cache = CipherCache()
+
+################################################################################
+#
+# Function: GetCipher
+#
+# Purpose: Returns a shared cipher keyed with key from the default cache
+#
+# Input:
+#   name -- string: A name from CIPHERS, or a cipher class
+#   key -- string: Key for the cipher
+#
+# Output:
+#   cipher -- CipherInterface: Shared instance, do not change its key
+#
+################################################################################
+def GetCipher(name, key):
+    return default_cache.Get(name, key)
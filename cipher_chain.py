@@ -0,0 +1,436 @@
+from cipher_interface import CipherInterface
+from operator import itemgetter
+from rail_fence_cipher import CACHED_PERMUTATION_LENGTH, PERMUTATION_CACHE_SIZE
+import copy
+import math
+
+# Longest key schedule two shift stages are fused into.  Past this the
+#  strided passes cost more than running the stages one after the other.
+MAX_FUSED_PERIOD = 4096
+
+################################################################################
+#
+# Function: FuseSchedules
+#
+# Purpose: Combines two key schedules into one that shifts each position by
+#           the sum of both.  The result repeats after the lcm of the two
+#           periods.
+#
+# Input:
+#   first -- list: Shifts of the first stage
+#   second -- list: Shifts of the second stage
+#   size -- int: Number of symbols in the alphabet
+#
+# Output:
+#   shifts -- list: Combined schedule, or None if it would be longer than
+#                    MAX_FUSED_PERIOD
+#
+################################################################################
+def FuseSchedules(first, second, size):
+    period = math.lcm(len(first), len(second))
+    if period > MAX_FUSED_PERIOD:
+        return None
+    return [(first[i % len(first)] + second[i % len(second)]) % size for i in range(period)]
+
+################################################################################
+#
+# Function: ComposePermutations
+#
+# Purpose: Folds a list of permutations into the one that gives the same
+#           order as applying them one after the other
+#
+# Input:
+#   permutations -- list: Each an index into its input for every position
+#                          of its output
+#
+# Output:
+#   (encrypt, decrypt) -- tuple (itemgetter, itemgetter): Each returns a
+#                          tuple of the reordered letters
+#
+################################################################################
+def ComposePermutations(permutations):
+    combined = permutations[0]
+    for permutation in permutations[1:]:
+        combined = [combined[x] for x in permutation]
+    inverse = [0] * len(combined)
+    for position, index in enumerate(combined):
+        inverse[index] = position
+    return (itemgetter(*combined), itemgetter(*inverse))
+
+################################################################################
+#
+# CipherChain
+#
+# Runs a list of keyed ciphers one after the other as a single cipher.  The
+#  text is normalized once and the stages are fused into a plan:
+#
+#   shift -- neighbouring Caesar and Vigenere stages become one key
+#            schedule, run as strided table passes.  Caesar stages also
+#            move across reorderings since a constant shift does not care
+#            where a letter is.
+#   permute -- neighbouring Rail Fence stages become one permutation, run
+#              as a single gather.  Past CACHED_PERMUTATION_LENGTH letters
+#              a permutation costs more memory than it saves, so each stage
+#              slices the text into rails in turn instead.
+#   stage -- anything else, e.g. Playfair, runs as it is.
+#
+#  so Vigenere then Rail Fence then Caesar is one shift and one gather.
+#  Decrypt runs the plan backwards.  Plaintext is normalized with the
+#  alphabet of the first stage and ciphertext with that of the last.  Only
+#  stages on the first stage's alphabet are fused, and only when no stage
+#  can hand on letters outside of it.
+#
+################################################################################
+class CipherChain(CipherInterface):
+    ############################################################################
+    #
+    # Function: __init__
+    #
+    # Purpose: Sets up the chain
+    #
+    # Input:
+    #   stages -- list: CipherInterface instances, run first to last when
+    #                    encrypting
+    #   keys -- list: One key per stage, or None if the stages already have
+    #                  their keys
+    #
+    # Output:
+    #   None
+    #
+    ############################################################################
+    def __init__(self, stages=(), keys=None):
+        self.stages = list(stages)
+        if keys is None:
+            self.BuildPlan()
+        else:
+            self.SetKey(keys)
+
+    ############################################################################
+    #
+    # Function: SetKey
+    #
+    # Purpose: Sets the key of every stage and rebuilds the plan.  The
+    #           stages are copied first so a copy of the chain, e.g. from
+    #           TranslateMany, does not rekey the original.
+    #
+    # Input:
+    #   key -- tuple: One key per stage.  A tuple keeps it hashable for
+    #                  EncryptMany and CipherCache.
+    #
+    # Output:
+    #   None
+    #
+    ############################################################################
+    def SetKey(self, key):
+        keys = list(key)
+        if len(keys) != len(self.stages):
+            raise ValueError('Got %d keys for %d stages' % (len(keys), len(self.stages)))
+        self.stages = [copy.copy(x) for x in self.stages]
+        for stage, stage_key in zip(self.stages, keys):
+            stage.SetKey(stage_key)
+        self.BuildPlan()
+
+    ############################################################################
+    #
+    # Function: BuildPlan
+    #
+    # Purpose: Fuses the stages into plan.  Each step is one of
+    #           ('shift', shifts), ('permute', [stage, ...]) or
+    #           ('stage', stage).
+    #
+    # Input:
+    #   None
+    #
+    # Output:
+    #   None
+    #
+    ############################################################################
+    def BuildPlan(self):
+        if self.stages:
+            self.alphabet = self.stages[0].alphabet
+            self.normalizer = self.alphabet.normalizer
+        if any([x.alphabet.pass_through for x in self.stages]):
+            raise ValueError('CipherChain can not run on a pass through alphabet')
+        # Ciphertext comes out of the last stage
+        self.decrypt_normalizer = self.stages[-1].normalizer if self.stages else self.normalizer
+        # A stage that hands on other letters needs the next stage to
+        #  normalize them, so nothing is fused
+        fuse = all([set(x.alphabet.letters) <= set(self.alphabet.letters) for x in self.stages])
+        plan = []
+        for stage in self.stages:
+            fusable = fuse and stage.alphabet is self.alphabet
+            shifts = stage.KeySchedule() if fusable else None
+            if shifts is not None:
+                self.AddShift(plan, shifts)
+            elif fusable and stage.Permutation(0) is not None:
+                if plan and plan[-1][0] == 'permute':
+                    plan[-1][1].append(stage)
+                else:
+                    plan.append(('permute', [stage]))
+            else:
+                plan.append(('stage', stage))
+        self.plan = plan
+        # Maps (step index, length) -> gatherers from ComposePermutations
+        self.gatherers = {}
+
+    ############################################################################
+    #
+    # Function: AddShift
+    #
+    # Purpose: Adds a shift stage to the plan, fusing it with the shift
+    #           before it when it can
+    #
+    # Input:
+    #   plan -- list: Plan built so far
+    #   shifts -- list: Key schedule of the stage
+    #
+    # Output:
+    #   None
+    #
+    ############################################################################
+    def AddShift(self, plan, shifts):
+        size = self.alphabet.size
+        target = None
+        if plan and plan[-1][0] == 'shift':
+            target = len(plan) - 1
+        elif len(shifts) == 1 and len(plan) >= 2 and plan[-1][0] == 'permute' and plan[-2][0] == 'shift':
+            # A constant shift gives the same result before a reordering
+            target = len(plan) - 2
+        fused = FuseSchedules(plan[target][1], shifts, size) if target is not None else None
+        if fused is None:
+            plan.append(('shift', [x % size for x in shifts]))
+        elif any(fused):
+            plan[target] = ('shift', fused)
+        else:
+            # The shifts cancel out
+            del plan[target]
+
+    ############################################################################
+    #
+    # Function: GetGatherers
+    #
+    # Purpose: Returns the combined permutation of a permute step for a
+    #           length.  Results are cached per (step, length).
+    #
+    # Input:
+    #   index -- int: Position of the step in the plan
+    #   length -- int: Number of letters, 2 - CACHED_PERMUTATION_LENGTH
+    #
+    # Output:
+    #   (encrypt, decrypt) -- tuple (itemgetter, itemgetter)
+    #
+    ############################################################################
+    def GetGatherers(self, index, length):
+        cache_key = (index, length)
+        gatherers = self.gatherers.get(cache_key)
+        if gatherers is None:
+            gatherers = ComposePermutations([x.Permutation(length) for x in self.plan[index][1]])
+            # Drop the oldest length once the cache is full
+            if len(self.gatherers) >= PERMUTATION_CACHE_SIZE:
+                self.gatherers.pop(next(iter(self.gatherers)), None)
+            self.gatherers[cache_key] = gatherers
+        return gatherers
+
+    ############################################################################
+    #
+    # Function: RunStep
+    #
+    # Purpose: Runs one step of the plan
+    #
+    # Input:
+    #   index -- int: Position of the step in the plan
+    #   letters -- bytes: Normalized letters
+    #   direction -- int: 0 to encrypt, 1 to decrypt
+    #
+    # Output:
+    #   letters -- bytes
+    #
+    ############################################################################
+    def RunStep(self, index, letters, direction):
+        kind, value = self.plan[index]
+        if kind == 'shift':
+            period = len(value)
+            shift_tables = self.alphabet.ShiftTables
+            shifted = bytearray(letters)
+            for loc in range(period):
+                shifted[loc::period] = letters[loc::period].translate(shift_tables(value[loc])[direction])
+            return bytes(shifted)
+        if kind == 'permute':
+            if len(letters) < 2:
+                return letters
+            if len(letters) <= CACHED_PERMUTATION_LENGTH:
+                return bytes(self.GetGatherers(index, len(letters))[direction](letters))
+            for stage in (value if direction == 0 else reversed(value)):
+                letters = stage.DecryptBytes(letters) if direction else stage.EncryptBytes(letters)
+            return letters
+        return value.DecryptBytes(letters) if direction else value.EncryptBytes(letters)
+
+    ############################################################################
+    #
+    # Function: RunPlan
+    #
+    # Purpose: Normalizes data and runs it through the plan.  A constant
+    #           shift at the start is folded into the normalization pass.
+    #
+    # Input:
+    #   data -- string, bytes, bytearray or memoryview: Data to be translated
+    #   direction -- int: 0 to encrypt, 1 to decrypt
+    #   op -- string: Name of the call for the metrics hooks
+    #
+    # Output:
+    #   Translated data -- string for string input, otherwise bytes
+    #
+    ############################################################################
+    def RunPlan(self, data, direction, op):
+        timer = self.StartTimer(op)
+        order = range(len(self.plan)) if direction == 0 else range(len(self.plan) - 1, -1, -1)
+        table = None
+        if order and self.plan[order[0]][0] == 'shift' and len(self.plan[order[0]][1]) == 1:
+            table = self.alphabet.ShiftTables(self.plan[order[0]][1][0])[direction]
+            order = order[1:]
+        normalizer = self.decrypt_normalizer if direction else self.normalizer
+        if isinstance(data, str):
+            letters = normalizer.Translate(data, table).encode('ascii')
+        else:
+            letters = normalizer.TranslateBytes(data, table)
+        if timer:
+            timer.Stage('normalize')
+        for index in order:
+            letters = self.RunStep(index, letters, direction)
+            if timer:
+                timer.Stage(self.plan[index][0])
+        if timer:
+            timer.Done(chars_in=len(data), chars_out=len(letters), steps=len(self.plan), stages=len(self.stages))
+        return letters.decode('ascii') if isinstance(data, str) else letters
+
+    ############################################################################
+    #
+    # Function: Encrypt
+    #
+    # Purpose: Runs plaintext through every stage
+    #
+    # Input:
+    #   plaintext -- string: Text to be encrypted.  bytes, bytearray and
+    #                         memoryview go through EncryptBytes
+    #
+    # Output:
+    #   Encrypted text -- string, or bytes for bytes input
+    #
+    ############################################################################
+    def Encrypt(self, plaintext):
+        if not isinstance(plaintext, str):
+            return self.EncryptBytes(plaintext)
+        return self.RunPlan(plaintext, 0, 'encrypt')
+
+    ############################################################################
+    #
+    # Function: Decrypt
+    #
+    # Purpose: Runs ciphertext back through every stage, last to first
+    #
+    # Input:
+    #   ciphertext -- string: Text to be decrypted.  bytes, bytearray and
+    #                          memoryview go through DecryptBytes
+    #
+    # Output:
+    #   Decrypted text -- string, or bytes for bytes input
+    #
+    ############################################################################
+    def Decrypt(self, ciphertext):
+        if not isinstance(ciphertext, str):
+            return self.DecryptBytes(ciphertext)
+        return self.RunPlan(ciphertext, 1, 'decrypt')
+
+    ############################################################################
+    #
+    # Function: EncryptBytes
+    #
+    # Purpose: Encrypts ascii data without going through str
+    #
+    # Input:
+    #   data -- bytes, bytearray or memoryview: Data to be encrypted
+    #
+    # Output:
+    #   Encrypted data -- bytes
+    #
+    ############################################################################
+    def EncryptBytes(self, data):
+        return self.RunPlan(data, 0, 'encrypt_bytes')
+
+    ############################################################################
+    #
+    # Function: DecryptBytes
+    #
+    # Purpose: Decrypts ascii data without going through str
+    #
+    # Input:
+    #   data -- bytes, bytearray or memoryview: Data to be decrypted
+    #
+    # Output:
+    #   Decrypted data -- bytes
+    #
+    ############################################################################
+    def DecryptBytes(self, data):
+        return self.RunPlan(data, 1, 'decrypt_bytes')
+
+    ############################################################################
+    #
+    # Function: MaxOutputLength
+    #
+    # Purpose: Gives the most bytes Encrypt can return for an input
+    #
+    # Input:
+    #   length -- int: Length of the input
+    #
+    # Output:
+    #   length -- int
+    #
+    ############################################################################
+    def MaxOutputLength(self, length):
+        for stage in self.stages:
+            length = stage.MaxOutputLength(length)
+        return length
+
+    ############################################################################
+    #
+    # Function: KeySchedule
+    #
+    # Purpose: A chain of shifts that fused into one is a shift itself
+    #
+    # Input:
+    #   None
+    #
+    # Output:
+    #   shifts -- list: The fused schedule, or None
+    #
+    ############################################################################
+    def KeySchedule(self):
+        if not self.plan:
+            return [0]
+        if len(self.plan) == 1 and self.plan[0][0] == 'shift':
+            return list(self.plan[0][1])
+        return None
+
+    ############################################################################
+    #
+    # Function: ParallelAlignment
+    #
+    # Purpose: A chain of shifts can be split on its key period.  Anything
+    #           that reorders or pairs letters needs the whole text.
+    #
+    # Input:
+    #   None
+    #
+    # Output:
+    #   alignment -- int: The period of the fused schedule, or None
+    #
+    ############################################################################
+    def ParallelAlignment(self):
+        shifts = self.KeySchedule()
+        return None if shifts is None else len(shifts)
+
+################################################################################
+#
+# end CipherChain
+#
+################################################################################
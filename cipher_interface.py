@@ -1,10 +1,269 @@
-import re
+from alphabet import LOWERCASE
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from itertools import repeat
+import asyncio
+import copy
+import metrics
+import mmap
+import numpy_backend
+import os
+import threading
+
+# Default number of chars read per chunk by the streaming functions
+CHUNK_SIZE = 64 * 1024
+
+# Default number of chars given to each worker by the parallel functions
+PARALLEL_CHUNK_SIZE = 1024 * 1024
+
+# Backends a cipher can run on
+BACKENDS = ('python', 'numpy')
+
+# Backend used by instances that have not picked one with SetBackend
+default_backend = 'python'
+
+# Inputs longer than this many chars are handed to an executor by
+#  EncryptAsync and DecryptAsync so the event loop is not blocked
+ASYNC_INLINE_SIZE = 64 * 1024
+
+# Most streams TranslateStreamAsync pipes at once when it is not given an
+#  executor.  A stream holds a thread for as long as it is open, even while
+#  the other end sends nothing, so streams get a pool of their own and never
+#  use up the loop's default pool that EncryptAsync runs in.  Streams past
+#  this many wait for one to finish.
+MAX_ASYNC_STREAMS = 64
+
+# Pool for streams, made by GetStreamExecutor the first time it is needed
+stream_executor = None
+stream_executor_lock = threading.Lock()
+
+# The cipher a worker process runs, set by InitWorker
+worker_cipher = None
+
+################################################################################
+#
+# Function: WriteInto
+#
+# Purpose: Copies translated bytes into the front of a caller supplied buffer
+#
+# Input:
+#   data -- bytes: Translated bytes
+#   out -- writable buffer: bytearray, memoryview, mmap, array, etc.
+#
+# Output:
+#   Number of bytes written -- int
+#
+################################################################################
+def WriteInto(data, out):
+    view = memoryview(out).cast('B')
+    if len(data) > len(view):
+        raise ValueError('Output buffer holds %d bytes, need %d' % (len(view), len(data)))
+    view[:len(data)] = data
+    return len(data)
+
+################################################################################
+#
+# Function: ReadWindow
+#
+# Purpose: Slices a window out of ciphertext without copying the rest
+#
+# Input:
+#   ciphertext -- string, bytes, memoryview or mmap: Text to slice
+#   start -- int: First position
+#   end -- int: Position after the last one
+#
+# Output:
+#   window -- string for string input, otherwise bytes
+#
+################################################################################
+def ReadWindow(ciphertext, start, end):
+    window = ciphertext[start:end]
+    return window if isinstance(window, (str, bytes)) else bytes(window)
+
+################################################################################
+#
+# Function: SetDefaultBackend
+#
+# Purpose: Sets the backend used by every cipher instance that has not
+#           picked its own
+#
+# Input:
+#   backend -- string: One of BACKENDS
+#
+# Output:
+#   None
+#
+################################################################################
+def SetDefaultBackend(backend):
+    global default_backend
+    if backend not in BACKENDS:
+        raise ValueError('Unknown backend: %s' % backend)
+    default_backend = backend
+
+################################################################################
+#
+# Function: ReadChunks
+#
+# Purpose: Reads a file object in fixed size chunks
+#
+# Input:
+#   fileobj -- file: File opened for reading
+#   chunk_size -- int: Max number of chars per chunk
+#
+# Output:
+#   Yields each chunk -- string
+#
+################################################################################
+def ReadChunks(fileobj, chunk_size=CHUNK_SIZE):
+    while True:
+        chunk = fileobj.read(chunk_size)
+        if not chunk:
+            break
+        yield chunk
+
+################################################################################
+#
+# Function: InitWorker
+#
+# Purpose: Runs once in each worker process of a parallel call to hand it the
+#           cipher it will use
+#
+# Input:
+#   cipher -- CipherInterface: Cipher with its key already set
+#
+# Output:
+#   None
+#
+################################################################################
+def InitWorker(cipher):
+    global worker_cipher
+    worker_cipher = cipher
+
+################################################################################
+#
+# Function: CallWorker
+#
+# Purpose: Calls a function of the worker's cipher
+#
+# Input:
+#   func_name -- string: Name of the function on the cipher
+#   args -- Arguments passed to the function
+#
+# Output:
+#   Whatever the function returns
+#
+################################################################################
+def CallWorker(func_name, *args):
+    return getattr(worker_cipher, func_name)(*args)
+
+################################################################################
+#
+# Function: WriteAndDrain
+#
+# Purpose: Writes to an asyncio stream and waits until the transport's
+#           buffer has room again
+#
+# Input:
+#   writer -- asyncio.StreamWriter: Stream to write to
+#   data -- bytes: Data to write
+#
+# Output:
+#   None
+#
+################################################################################
+async def WriteAndDrain(writer, data):
+    writer.write(data)
+    await writer.drain()
+
+################################################################################
+#
+# Function: GetStreamExecutor
+#
+# Purpose: Gives the thread pool TranslateStreamAsync runs streams in
+#
+# Input:
+#   None
+#
+# Output:
+#   executor -- concurrent.futures.ThreadPoolExecutor: MAX_ASYNC_STREAMS
+#                threads
+#
+################################################################################
+def GetStreamExecutor():
+    global stream_executor
+    with stream_executor_lock:
+        if stream_executor is None:
+            stream_executor = ThreadPoolExecutor(MAX_ASYNC_STREAMS, thread_name_prefix='cipher-stream')
+    return stream_executor
+
 ################################################################################
 #
 # CipherInterface
 #
 ################################################################################
 class CipherInterface:
+    # None means use default_backend
+    backend = None
+
+    # Symbols the cipher works on.  Ciphers that merge or keep other letters
+    #  set their own Alphabet, instances can pick one with SetAlphabet
+    alphabet = LOWERCASE
+
+    # Letter rules used by PrepStringForCipher, always alphabet.normalizer
+    normalizer = LOWERCASE.normalizer
+
+    ############################################################################
+    #
+    # Function: SetAlphabet
+    #
+    # Purpose: Picks the symbols this instance works on.  Must be called
+    #           before SetKey since keys are read in the alphabet.
+    #
+    # Input:
+    #   alphabet -- Alphabet: Symbols to use
+    #
+    # Output: Nothing
+    #
+    ############################################################################
+    def SetAlphabet(self, alphabet):
+        self.alphabet = alphabet
+        self.normalizer = alphabet.normalizer
+
+    ############################################################################
+    #
+    # Function: SetBackend
+    #
+    # Purpose: Picks the backend for this instance
+    #
+    # Input:
+    #   backend -- string: One of BACKENDS, or None to follow the default
+    #
+    # Output: Nothing
+    #
+    ############################################################################
+    def SetBackend(self, backend):
+        if backend is not None and backend not in BACKENDS:
+            raise ValueError('Unknown backend: %s' % backend)
+        self.backend = backend
+
+    ############################################################################
+    #
+    # Function: UseNumpy
+    #
+    # Purpose: Checks if the numpy backend should be used.  Falls back to
+    #           python when numpy is not installed, or when the instance was
+    #           given an alphabet the numpy backend does not know.
+    #
+    # Input:
+    #   None
+    #
+    # Output:
+    #   True if the numpy backend should be used -- bool
+    #
+    ############################################################################
+    def UseNumpy(self):
+        backend = self.backend if self.backend is not None else default_backend
+        return backend == 'numpy' and numpy_backend.numpy is not None and self.alphabet is type(self).alphabet
+
     ############################################################################
     #
     # Function: SetKey
@@ -58,12 +317,805 @@ class CipherInterface:
     def Decrypt(self, ciphertext):
         return ciphertext
 
+    ############################################################################
+    #
+    # Function: EncryptBytes
+    #
+    # Purpose: Encrypts ascii data without going through str
+    #
+    # Input:
+    #   data -- bytes, bytearray or memoryview: Data to be encrypted
+    #
+    # Output:
+    #   Encrypted data -- bytes
+    #
+    # This will be overwritten in subclasses.  The default goes through
+    #  Encrypt for ciphers that only work on str.
+    #
+    ############################################################################
+    def EncryptBytes(self, data):
+        return self.Encrypt(bytes(data).decode('ascii', 'ignore')).encode('ascii')
+
+    ############################################################################
+    #
+    # Function: DecryptBytes
+    #
+    # Purpose: Decrypts ascii data without going through str
+    #
+    # Input:
+    #   data -- bytes, bytearray or memoryview: Data to be decrypted
+    #
+    # Output:
+    #   Decrypted data -- bytes
+    #
+    # This will be overwritten in subclasses.  The default goes through
+    #  Decrypt for ciphers that only work on str.
+    #
+    ############################################################################
+    def DecryptBytes(self, data):
+        return self.Decrypt(bytes(data).decode('ascii', 'ignore')).encode('ascii')
+
+    ############################################################################
+    #
+    # Function: MaxOutputLength
+    #
+    # Purpose: Gives the most bytes Encrypt can return for an input, so
+    #           output buffers can be allocated up front
+    #
+    # Input:
+    #   length -- int: Length of the input
+    #
+    # Output:
+    #   length -- int
+    #
+    # Ciphers that pad overwrite this
+    #
+    ############################################################################
+    def MaxOutputLength(self, length):
+        return length
+
+    ############################################################################
+    #
+    # Function: EncryptInto
+    #
+    # Purpose: Encrypts data into a caller supplied buffer.  A buffer of
+    #           MaxOutputLength is always enough.
+    #
+    # Input:
+    #   data -- bytes, bytearray or memoryview: Data to be encrypted
+    #   out -- writable buffer: Where the encrypted bytes are written
+    #
+    # Output:
+    #   Number of bytes written -- int
+    #
+    ############################################################################
+    def EncryptInto(self, data, out):
+        return WriteInto(self.EncryptBytes(data), out)
+
+    ############################################################################
+    #
+    # Function: DecryptInto
+    #
+    # Purpose: Decrypts data into a caller supplied buffer
+    #
+    # Input:
+    #   data -- bytes, bytearray or memoryview: Data to be decrypted
+    #   out -- writable buffer: Where the decrypted bytes are written
+    #
+    # Output:
+    #   Number of bytes written -- int
+    #
+    ############################################################################
+    def DecryptInto(self, data, out):
+        return WriteInto(self.DecryptBytes(data), out)
+
+    ############################################################################
+    #
+    # Function: EncryptStream
+    #
+    # Purpose: Encrypts text that arrives in chunks.  Only one chunk is held
+    #           in memory at a time.  The output is the same as calling
+    #           Encrypt on the concatenation of all the chunks.
+    #
+    # Input:
+    #   chunks -- iterable: Strings to be encrypted
+    #
+    # Output:
+    #   Yields encrypted text -- string
+    #
+    # Ciphers that carry state between letters overwrite this.  The default
+    #  works for ciphers where each letter is encrypted on its own.
+    #
+    ############################################################################
+    def EncryptStream(self, chunks):
+        for chunk in chunks:
+            encrypted = self.Encrypt(chunk)
+            if encrypted:
+                yield encrypted
+
+    ############################################################################
+    #
+    # Function: DecryptStream
+    #
+    # Purpose: Decrypts text that arrives in chunks.  Only one chunk is held
+    #           in memory at a time.  The output is the same as calling
+    #           Decrypt on the concatenation of all the chunks.
+    #
+    # Input:
+    #   chunks -- iterable: Strings to be decrypted
+    #
+    # Output:
+    #   Yields decrypted text -- string
+    #
+    # Ciphers that carry state between letters overwrite this.  The default
+    #  works for ciphers where each letter is decrypted on its own.
+    #
+    ############################################################################
+    def DecryptStream(self, chunks):
+        for chunk in chunks:
+            decrypted = self.Decrypt(chunk)
+            if decrypted:
+                yield decrypted
+
+    ############################################################################
+    #
+    # Function: EncryptFile
+    #
+    # Purpose: Encrypts infile into outfile chunk by chunk
+    #
+    # Input:
+    #   infile -- file: Text file opened for reading
+    #   outfile -- file: Text file opened for writing
+    #   chunk_size -- int: Number of chars read at a time
+    #
+    # Output:
+    #   None
+    #
+    ############################################################################
+    def EncryptFile(self, infile, outfile, chunk_size=CHUNK_SIZE):
+        for encrypted in self.EncryptStream(ReadChunks(infile, chunk_size)):
+            outfile.write(encrypted)
+
+    ############################################################################
+    #
+    # Function: DecryptFile
+    #
+    # Purpose: Decrypts infile into outfile chunk by chunk
+    #
+    # Input:
+    #   infile -- file: Text file opened for reading
+    #   outfile -- file: Text file opened for writing
+    #   chunk_size -- int: Number of chars read at a time
+    #
+    # Output:
+    #   None
+    #
+    ############################################################################
+    def DecryptFile(self, infile, outfile, chunk_size=CHUNK_SIZE):
+        for decrypted in self.DecryptStream(ReadChunks(infile, chunk_size)):
+            outfile.write(decrypted)
+
+    ############################################################################
+    #
+    # Function: RangeAlignment
+    #
+    # Purpose: Tells DecryptRange which windows it can decrypt on their own.
+    #           A window that starts and ends on a multiple of the alignment
+    #           is decrypted from its own bytes, others are widened to the
+    #           nearest multiples first.
+    #
+    # Input:
+    #   None
+    #
+    # Output:
+    #   alignment -- int: Offsets must be a multiple of this, or None if
+    #                      everything has to be decrypted
+    #
+    # Ciphers that can seek overwrite this
+    #
+    ############################################################################
+    def RangeAlignment(self):
+        return None
+
+    ############################################################################
+    #
+    # Function: DecryptWindow
+    #
+    # Purpose: Decrypts ciphertext[start:end].  The default decrypts all of
+    #           it and slices.
+    #
+    # Input:
+    #   ciphertext -- string, bytes or mmap: Ciphertext as Encrypt returned
+    #                  it
+    #   start -- int: First position wanted
+    #   end -- int: Position after the last one wanted, at most
+    #                len(ciphertext)
+    #
+    # Output:
+    #   Decrypted window -- string for string input, otherwise bytes
+    #
+    # Ciphers that can seek overwrite this
+    #
+    ############################################################################
+    def DecryptWindow(self, ciphertext, start, end):
+        return self.Decrypt(ReadWindow(ciphertext, 0, len(ciphertext)))[start:end]
+
+    ############################################################################
+    #
+    # Function: DecryptRange
+    #
+    # Purpose: Decrypts length chars of ciphertext from start without
+    #           decrypting what comes before, as far as the cipher allows.
+    #           The result is the same as Decrypt(ciphertext)[start:start +
+    #           length].
+    #
+    # Input:
+    #   ciphertext -- string, bytes, bytearray, memoryview or mmap:
+    #                  Ciphertext as Encrypt returned it.  A binary file
+    #                  goes through DecryptFileRange.
+    #   start -- int: First position wanted
+    #   length -- int: Number of chars wanted, fewer come back past the end
+    #
+    # Output:
+    #   Decrypted text -- string for string input, otherwise bytes
+    #
+    ############################################################################
+    def DecryptRange(self, ciphertext, start, length):
+        if hasattr(ciphertext, 'fileno'):
+            return self.DecryptFileRange(ciphertext, start, length)
+        if start < 0 or length < 0:
+            raise ValueError('Range needs a start and length of at least 0, got %d, %d' % (start, length))
+        if isinstance(ciphertext, (bytearray, memoryview)):
+            ciphertext = memoryview(ciphertext).cast('B')
+        end = min(start + length, len(ciphertext))
+        if start >= end:
+            return ciphertext[:0] if isinstance(ciphertext, (str, bytes)) else b''
+        return self.DecryptWindow(ciphertext, start, end)
+
+    ############################################################################
+    #
+    # Function: DecryptFileRange
+    #
+    # Purpose: Decrypts a range of a ciphertext file.  The file is mapped
+    #           into memory so only the pages the cipher reads are loaded.
+    #
+    # Input:
+    #   infile -- string or file: Path, or a file opened in binary mode
+    #   start -- int: First position wanted
+    #   length -- int: Number of chars wanted
+    #
+    # Output:
+    #   Decrypted text -- bytes
+    #
+    ############################################################################
+    def DecryptFileRange(self, infile, start, length):
+        if not hasattr(infile, 'fileno'):
+            with open(infile, 'rb') as fileobj:
+                return self.DecryptFileRange(fileobj, start, length)
+        # mmap can not map an empty file
+        if not length or os.fstat(infile.fileno()).st_size == 0:
+            return self.DecryptRange(b'', start, length)
+        with mmap.mmap(infile.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+            return self.DecryptRange(mapped, start, length)
+
+    ############################################################################
+    #
+    # Function: SpliceIndex
+    #
+    # Purpose: Builds whatever EncryptSplices needs to find its place in a
+    #           document quickly
+    #
+    # Input:
+    #   plaintext -- bytearray: Normalized letters of the document
+    #
+    # Output:
+    #   index -- Anything, None if the cipher needs nothing
+    #
+    # Ciphers whose positions are not fixed overwrite this
+    #
+    ############################################################################
+    def SpliceIndex(self, plaintext):
+        return None
+
+    ############################################################################
+    #
+    # Function: EncryptSplices
+    #
+    # Purpose: Edits an encrypted document.  Each splice replaces
+    #           plaintext[start:end] with text, and the ciphertext is
+    #           brought up to date by reencrypting only what the cipher
+    #           needs around the edit.  Splices apply in order, each one
+    #           to the text left by the ones before it.
+    #
+    # Input:
+    #   plaintext -- bytearray: Normalized letters, updated in place
+    #   ciphertext -- bytearray: EncryptBytes(plaintext), updated in place
+    #   splices -- iterable: (start, end, text) tuples.  text is normalized
+    #                         first and can be str or bytes.
+    #   index -- From SpliceIndex, updated in place.  None builds one.
+    #
+    # Output:
+    #   ciphertext -- bytearray: The same buffer that was passed in
+    #
+    ############################################################################
+    def EncryptSplices(self, plaintext, ciphertext, splices, index=None):
+        if not isinstance(plaintext, bytearray) or not isinstance(ciphertext, bytearray):
+            raise ValueError('EncryptSplices edits bytearrays in place')
+        if index is None:
+            index = self.SpliceIndex(plaintext)
+        for start, end, text in splices:
+            if not 0 <= start <= end <= len(plaintext):
+                raise ValueError('Splice %d:%d is outside of %d letters' % (start, end, len(plaintext)))
+            if isinstance(text, str):
+                letters = self.normalizer.Translate(text).encode(self.alphabet.encoding)
+            else:
+                letters = self.normalizer.TranslateBytes(text)
+            self.EncryptSplice(plaintext, ciphertext, start, end, letters, index)
+        return ciphertext
+
+    ############################################################################
+    #
+    # Function: EncryptSplice
+    #
+    # Purpose: Applies one splice for EncryptSplices.  The default
+    #           reencrypts the whole document.
+    #
+    # Input:
+    #   plaintext -- bytearray: Normalized letters, updated in place
+    #   ciphertext -- bytearray: Encrypted letters, updated in place
+    #   start -- int: First letter replaced
+    #   end -- int: Letter after the last one replaced
+    #   letters -- bytes: Normalized letters put in their place
+    #   index -- From SpliceIndex
+    #
+    # Output:
+    #   None
+    #
+    # Ciphers that can do better overwrite this
+    #
+    ############################################################################
+    def EncryptSplice(self, plaintext, ciphertext, start, end, letters, index):
+        plaintext[start:end] = letters
+        ciphertext[:] = self.EncryptBytes(plaintext)
+
+    ############################################################################
+    #
+    # Function: EncryptBatch
+    #
+    # Purpose: Encrypts a list of messages with the current key
+    #
+    # Input:
+    #   messages -- list: Strings to be encrypted
+    #
+    # Output:
+    #   Encrypted messages -- list
+    #
+    # Ciphers that can do the whole list in bulk overwrite this
+    #
+    ############################################################################
+    def EncryptBatch(self, messages):
+        return [self.Encrypt(x) for x in messages]
+
+    ############################################################################
+    #
+    # Function: DecryptBatch
+    #
+    # Purpose: Decrypts a list of messages with the current key
+    #
+    # Input:
+    #   messages -- list: Strings to be decrypted
+    #
+    # Output:
+    #   Decrypted messages -- list
+    #
+    # Ciphers that can do the whole list in bulk overwrite this
+    #
+    ############################################################################
+    def DecryptBatch(self, messages):
+        return [self.Decrypt(x) for x in messages]
+
+    ############################################################################
+    #
+    # Function: TranslateMany
+    #
+    # Purpose: Groups messages by key and runs each group through batch_func.
+    #           SetKey is called once per distinct key on a copy of this
+    #           instance so the current key is left alone.
+    #
+    # Input:
+    #   messages -- iterable: Strings to be translated
+    #   keys -- iterable: Key for each message, or None to use the current
+    #                      key for all of them
+    #   batch_func -- string: 'EncryptBatch' or 'DecryptBatch'
+    #
+    # Output:
+    #   Translated messages in the same order -- list
+    #
+    ############################################################################
+    def TranslateMany(self, messages, keys, batch_func):
+        messages = list(messages)
+        if keys is None:
+            return getattr(self, batch_func)(messages)
+
+        keys = list(keys)
+        if len(keys) != len(messages):
+            raise ValueError('Got %d keys for %d messages' % (len(keys), len(messages)))
+        groups = {}
+        for i, key in enumerate(keys):
+            groups.setdefault(key, []).append(i)
+
+        results = [None] * len(messages)
+        for key, indexes in groups.items():
+            cipher = copy.copy(self)
+            cipher.SetKey(key)
+            translated = getattr(cipher, batch_func)([messages[i] for i in indexes])
+            for i, message in zip(indexes, translated):
+                results[i] = message
+        return results
+
+    ############################################################################
+    #
+    # Function: EncryptMany
+    #
+    # Purpose: Encrypts many messages in one call
+    #
+    # Input:
+    #   messages -- iterable: Strings to be encrypted
+    #   keys -- iterable: Key for each message, or None to use the current
+    #                      key for all of them
+    #
+    # Output:
+    #   Encrypted messages in the same order -- list
+    #
+    ############################################################################
+    def EncryptMany(self, messages, keys=None):
+        return self.TranslateMany(messages, keys, 'EncryptBatch')
+
+    ############################################################################
+    #
+    # Function: DecryptMany
+    #
+    # Purpose: Decrypts many messages in one call
+    #
+    # Input:
+    #   messages -- iterable: Strings to be decrypted
+    #   keys -- iterable: Key for each message, or None to use the current
+    #                      key for all of them
+    #
+    # Output:
+    #   Decrypted messages in the same order -- list
+    #
+    ############################################################################
+    def DecryptMany(self, messages, keys=None):
+        return self.TranslateMany(messages, keys, 'DecryptBatch')
+
+
+    ############################################################################
+    #
+    # Function: ParallelAlignment
+    #
+    # Purpose: Tells the parallel functions where the text can be split.
+    #           Pieces of prepped text that start on a multiple of the
+    #           alignment can be translated on their own.
+    #
+    # Input:
+    #   None
+    #
+    # Output:
+    #   alignment -- int: Piece length must be a multiple of this, or None if
+    #                      the text can not be split
+    #
+    # Ciphers that can be split overwrite this
+    #
+    ############################################################################
+    def ParallelAlignment(self):
+        return None
+
+    ############################################################################
+    #
+    # Function: KeySchedule
+    #
+    # Purpose: Describes the cipher as a shift of each letter through the
+    #           alphabet by an amount that repeats with the key, so
+    #           CipherChain can fuse it with its neighbours
+    #
+    # Input:
+    #   None
+    #
+    # Output:
+    #   shifts -- list: Shift for each position of one period of the key,
+    #                    or None if the cipher is not a shift
+    #
+    # Substitution ciphers overwrite this
+    #
+    ############################################################################
+    def KeySchedule(self):
+        return None
+
+    ############################################################################
+    #
+    # Function: Permutation
+    #
+    # Purpose: Describes the cipher as a reordering of the letters, so
+    #           CipherChain can fold it into its neighbours
+    #
+    # Input:
+    #   length -- int: Number of letters
+    #
+    # Output:
+    #   permutation -- list: Index into the plaintext for each position of
+    #                         the ciphertext, or None if the cipher is not a
+    #                         reordering
+    #
+    # Transposition ciphers overwrite this
+    #
+    ############################################################################
+    def Permutation(self, length):
+        return None
+
+    ############################################################################
+    #
+    # Function: MapParallel
+    #
+    # Purpose: Runs a function of this cipher over each set of arguments
+    #           across a pool of worker processes
+    #
+    # Input:
+    #   func_name -- string: Name of the function to run
+    #   args -- list: One tuple of arguments per call
+    #   workers -- int: Number of processes, None for one per cpu
+    #
+    # Output:
+    #   Results in the same order as args -- list
+    #
+    ############################################################################
+    def MapParallel(self, func_name, args, workers):
+        with ProcessPoolExecutor(workers, initializer=InitWorker, initargs=(self,)) as pool:
+            return list(pool.map(CallWorker, repeat(func_name), *zip(*args)))
+
+    ############################################################################
+    #
+    # Function: TranslateParallel
+    #
+    # Purpose: Splits text into pieces on ParallelAlignment boundaries and
+    #           runs func_name on each piece in a worker process.  Falls back
+    #           to a single call when the text can not be split or fits in
+    #           one piece.
+    #
+    # Input:
+    #   text -- string or bytes: Text to be translated, mmap works too
+    #   func_name -- string: 'Encrypt' or 'Decrypt'
+    #   workers -- int: Number of processes, None for one per cpu
+    #   chunk_size -- int: Approximate number of chars per piece
+    #
+    # Output:
+    #   Translated text -- string
+    #
+    ############################################################################
+    def TranslateParallel(self, text, func_name, workers, chunk_size):
+        alignment = self.ParallelAlignment()
+        if alignment is None:
+            return getattr(self, func_name)(text)
+        # Splitting at any char is safe when each letter stands alone so the
+        #  prep can be left to the workers
+        if alignment > 1:
+            text = self.PrepStringForCipher(text)
+        chunk_size = max(alignment, chunk_size // alignment * alignment)
+        if len(text) <= chunk_size:
+            return getattr(self, func_name)(text)
+        pieces = [(text[i:i + chunk_size],) for i in range(0, len(text), chunk_size)]
+        # text[:0] joins str pieces into a str and bytes pieces into bytes
+        return text[:0].join(self.MapParallel(func_name, pieces, workers))
+
+    ############################################################################
+    #
+    # Function: EncryptParallel
+    #
+    # Purpose: Encrypts plaintext across a pool of worker processes.  The
+    #           output is the same as Encrypt.
+    #
+    # Input:
+    #   plaintext -- string or bytes: Text to be encrypted
+    #   workers -- int: Number of processes, None for one per cpu
+    #   chunk_size -- int: Approximate number of chars per worker task
+    #
+    # Output:
+    #   Encrypted text -- string
+    #
+    ############################################################################
+    def EncryptParallel(self, plaintext, workers=None, chunk_size=PARALLEL_CHUNK_SIZE):
+        return self.TranslateParallel(plaintext, 'Encrypt', workers, chunk_size)
+
+    ############################################################################
+    #
+    # Function: DecryptParallel
+    #
+    # Purpose: Decrypts ciphertext across a pool of worker processes.  The
+    #           output is the same as Decrypt.
+    #
+    # Input:
+    #   ciphertext -- string or bytes: Text to be decrypted
+    #   workers -- int: Number of processes, None for one per cpu
+    #   chunk_size -- int: Approximate number of chars per worker task
+    #
+    # Output:
+    #   Decrypted text -- string
+    #
+    ############################################################################
+    def DecryptParallel(self, ciphertext, workers=None, chunk_size=PARALLEL_CHUNK_SIZE):
+        return self.TranslateParallel(ciphertext, 'Decrypt', workers, chunk_size)
+
+    ############################################################################
+    #
+    # Function: TranslateAsync
+    #
+    # Purpose: Runs func_name from a coroutine.  Short inputs run inline
+    #           since handing them off costs more than translating them,
+    #           longer ones go to executor so the event loop keeps running.
+    #
+    # Input:
+    #   data -- string or bytes: Text to be translated
+    #   func_name -- string: 'Encrypt' or 'Decrypt'
+    #   executor -- concurrent.futures.Executor: Where long inputs run, None
+    #                for the loop's default thread pool.  A process pool
+    #                also works and does not share the GIL.
+    #   inline_size -- int: Longest input that runs inline
+    #
+    # Output:
+    #   Translated text -- string, or bytes for bytes input
+    #
+    ############################################################################
+    async def TranslateAsync(self, data, func_name, executor, inline_size):
+        if len(data) <= inline_size:
+            return getattr(self, func_name)(data)
+        return await asyncio.get_running_loop().run_in_executor(executor, getattr(self, func_name), data)
+
+    ############################################################################
+    #
+    # Function: EncryptAsync
+    #
+    # Purpose: Encrypts plaintext without blocking the event loop
+    #
+    # Input:
+    #   plaintext -- string or bytes: Text to be encrypted
+    #   executor -- concurrent.futures.Executor: Where long inputs run, None
+    #                for the loop's default thread pool
+    #   inline_size -- int: Longest input that runs inline
+    #
+    # Output:
+    #   Encrypted text -- string, or bytes for bytes input
+    #
+    ############################################################################
+    async def EncryptAsync(self, plaintext, executor=None, inline_size=ASYNC_INLINE_SIZE):
+        return await self.TranslateAsync(plaintext, 'Encrypt', executor, inline_size)
+
+    ############################################################################
+    #
+    # Function: DecryptAsync
+    #
+    # Purpose: Decrypts ciphertext without blocking the event loop
+    #
+    # Input:
+    #   ciphertext -- string or bytes: Text to be decrypted
+    #   executor -- concurrent.futures.Executor: Where long inputs run, None
+    #                for the loop's default thread pool
+    #   inline_size -- int: Longest input that runs inline
+    #
+    # Output:
+    #   Decrypted text -- string, or bytes for bytes input
+    #
+    ############################################################################
+    async def DecryptAsync(self, ciphertext, executor=None, inline_size=ASYNC_INLINE_SIZE):
+        return await self.TranslateAsync(ciphertext, 'Decrypt', executor, inline_size)
+
+    ############################################################################
+    #
+    # Function: TranslateStreamAsync
+    #
+    # Purpose: Pipes an asyncio stream through EncryptStream or
+    #           DecryptStream.  The stream function runs in a thread and
+    #           waits on the event loop for every read and for every write
+    #           to drain, so a slow reader on the other end holds back the
+    #           reading side instead of filling memory.
+    #
+    # Input:
+    #   reader -- asyncio.StreamReader: Stream to read from
+    #   writer -- asyncio.StreamWriter: Stream to write to, left open
+    #   stream_name -- string: 'EncryptStream' or 'DecryptStream'
+    #   chunk_size -- int: Most bytes read at a time
+    #   executor -- concurrent.futures.ThreadPoolExecutor: Where the stream
+    #                function runs, None for GetStreamExecutor's pool
+    #
+    # Output:
+    #   (bytes_in, bytes_out) -- tuple (int, int)
+    #
+    ############################################################################
+    async def TranslateStreamAsync(self, reader, writer, stream_name, chunk_size, executor):
+        loop = asyncio.get_running_loop()
+        counts = [0, 0]
+
+        def Chunks():
+            while True:
+                chunk = asyncio.run_coroutine_threadsafe(reader.read(chunk_size), loop).result()
+                if not chunk:
+                    return
+                counts[0] += len(chunk)
+                # latin-1 turns any byte into one char, the ciphers drop
+                #  what is not a letter
+                yield chunk.decode('latin-1')
+
+        def Pump():
+            for translated in getattr(self, stream_name)(Chunks()):
+                data = translated.encode('ascii')
+                asyncio.run_coroutine_threadsafe(WriteAndDrain(writer, data), loop).result()
+                counts[1] += len(data)
+
+        await loop.run_in_executor(executor or GetStreamExecutor(), Pump)
+        return tuple(counts)
+
+    ############################################################################
+    #
+    # Function: EncryptStreamAsync
+    #
+    # Purpose: Encrypts everything read from reader into writer
+    #
+    # Input:
+    #   reader -- asyncio.StreamReader: Plaintext to read
+    #   writer -- asyncio.StreamWriter: Where ciphertext goes, left open
+    #   chunk_size -- int: Most bytes read at a time
+    #   executor -- concurrent.futures.ThreadPoolExecutor: Where the cipher
+    #                runs, None for GetStreamExecutor's pool
+    #
+    # Output:
+    #   (bytes_in, bytes_out) -- tuple (int, int)
+    #
+    ############################################################################
+    async def EncryptStreamAsync(self, reader, writer, chunk_size=CHUNK_SIZE, executor=None):
+        return await self.TranslateStreamAsync(reader, writer, 'EncryptStream', chunk_size, executor)
+
+    ############################################################################
+    #
+    # Function: DecryptStreamAsync
+    #
+    # Purpose: Decrypts everything read from reader into writer
+    #
+    # Input:
+    #   reader -- asyncio.StreamReader: Ciphertext to read
+    #   writer -- asyncio.StreamWriter: Where plaintext goes, left open
+    #   chunk_size -- int: Most bytes read at a time
+    #   executor -- concurrent.futures.ThreadPoolExecutor: Where the cipher
+    #                runs, None for GetStreamExecutor's pool
+    #
+    # Output:
+    #   (bytes_in, bytes_out) -- tuple (int, int)
+    #
+    ############################################################################
+    async def DecryptStreamAsync(self, reader, writer, chunk_size=CHUNK_SIZE, executor=None):
+        return await self.TranslateStreamAsync(reader, writer, 'DecryptStream', chunk_size, executor)
+
+    ############################################################################
+    #
+    # Function: StartTimer
+    #
+    # Purpose: Starts timing a call for the metrics hooks.  While no hook is
+    #           listening this is None and callers skip their timing calls.
+    #
+    # Input:
+    #   op -- string: Name of the call, e.g. 'encrypt'
+    #
+    # Output:
+    #   timer -- metrics.StageTimer, or None
+    #
+    ############################################################################
+    def StartTimer(self, op):
+        return metrics.StartTimer(self, op)
 
     ############################################################################
     #
     # Function: PrepStringForCipher
     #
-    # Purpose: Removes all nonalpha chars from text
+    # Purpose: Removes all nonalpha chars from text using the cipher's
+    #           normalizer
     #
     # Input:
     #   text -- string: Text that will get encrypted
@@ -73,10 +1125,9 @@ class CipherInterface:
     #
     ############################################################################
     def PrepStringForCipher(self, text):
-        # Ensure everything is lowercase that why .lower() is called
-        #  Also removes spaces and non-alpha chars
-        text = re.sub(r'[\W0-9 ]+', '', text.lower())
-        return text
+        # Ensures everything is lowercase and removes spaces and non-alpha
+        #  chars in a single pass
+        return self.normalizer.Normalize(text)
 ################################################################################
 #
 # end CipherInterface
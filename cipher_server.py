@@ -0,0 +1,259 @@
+from cipher_cache import CIPHERS, GetCipher
+from cipher_interface import ASYNC_INLINE_SIZE, CHUNK_SIZE
+from concurrent.futures import ProcessPoolExecutor
+import argparse
+import asyncio
+import sys
+
+################################################################################
+#
+# Cipher server
+#
+# Example asyncio TCP server on top of EncryptAsync and EncryptStreamAsync.
+#  A connection sends any number of requests, each a header line followed
+#  by its payload:
+#
+#   encrypt vigenere lemon 14\n
+#   attack at dawn
+#
+#  and gets back 'OK <length>\n' and the result, or 'ERR <message>\n'.  A
+#  length of - streams: everything up to the end of the connection is
+#  translated as it arrives and the result is written back until the
+#  server closes the connection.
+#
+# A request that is refused still has its payload read, so the next header
+#  is found where the client put it.  A header whose length can not be
+#  read leaves no way to find the next one, so the connection is closed
+#  after the ERR line.
+#
+# Usage:
+#   python cipher_server.py [--port 8765] [--executor process]
+#
+################################################################################
+
+# Port the example listens on by default
+DEFAULT_PORT = 8765
+
+# Longest header line accepted
+MAX_HEADER = 1024
+
+# Largest payload accepted for a single request
+MAX_PAYLOAD = 64 * 1024 * 1024
+
+################################################################################
+#
+# Function: ParseHeader
+#
+# Purpose: Splits a request header into its fields and reads the payload
+#           length.  The other fields are checked by MakeCipher once the
+#           length is known.
+#
+# Input:
+#   line -- bytes: Header line without the newline
+#
+# Output:
+#   (command, name, key, length) -- tuple (string, string, string, int):
+#                                    length is None for a stream
+#
+################################################################################
+def ParseHeader(line):
+    fields = line.decode('ascii', 'replace').split()
+    if len(fields) != 4:
+        raise ValueError('expected: encrypt|decrypt <cipher> <key> <length|->')
+    command, name, key, length = fields
+    if length == '-':
+        length = None
+    elif not length.isdigit() or int(length) > MAX_PAYLOAD:
+        raise ValueError('bad length %r' % length)
+    else:
+        length = int(length)
+    return (command, name, key, length)
+
+################################################################################
+#
+# Function: MakeCipher
+#
+# Purpose: Checks the command and returns the keyed cipher for a request
+#
+# Input:
+#   command -- string: Should be 'encrypt' or 'decrypt'
+#   name -- string: Cipher name
+#   key -- string: Key for the cipher
+#
+# Output:
+#   cipher -- CipherInterface
+#
+################################################################################
+def MakeCipher(command, name, key):
+    if command not in ('encrypt', 'decrypt'):
+        raise ValueError('unknown command %r' % command)
+    if name not in CIPHERS:
+        raise ValueError('unknown cipher %r' % name)
+    return GetCipher(name, key)
+
+################################################################################
+#
+# Function: Drain
+#
+# Purpose: Reads and drops the payload of a refused request
+#
+# Input:
+#   reader -- asyncio.StreamReader: Connection to read from
+#   length -- int: Payload length
+#
+# Output:
+#   None
+#
+################################################################################
+async def Drain(reader, length):
+    while length:
+        length -= len(await reader.readexactly(min(length, CHUNK_SIZE)))
+
+################################################################################
+#
+# Function: SendError
+#
+# Purpose: Answers a request with an ERR line
+#
+# Input:
+#   writer -- asyncio.StreamWriter: Connection to write to
+#   error -- Exception: What went wrong
+#
+# Output:
+#   None
+#
+################################################################################
+async def SendError(writer, error):
+    writer.write(('ERR %s\n' % error).encode('ascii', 'replace'))
+    await writer.drain()
+
+################################################################################
+#
+# Function: HandleClient
+#
+# Purpose: Answers requests on one connection until it closes
+#
+# Input:
+#   reader -- asyncio.StreamReader: Connection to read from
+#   writer -- asyncio.StreamWriter: Connection to write to
+#   executor -- concurrent.futures.Executor: Where large payloads run, None
+#                for the default thread pool
+#   inline_size -- int: Largest payload translated on the event loop
+#
+# Output:
+#   None
+#
+################################################################################
+async def HandleClient(reader, writer, executor=None, inline_size=ASYNC_INLINE_SIZE):
+    try:
+        while True:
+            line = await reader.readline()
+            if not line:
+                break
+            try:
+                if len(line) > MAX_HEADER:
+                    raise ValueError('header too long')
+                command, name, key, length = ParseHeader(line.strip())
+            except ValueError as error:
+                await SendError(writer, error)
+                break
+            try:
+                cipher = MakeCipher(command, name, key)
+            # Keys are checked by each cipher's SetKey, which can raise more
+            #  than ValueError for a bad one
+            except Exception as error:
+                if length is None:
+                    await SendError(writer, error)
+                    break
+                await Drain(reader, length)
+                await SendError(writer, error)
+                continue
+
+            if length is None:
+                try:
+                    if command == 'encrypt':
+                        await cipher.EncryptStreamAsync(reader, writer, CHUNK_SIZE)
+                    else:
+                        await cipher.DecryptStreamAsync(reader, writer, CHUNK_SIZE)
+                except Exception as error:
+                    await SendError(writer, error)
+                break
+
+            payload = await reader.readexactly(length)
+            try:
+                if command == 'encrypt':
+                    result = await cipher.EncryptAsync(payload, executor, inline_size)
+                else:
+                    result = await cipher.DecryptAsync(payload, executor, inline_size)
+            except Exception as error:
+                await SendError(writer, error)
+                continue
+            writer.write(b'OK %d\n' % len(result))
+            writer.write(result)
+            await writer.drain()
+    # readline raises ValueError when a header runs past the stream limit
+    except (asyncio.IncompleteReadError, ConnectionError, ValueError):
+        pass
+    finally:
+        writer.close()
+
+################################################################################
+#
+# Function: StartServer
+#
+# Purpose: Starts listening on the loopback interface
+#
+# Input:
+#   port -- int: Port to listen on, 0 picks a free one
+#   executor -- concurrent.futures.Executor: Where large payloads run
+#   inline_size -- int: Largest payload translated on the event loop
+#   host -- string: Address to listen on
+#
+# Output:
+#   server -- asyncio.Server
+#
+################################################################################
+async def StartServer(port=DEFAULT_PORT, executor=None, inline_size=ASYNC_INLINE_SIZE, host='127.0.0.1'):
+    return await asyncio.start_server(lambda reader, writer: HandleClient(reader, writer, executor, inline_size), host, port)
+
+################################################################################
+#
+# Function: Main
+#
+# Purpose: Runs the example server until it is interrupted
+#
+# Input:
+#   argv -- list: Arguments without the program name, None for sys.argv
+#
+# Output:
+#   Exit code -- int
+#
+################################################################################
+def Main(argv=None):
+    parser = argparse.ArgumentParser(prog='python cipher_server.py', description='Loopback cipher server example.')
+    parser.add_argument('--port', type=int, default=DEFAULT_PORT)
+    parser.add_argument('--inline-size', type=int, default=ASYNC_INLINE_SIZE,
+                        help='largest payload translated on the event loop (default %d)' % ASYNC_INLINE_SIZE)
+    parser.add_argument('--executor', choices=['thread', 'process'], default='thread',
+                        help='where larger payloads run (default thread)')
+    args = parser.parse_args(sys.argv[1:] if argv is None else argv)
+
+    async def Serve():
+        executor = ProcessPoolExecutor() if args.executor == 'process' else None
+        server = await StartServer(args.port, executor, args.inline_size)
+        print('listening on %s' % ', '.join(['%s:%d' % x.getsockname()[:2] for x in server.sockets]))
+        try:
+            async with server:
+                await server.serve_forever()
+        finally:
+            if executor:
+                executor.shutdown()
+
+    try:
+        asyncio.run(Serve())
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(Main())
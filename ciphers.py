@@ -0,0 +1,173 @@
+from cipher_cache import CIPHERS
+from cipher_interface import BACKENDS, CHUNK_SIZE, PARALLEL_CHUNK_SIZE, ReadChunks, WriteInto
+import argparse
+import io
+import mmap
+import os
+import sys
+import time
+
+################################################################################
+#
+# Ciphers command line tool
+#
+# Usage:
+#   python -m ciphers encrypt --cipher vigenere --key lemon in.txt out.txt
+#   cat in.txt | python -m ciphers decrypt --cipher caesar --key 3 > out.txt
+#
+################################################################################
+
+################################################################################
+#
+# Function: TranslateFile
+#
+# Purpose: Translates a file that is memory mapped for reading.  The output
+#           file is sized up front from MaxOutputLength and mapped so the
+#           cipher writes straight into it, then it is cut down to what was
+#           written.
+#
+# Input:
+#   cipher -- CipherInterface: Cipher with its key set
+#   command -- string: 'encrypt' or 'decrypt'
+#   in_path -- string: File to read
+#   out_path -- string: File to write
+#   workers -- int: Number of processes, 1 runs in this process
+#   chunk_size -- int: Approximate number of bytes per worker task
+#
+# Output:
+#   (bytes_in, bytes_out) -- tuple (int, int)
+#
+################################################################################
+def TranslateFile(cipher, command, in_path, out_path, workers, chunk_size):
+    with open(in_path, 'rb') as infile, open(out_path, 'w+b') as outfile:
+        size = os.fstat(infile.fileno()).st_size
+        max_length = cipher.MaxOutputLength(size)
+        # Empty files can not be mapped
+        if not max_length:
+            return (size, 0)
+        outfile.truncate(max_length)
+        with mmap.mmap(infile.fileno(), 0, access=mmap.ACCESS_READ) as data, mmap.mmap(outfile.fileno(), 0) as out:
+            if workers > 1:
+                func = cipher.EncryptParallel if command == 'encrypt' else cipher.DecryptParallel
+                written = WriteInto(func(data, workers, chunk_size), out)
+            else:
+                func = cipher.EncryptInto if command == 'encrypt' else cipher.DecryptInto
+                written = func(data, out)
+        outfile.truncate(written)
+    return (size, written)
+
+################################################################################
+#
+# Function: TranslatePipe
+#
+# Purpose: Translates a text stream chunk by chunk so memory stays bounded
+#           no matter how much data goes through
+#
+# Input:
+#   cipher -- CipherInterface: Cipher with its key set
+#   command -- string: 'encrypt' or 'decrypt'
+#   infile -- file: Binary file to read
+#   outfile -- file: Binary file to write
+#   chunk_size -- int: Number of bytes read at a time
+#
+# Output:
+#   (bytes_in, bytes_out) -- tuple (int, int)
+#
+################################################################################
+def TranslatePipe(cipher, command, infile, outfile, chunk_size):
+    # latin-1 turns any byte into one char, the ciphers drop what is not a
+    #  letter
+    reader = io.TextIOWrapper(infile, encoding='latin-1', newline='')
+    counts = [0, 0]
+
+    def Chunks():
+        for chunk in ReadChunks(reader, chunk_size):
+            counts[0] += len(chunk)
+            yield chunk
+
+    stream = cipher.EncryptStream if command == 'encrypt' else cipher.DecryptStream
+    try:
+        for translated in stream(Chunks()):
+            outfile.write(translated.encode('ascii'))
+            counts[1] += len(translated)
+        outfile.flush()
+    finally:
+        # Hand infile back untouched so the wrapper does not close it
+        reader.detach()
+    return tuple(counts)
+
+################################################################################
+#
+# Function: ParseArgs
+#
+# Purpose: Parses the command line
+#
+# Input:
+#   argv -- list: Arguments without the program name
+#
+# Output:
+#   args -- argparse.Namespace
+#
+################################################################################
+def ParseArgs(argv):
+    parser = argparse.ArgumentParser(prog='python -m ciphers', description='Encrypt or decrypt text with a classical cipher.')
+    parser.add_argument('command', choices=['encrypt', 'decrypt'])
+    parser.add_argument('input', nargs='?', default='-', help='input file, - for stdin (default)')
+    parser.add_argument('output', nargs='?', default='-', help='output file, - for stdout (default)')
+    parser.add_argument('--cipher', required=True, choices=sorted(CIPHERS))
+    parser.add_argument('--key', required=True, help='shift for caesar, rail count for railfence, a word otherwise')
+    parser.add_argument('--workers', type=int, default=1,
+                        help='worker processes, only when input and output are both files (default 1)')
+    parser.add_argument('--chunk-size', type=int, default=None,
+                        help='bytes per read for pipes, bytes per worker task for files')
+    parser.add_argument('--backend', choices=BACKENDS, default=None)
+    parser.add_argument('--stats', action='store_true', help='print bytes processed, wall time and throughput to stderr')
+    args = parser.parse_intermixed_args(argv)
+    if args.workers < 1:
+        parser.error('--workers must be at least 1')
+    # Pipes are read and written a chunk at a time in this process
+    if args.workers > 1 and '-' in (args.input, args.output):
+        parser.error('--workers needs an input and an output file, not stdin or stdout')
+    return args
+
+################################################################################
+#
+# Function: Main
+#
+# Purpose: Runs the command line tool
+#
+# Input:
+#   argv -- list: Arguments without the program name, None for sys.argv
+#
+# Output:
+#   Exit code -- int
+#
+################################################################################
+def Main(argv=None):
+    args = ParseArgs(sys.argv[1:] if argv is None else argv)
+    cipher = CIPHERS[args.cipher]()
+    cipher.SetKey(args.key)
+    cipher.SetBackend(args.backend)
+
+    start = time.perf_counter()
+    if args.input == '-':
+        outfile = sys.stdout.buffer if args.output == '-' else open(args.output, 'wb')
+        try:
+            bytes_in, bytes_out = TranslatePipe(cipher, args.command, sys.stdin.buffer, outfile, args.chunk_size or CHUNK_SIZE)
+        finally:
+            if outfile is not sys.stdout.buffer:
+                outfile.close()
+    elif args.output == '-':
+        with open(args.input, 'rb') as infile:
+            bytes_in, bytes_out = TranslatePipe(cipher, args.command, infile, sys.stdout.buffer, args.chunk_size or CHUNK_SIZE)
+    else:
+        bytes_in, bytes_out = TranslateFile(cipher, args.command, args.input, args.output, args.workers, args.chunk_size or PARALLEL_CHUNK_SIZE)
+    elapsed = time.perf_counter() - start
+
+    if args.stats:
+        sys.stderr.write('bytes in: %d\nbytes out: %d\nwall time: %.3f s\nthroughput: %.2f MB/s\n' %
+                         (bytes_in, bytes_out, elapsed, bytes_in / elapsed / 1e6 if elapsed else 0.0))
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(Main())
@@ -0,0 +1,489 @@
+from caesar_cipher import CaesarCipher
+from concurrent.futures import ProcessPoolExecutor
+from operator import truediv
+from rail_fence_cipher import RailFenceCipher
+from text_normalizer import LETTERS
+from vigenre_cipher import VigenreCipher
+import re
+import time
+
+################################################################################
+#
+# Cryptanalysis
+#
+# Recovers Caesar, Vigenre and Rail Fence keys from ciphertext alone.  The
+#  ciphertext is counted once into 26 bin histograms, one per position in
+#  the key, and every candidate shift is scored from the histograms.  Only
+#  the winning key is ever used to decrypt.
+#
+# IdentifyCipher tells which of the four ciphers made a ciphertext from the
+#  same counts, and IdentifyCiphers runs it over many texts in a pool.
+#
+################################################################################
+
+# Relative frequency of a-z in English text
+ENGLISH_FREQUENCIES = [
+    0.08167, 0.01492, 0.02782, 0.04253, 0.12702, 0.02228, 0.02015,
+    0.06094, 0.06966, 0.00153, 0.00772, 0.04025, 0.02406, 0.06749,
+    0.07507, 0.01929, 0.00095, 0.05987, 0.06327, 0.09056, 0.02758,
+    0.00978, 0.02360, 0.00150, 0.01974, 0.00074,
+]
+
+# Sum of ENGLISH_FREQUENCIES, a little under 1 from rounding
+ENGLISH_TOTAL = sum(ENGLISH_FREQUENCIES)
+
+# Index of coincidence of English text and of uniformly random letters
+ENGLISH_IOC = sum([x * x for x in ENGLISH_FREQUENCIES])
+RANDOM_IOC = 1.0 / 26
+
+# Longest Vigenre key that is looked for by default
+MAX_KEY_LENGTH = 20
+
+# Number of letters used to estimate the key length.  The index of
+#  coincidence settles long before this so the rest of the text is not
+#  counted once per candidate length.
+KEY_LENGTH_SAMPLE = 64 * 1024
+
+# A key length is taken once its index of coincidence is this close to the
+#  best one found.  Multiples of the real length score just as well, the
+#  smallest one is the key.
+KEY_LENGTH_TOLERANCE = 0.9
+
+# Share of all bigrams in English, in percent, for the most common ones.
+#  Every Rail Fence decryption has the same letter counts, only the right
+#  one has English bigrams.
+ENGLISH_BIGRAMS = {
+    b'th': 3.56, b'he': 3.07, b'in': 2.43, b'er': 2.05, b'an': 1.99, b're': 1.85,
+    b'on': 1.76, b'at': 1.49, b'en': 1.45, b'nd': 1.35, b'ti': 1.34, b'es': 1.34,
+    b'or': 1.28, b'te': 1.20, b'of': 1.17, b'ed': 1.17, b'is': 1.13, b'it': 1.12,
+    b'al': 1.09, b'ar': 1.07, b'st': 1.05, b'to': 1.04, b'nt': 1.04, b'ng': 0.95,
+    b'se': 0.93, b'ha': 0.93, b'as': 0.87, b'ou': 0.87, b'io': 0.83, b'le': 0.83,
+    b've': 0.83, b'co': 0.79, b'me': 0.79, b'de': 0.76, b'hi': 0.76, b'ri': 0.73,
+    b'ro': 0.73, b'ic': 0.70, b'ne': 0.69, b'ea': 0.69, b'ra': 0.69, b'ce': 0.65,
+}
+
+# Most rails CrackRailFence tries by default
+MAX_RAILS = 20
+
+# A ciphertext whose letter counts, shifted back, are within this
+#  chi-squared per letter of English swaps each letter for one other
+#  letter, or only moves the letters.  Playfair and Vigenre stay well above
+#  it.  Short texts stray from English by chance, so about the 25 degrees of
+#  freedom of the test are allowed on top.
+MONOALPHABETIC_CHI = 0.6
+MONOALPHABETIC_CHI_SLACK = 25.0
+
+# Matches when some pair of letters at an even position is a doubled
+#  letter, which Playfair never writes
+DOUBLED_PAIR_PATTERN = re.compile(rb'(?:..)*?(.)\1', re.DOTALL)
+
+# Ciphertexts sent to a worker process at a time by IdentifyCiphers
+IDENTIFY_CHUNK_SIZE = 64
+
+################################################################################
+#
+# Function: GetLetters
+#
+# Purpose: Normalizes ciphertext to a-z bytes
+#
+# Input:
+#   text -- string, bytes, bytearray or memoryview: Ciphertext
+#
+# Output:
+#   letters -- bytes: a-z only
+#
+################################################################################
+def GetLetters(text):
+    if isinstance(text, str):
+        return LETTERS.Translate(text).encode('ascii')
+    return LETTERS.TranslateBytes(text)
+
+################################################################################
+#
+# Function: ResidueHistograms
+#
+# Purpose: Counts the letters at every position in the key.  Each position
+#           is a strided slice counted in C.
+#
+# Input:
+#   letters -- bytes: a-z only
+#   period -- int: Key length
+#
+# Output:
+#   histograms -- list: One list of 26 counts per key position
+#
+################################################################################
+def ResidueHistograms(letters, period):
+    histograms = []
+    for loc in range(period):
+        residue = letters[loc::period]
+        histograms.append([residue.count(x) for x in range(97, 123)])
+    return histograms
+
+################################################################################
+#
+# Function: IndexOfCoincidence
+#
+# Purpose: Chance that two letters picked from a histogram are the same
+#
+# Input:
+#   histogram -- list: 26 letter counts
+#
+# Output:
+#   ioc -- float: About 0.067 for English, 0.038 for random letters
+#
+################################################################################
+def IndexOfCoincidence(histogram):
+    total = sum(histogram)
+    if total < 2:
+        return 0.0
+    return sum([x * (x - 1) for x in histogram]) / float(total * (total - 1))
+
+################################################################################
+#
+# Function: ChiSquared
+#
+# Purpose: Scores how far a histogram shifted back by shift is from English
+#
+# Input:
+#   histogram -- list: 26 letter counts
+#   shift -- int: Shift to undo, 0 - 25
+#
+# Output:
+#   score -- float: Lower is closer to English
+#
+################################################################################
+def ChiSquared(histogram, shift):
+    total = sum(histogram)
+    # Nothing to compare, every shift scores the same
+    if not total:
+        return 0.0
+    rotated = histogram[shift:] + histogram[:shift]
+    # sum((o - e)^2 / e) expanded to sum(o^2 / e) - 2 * sum(o) + sum(e), with
+    #  e = total * frequency
+    return sum(map(truediv, [x * x for x in rotated], ENGLISH_FREQUENCIES)) / total - 2 * total + total * ENGLISH_TOTAL
+
+################################################################################
+#
+# Function: BestShift
+#
+# Purpose: Finds the shift that makes a histogram look the most like English
+#
+# Input:
+#   histogram -- list: 26 letter counts
+#
+# Output:
+#   shift -- int: 0 - 25
+#
+################################################################################
+def BestShift(histogram):
+    return min(range(26), key=lambda shift: ChiSquared(histogram, shift))
+
+################################################################################
+#
+# Function: EstimateKeyLength
+#
+# Purpose: Guesses the Vigenre key length from the index of coincidence.
+#           Letters enciphered by the same key letter keep the English
+#           IoC, so the right length has the highest average IoC over its
+#           positions.
+#
+# Input:
+#   letters -- bytes: a-z only
+#   max_key_length -- int: Longest key to try
+#
+# Output:
+#   key_length -- int
+#
+################################################################################
+def EstimateKeyLength(letters, max_key_length=MAX_KEY_LENGTH):
+    sample = letters[:KEY_LENGTH_SAMPLE]
+    # Every position needs a few letters for the IoC to mean anything
+    max_key_length = max(1, min(max_key_length, len(sample) // 4))
+    scores = []
+    for period in range(1, max_key_length + 1):
+        histograms = ResidueHistograms(sample, period)
+        scores.append(sum([IndexOfCoincidence(x) for x in histograms]) / period)
+    best = max(scores)
+    for period, score in enumerate(scores, 1):
+        if score >= best * KEY_LENGTH_TOLERANCE:
+            return period
+
+################################################################################
+#
+# Function: FindCaesarShift
+#
+# Purpose: Recovers the rotation of a Caesar ciphertext
+#
+# Input:
+#   ciphertext -- string, bytes, bytearray or memoryview: Ciphertext
+#
+# Output:
+#   shift -- int: 0 - 25, usable as a CaesarCipher key
+#
+################################################################################
+def FindCaesarShift(ciphertext):
+    letters = GetLetters(ciphertext)
+    if not letters:
+        return 0
+    return BestShift(ResidueHistograms(letters, 1)[0])
+
+################################################################################
+#
+# Function: FindVigenreKey
+#
+# Purpose: Recovers the key of a Vigenre ciphertext
+#
+# Input:
+#   ciphertext -- string, bytes, bytearray or memoryview: Ciphertext
+#   key_length -- int: Key length if it is known, None to estimate it
+#   max_key_length -- int: Longest key to try when estimating
+#
+# Output:
+#   key -- string: a-z
+#
+################################################################################
+def FindVigenreKey(ciphertext, key_length=None, max_key_length=MAX_KEY_LENGTH):
+    letters = GetLetters(ciphertext)
+    if not letters:
+        return 'a'
+    if key_length is None:
+        key_length = EstimateKeyLength(letters, max_key_length)
+    return ''.join([chr(BestShift(x) + 97) for x in ResidueHistograms(letters, key_length)])
+
+################################################################################
+#
+# Function: CrackCaesar
+#
+# Purpose: Recovers the key of a Caesar ciphertext and decrypts it once
+#
+# Input:
+#   ciphertext -- string, bytes, bytearray or memoryview: Ciphertext
+#
+# Output:
+#   (shift, plaintext) -- tuple (int, string or bytes): plaintext is bytes
+#                          for anything but string input
+#
+################################################################################
+def CrackCaesar(ciphertext):
+    shift = FindCaesarShift(ciphertext)
+    cipher = CaesarCipher()
+    cipher.SetKey(shift)
+    return (shift, cipher.Decrypt(ciphertext))
+
+################################################################################
+#
+# Function: CrackVigenre
+#
+# Purpose: Recovers the key of a Vigenre ciphertext and decrypts it once
+#
+# Input:
+#   ciphertext -- string, bytes, bytearray or memoryview: Ciphertext
+#   key_length -- int: Key length if it is known, None to estimate it
+#   max_key_length -- int: Longest key to try when estimating
+#
+# Output:
+#   (key, plaintext) -- tuple (string, string or bytes): plaintext is bytes
+#                        for anything but string input
+#
+################################################################################
+def CrackVigenre(ciphertext, key_length=None, max_key_length=MAX_KEY_LENGTH):
+    letters = GetLetters(ciphertext)
+    key = FindVigenreKey(letters, key_length, max_key_length)
+    cipher = VigenreCipher()
+    cipher.SetKey(key)
+    # The letters are already normalized, shift them straight away
+    plaintext = cipher.ShiftBytes(letters, 1)
+    if isinstance(ciphertext, str):
+        return (key, plaintext.decode('ascii'))
+    return (key, plaintext)
+
+################################################################################
+#
+# Function: BigramScore
+#
+# Purpose: Scores how English the letter order of a text is
+#
+# Input:
+#   letters -- bytes: a-z only
+#
+# Output:
+#   score -- float: Higher is closer to English
+#
+################################################################################
+def BigramScore(letters):
+    return sum([letters.count(bigram) * share for bigram, share in ENGLISH_BIGRAMS.items()])
+
+################################################################################
+#
+# Function: FindRails
+#
+# Purpose: Recovers the number of rails of a Rail Fence ciphertext by
+#           decrypting it with every rail count and keeping the one with
+#           the most English bigrams.  Each rail count goes through
+#           RailFenceCipher.Reorder: texts up to CACHED_PERMUTATION_LENGTH
+#           letters share cached gatherers per length and rail count,
+#           longer ones are sliced into rails with nothing cached.
+#
+# Input:
+#   ciphertext -- string, bytes, bytearray or memoryview: Ciphertext
+#   max_rails -- int: Most rails to try
+#
+# Output:
+#   num_rails -- int: Usable as a RailFenceCipher key
+#
+################################################################################
+def FindRails(ciphertext, max_rails=MAX_RAILS):
+    letters = GetLetters(ciphertext)
+    # More rails than letters only repeats the text
+    max_rails = min(max_rails, len(letters) - 1)
+    if max_rails < 2:
+        return 2
+    cipher = RailFenceCipher()
+
+    def Score(num_rails):
+        cipher.SetKey(num_rails)
+        return BigramScore(cipher.Reorder(letters, 1))
+
+    return max(range(2, max_rails + 1), key=Score)
+
+################################################################################
+#
+# Function: CrackRailFence
+#
+# Purpose: Recovers the number of rails of a Rail Fence ciphertext and
+#           decrypts it once
+#
+# Input:
+#   ciphertext -- string, bytes, bytearray or memoryview: Ciphertext
+#   max_rails -- int: Most rails to try
+#
+# Output:
+#   (num_rails, plaintext) -- tuple (int, string or bytes): plaintext is
+#                              bytes for anything but string input
+#
+################################################################################
+def CrackRailFence(ciphertext, max_rails=MAX_RAILS):
+    num_rails = FindRails(ciphertext, max_rails)
+    cipher = RailFenceCipher()
+    cipher.SetKey(num_rails)
+    return (num_rails, cipher.Decrypt(ciphertext))
+
+################################################################################
+#
+# Function: IdentifyCipher
+#
+# Purpose: Tells which of Caesar, Vigenre, Rail Fence and Playfair made a
+#           ciphertext.  Everything comes from one normalized copy of the
+#           letters:
+#
+#             - Rail Fence only moves letters, so the letter counts match
+#                English as they are
+#             - Caesar swaps letters one for one, so they match English
+#                once shifted back
+#             - Playfair writes an even number of letters, never a doubled
+#                letter inside a pair and never a j
+#             - Vigenre is what is left, and its periodic index of
+#                coincidence gives the key length
+#
+# Input:
+#   ciphertext -- string, bytes, bytearray or memoryview: Ciphertext
+#   find_keys -- bool: Also recover the key for Caesar, Vigenre and Rail
+#                       Fence
+#
+# Output:
+#   (name, stats) -- tuple (string, dict): name is a cipher_cache.CIPHERS
+#                     name, or None for fewer than two letters.  stats holds
+#                     the measurements the choice was made from, and the
+#                     key when it was asked for.
+#
+################################################################################
+def IdentifyCipher(ciphertext, find_keys=False):
+    letters = GetLetters(ciphertext)
+    stats = {'letters': len(letters)}
+    if len(letters) < 2:
+        return (None, stats)
+    histogram = ResidueHistograms(letters, 1)[0]
+    scores = [ChiSquared(histogram, shift) / len(letters) for shift in range(26)]
+    shift = min(range(26), key=scores.__getitem__)
+    stats['ioc'] = IndexOfCoincidence(histogram)
+    stats['english_chi'] = scores[0]
+    stats['shifted_chi'] = scores[shift]
+    stats['even'] = len(letters) % 2 == 0
+    stats['doubled_pair'] = DOUBLED_PAIR_PATTERN.match(letters) is not None
+    stats['has_j'] = histogram[9] > 0
+
+    if stats['shifted_chi'] <= MONOALPHABETIC_CHI + MONOALPHABETIC_CHI_SLACK / len(letters):
+        if shift == 0:
+            name = 'railfence'
+            if find_keys:
+                stats['key'] = FindRails(letters)
+        else:
+            name = 'caesar'
+            if find_keys:
+                stats['key'] = shift
+    elif stats['even'] and not stats['doubled_pair'] and not stats['has_j']:
+        name = 'playfair'
+    else:
+        name = 'vigenere'
+        key_length = EstimateKeyLength(letters)
+        stats['key_length'] = key_length
+        stats['periodic_ioc'] = sum([IndexOfCoincidence(x) for x in ResidueHistograms(letters, key_length)]) / key_length
+        if find_keys:
+            stats['key'] = FindVigenreKey(letters, key_length)
+    return (name, stats)
+
+################################################################################
+#
+# Function: IdentifyWorker
+#
+# Purpose: Runs IdentifyCipher over a chunk of ciphertexts in a worker
+#           process
+#
+# Input:
+#   ciphertexts -- list: Ciphertexts
+#   find_keys -- bool: Passed to IdentifyCipher
+#
+# Output:
+#   results -- list: (name, stats) for each ciphertext
+#
+################################################################################
+def IdentifyWorker(ciphertexts, find_keys):
+    return [IdentifyCipher(x, find_keys) for x in ciphertexts]
+
+################################################################################
+#
+# Function: IdentifyCiphers
+#
+# Purpose: Runs IdentifyCipher over many ciphertexts across a pool of
+#           worker processes
+#
+# Input:
+#   ciphertexts -- iterable: Ciphertexts
+#   find_keys -- bool: Passed to IdentifyCipher
+#   workers -- int: Number of processes, 1 runs in this process, None for
+#                    one per cpu
+#   chunk_size -- int: Ciphertexts per worker task
+#
+# Output:
+#   (results, stats) -- tuple (list, dict): (name, stats) for each
+#                        ciphertext in order.  stats holds the number of
+#                        texts, the seconds taken and texts per second.
+#
+################################################################################
+def IdentifyCiphers(ciphertexts, find_keys=False, workers=None, chunk_size=IDENTIFY_CHUNK_SIZE):
+    ciphertexts = list(ciphertexts)
+    chunks = [ciphertexts[i:i + chunk_size] for i in range(0, len(ciphertexts), chunk_size)]
+    start = time.perf_counter()
+    if workers == 1:
+        results = [IdentifyWorker(x, find_keys) for x in chunks]
+    else:
+        with ProcessPoolExecutor(workers) as pool:
+            results = list(pool.map(IdentifyWorker, chunks, [find_keys] * len(chunks)))
+    elapsed = time.perf_counter() - start
+    stats = {
+        'texts': len(ciphertexts),
+        'seconds': elapsed,
+        'texts_per_second': len(ciphertexts) / elapsed if elapsed else 0.0,
+    }
+    return ([x for chunk in results for x in chunk], stats)
@@ -0,0 +1,149 @@
+from benchmark import MakeText, Percentile
+import argparse
+import asyncio
+import cipher_server
+import sys
+import time
+
+################################################################################
+#
+# Load test for cipher_server
+#
+# Opens many connections that each send requests back to back and reports
+#  requests per second and latency percentiles.  Without --port a server is
+#  started on a free loopback port in the same process.
+#
+# Usage:
+#   python load_test.py [--connections 50] [--requests 200] [--size 1024]
+#                       [--cipher vigenere] [--key lemon] [--port 8765]
+#
+################################################################################
+
+################################################################################
+#
+# Function: SendRequest
+#
+# Purpose: Sends one request on an open connection and reads the answer
+#
+# Input:
+#   reader -- asyncio.StreamReader: Connection to read from
+#   writer -- asyncio.StreamWriter: Connection to write to
+#   header -- bytes: Header line without the length
+#   payload -- bytes: Data to translate
+#
+# Output:
+#   result -- bytes
+#
+################################################################################
+async def SendRequest(reader, writer, header, payload):
+    writer.write(b'%s %d\n' % (header, len(payload)))
+    writer.write(payload)
+    await writer.drain()
+    status = await reader.readline()
+    if not status.startswith(b'OK '):
+        raise ValueError('Server said %r' % status.strip())
+    return await reader.readexactly(int(status[3:]))
+
+################################################################################
+#
+# Function: RunConnection
+#
+# Purpose: Sends requests back to back on one connection and records how
+#           long each took
+#
+# Input:
+#   port -- int: Server port on the loopback interface
+#   header -- bytes: Header line without the length
+#   payload -- bytes: Data to translate
+#   requests -- int: Number of requests to send
+#   latencies -- list: Seconds per request are added here
+#
+# Output:
+#   None
+#
+################################################################################
+async def RunConnection(port, header, payload, requests, latencies):
+    reader, writer = await asyncio.open_connection('127.0.0.1', port)
+    try:
+        for i in range(requests):
+            start = time.perf_counter()
+            await SendRequest(reader, writer, header, payload)
+            latencies.append(time.perf_counter() - start)
+    finally:
+        writer.close()
+        await writer.wait_closed()
+
+################################################################################
+#
+# Function: RunLoadTest
+#
+# Purpose: Runs every connection at once and reports the results
+#
+# Input:
+#   args -- argparse.Namespace: Options from ParseArgs
+#
+# Output:
+#   results -- dict: requests, seconds, requests_per_second and latency
+#                     percentiles in milliseconds
+#
+################################################################################
+async def RunLoadTest(args):
+    server = None
+    port = args.port
+    if port is None:
+        server = await cipher_server.StartServer(0, inline_size=args.inline_size)
+        port = server.sockets[0].getsockname()[1]
+
+    header = ('%s %s %s' % (args.command, args.cipher, args.key)).encode('ascii')
+    payload = MakeText(args.size).encode('ascii')
+    latencies = []
+    start = time.perf_counter()
+    try:
+        await asyncio.gather(*[RunConnection(port, header, payload, args.requests, latencies) for i in range(args.connections)])
+    finally:
+        elapsed = time.perf_counter() - start
+        if server:
+            server.close()
+            await server.wait_closed()
+
+    results = {
+        'requests': len(latencies),
+        'seconds': elapsed,
+        'requests_per_second': len(latencies) / elapsed,
+    }
+    for pct in (50, 90, 99, 99.9):
+        results['p%s_ms' % pct] = Percentile(latencies, pct) * 1000
+    results['max_ms'] = max(latencies) * 1000
+    return results
+
+################################################################################
+#
+# Function: ParseArgs
+#
+# Purpose: Parses the command line
+#
+# Input:
+#   argv -- list: Arguments without the program name
+#
+# Output:
+#   args -- argparse.Namespace
+#
+################################################################################
+def ParseArgs(argv):
+    parser = argparse.ArgumentParser(prog='python load_test.py', description='Load test for cipher_server.')
+    parser.add_argument('--connections', type=int, default=50)
+    parser.add_argument('--requests', type=int, default=200, help='requests per connection')
+    parser.add_argument('--size', type=int, default=1024, help='payload bytes per request')
+    parser.add_argument('--command', choices=['encrypt', 'decrypt'], default='encrypt')
+    parser.add_argument('--cipher', choices=sorted(cipher_server.CIPHERS), default='vigenere')
+    parser.add_argument('--key', default='lemon')
+    parser.add_argument('--port', type=int, default=None, help='server to test, default starts one in process')
+    parser.add_argument('--inline-size', type=int, default=cipher_server.ASYNC_INLINE_SIZE,
+                        help='inline size for the in process server')
+    return parser.parse_args(argv)
+
+if __name__ == '__main__':
+    results = asyncio.run(RunLoadTest(ParseArgs(sys.argv[1:])))
+    print('%d requests in %.2f s  %.0f req/s' % (results['requests'], results['seconds'], results['requests_per_second']))
+    print('latency ms  p50 %.2f  p90 %.2f  p99 %.2f  p99.9 %.2f  max %.2f' %
+          (results['p50_ms'], results['p90_ms'], results['p99_ms'], results['p99.9_ms'], results['max_ms']))
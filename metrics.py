@@ -0,0 +1,249 @@
+import threading
+import time
+
+################################################################################
+#
+# Metrics
+#
+# Opt-in timing and counters for cipher calls.  Nothing is measured until a
+#  hook is added; until then StartTimer returns None and the ciphers skip
+#  every timing call, so a disabled call costs a flag check.
+#
+# Every finished call is passed to each hook as a dict:
+#   {'cipher': 'PlayfairCipher', 'op': 'encrypt',
+#    'stages': {'normalize': seconds, 'pair': seconds, ...},
+#    'counters': {'chars_in': 120, 'chars_out': 98, 'pairs': 49, ...}}
+#
+################################################################################
+
+# Functions called with every finished call
+hooks = []
+
+# True while there is at least one hook
+enabled = False
+
+# Guards changes to hooks
+hooks_lock = threading.Lock()
+
+################################################################################
+#
+# Function: AddHook
+#
+# Purpose: Starts passing finished calls to hook
+#
+# Input:
+#   hook -- function: Called with one event dict per call, from whatever
+#                      thread made the call
+#
+# Output:
+#   None
+#
+################################################################################
+def AddHook(hook):
+    global hooks, enabled
+    with hooks_lock:
+        # A new list so a call in flight keeps the one it started with
+        hooks = hooks + [hook]
+        enabled = True
+
+################################################################################
+#
+# Function: RemoveHook
+#
+# Purpose: Stops passing finished calls to hook
+#
+# Input:
+#   hook -- function: A hook given to AddHook
+#
+# Output:
+#   None
+#
+################################################################################
+def RemoveHook(hook):
+    global hooks, enabled
+    with hooks_lock:
+        hooks = [x for x in hooks if x is not hook]
+        enabled = bool(hooks)
+
+################################################################################
+#
+# StageTimer
+#
+# Times the stages of one call.  Stage ends the stage that is running and
+#  starts the next, Done sends the event to the hooks.
+#
+################################################################################
+class StageTimer:
+    ############################################################################
+    #
+    # Function: __init__
+    #
+    # Purpose: Starts timing a call
+    #
+    # Input:
+    #   cipher -- CipherInterface: The cipher making the call
+    #   op -- string: Name of the call, e.g. 'encrypt'
+    #
+    # Output:
+    #   None
+    #
+    ############################################################################
+    def __init__(self, cipher, op):
+        self.cipher = cipher.__class__.__name__
+        self.op = op
+        self.stages = {}
+        self.last = time.perf_counter()
+
+    ############################################################################
+    #
+    # Function: Stage
+    #
+    # Purpose: Ends a stage and charges the time since the last one to it
+    #
+    # Input:
+    #   name -- string: Name of the stage that just finished
+    #
+    # Output:
+    #   None
+    #
+    ############################################################################
+    def Stage(self, name):
+        now = time.perf_counter()
+        self.stages[name] = self.stages.get(name, 0.0) + now - self.last
+        self.last = now
+
+    ############################################################################
+    #
+    # Function: Done
+    #
+    # Purpose: Sends the call's stages and counters to every hook
+    #
+    # Input:
+    #   counters -- keyword arguments: Counts for the call, e.g. chars_in
+    #
+    # Output:
+    #   None
+    #
+    ############################################################################
+    def Done(self, **counters):
+        event = {'cipher': self.cipher, 'op': self.op, 'stages': self.stages, 'counters': counters}
+        for hook in hooks:
+            hook(event)
+
+################################################################################
+#
+# end StageTimer
+#
+################################################################################
+
+################################################################################
+#
+# Function: StartTimer
+#
+# Purpose: Starts timing a call if anything is listening
+#
+# Input:
+#   cipher -- CipherInterface: The cipher making the call
+#   op -- string: Name of the call, e.g. 'encrypt'
+#
+# Output:
+#   timer -- StageTimer, or None while metrics are off
+#
+################################################################################
+def StartTimer(cipher, op):
+    if enabled:
+        return StageTimer(cipher, op)
+    return None
+
+################################################################################
+#
+# Profile
+#
+# Context manager that totals every call made inside its block, from any
+#  thread:
+#
+#   with metrics.Profile() as profile:
+#       cipher.Encrypt(text)
+#   print(profile.Report())
+#
+################################################################################
+class Profile:
+    ############################################################################
+    #
+    # Function: __init__
+    #
+    # Purpose: Sets up empty totals
+    #
+    # Input:
+    #   None
+    #
+    # Output:
+    #   None
+    #
+    ############################################################################
+    def __init__(self):
+        # Maps (cipher, op) -> {'calls': n, 'stages': {...}, 'counters': {...}}
+        self.totals = {}
+        self.lock = threading.Lock()
+
+    def __enter__(self):
+        AddHook(self.Record)
+        return self
+
+    def __exit__(self, *exc_info):
+        RemoveHook(self.Record)
+        return False
+
+    ############################################################################
+    #
+    # Function: Record
+    #
+    # Purpose: Adds one call to the totals
+    #
+    # Input:
+    #   event -- dict: Event from StageTimer.Done
+    #
+    # Output:
+    #   None
+    #
+    ############################################################################
+    def Record(self, event):
+        with self.lock:
+            total = self.totals.setdefault((event['cipher'], event['op']), {'calls': 0, 'stages': {}, 'counters': {}})
+            total['calls'] += 1
+            for name, seconds in event['stages'].items():
+                total['stages'][name] = total['stages'].get(name, 0.0) + seconds
+            for name, count in event['counters'].items():
+                total['counters'][name] = total['counters'].get(name, 0) + count
+
+    ############################################################################
+    #
+    # Function: Report
+    #
+    # Purpose: Formats the totals as a table with the share of time each
+    #           stage took
+    #
+    # Input:
+    #   None
+    #
+    # Output:
+    #   report -- string
+    #
+    ############################################################################
+    def Report(self):
+        lines = []
+        with self.lock:
+            for (cipher, op), total in sorted(self.totals.items()):
+                seconds = sum(total['stages'].values())
+                lines.append('%s.%s  %d calls  %.6f s' % (cipher, op, total['calls'], seconds))
+                for name, stage_seconds in total['stages'].items():
+                    lines.append('  %-12s %12.6f s  %5.1f%%' % (name, stage_seconds, 100.0 * stage_seconds / seconds if seconds else 0.0))
+                for name, count in sorted(total['counters'].items()):
+                    lines.append('  %-12s %12d' % (name, count))
+        return '\n'.join(lines)
+
+################################################################################
+#
+# end Profile
+#
+################################################################################
@@ -0,0 +1,200 @@
+import threading
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+################################################################################
+#
+# NumPy Backend
+#
+# Array versions of the cipher loops.  The text is turned into a uint8 array
+#  once and every cipher works on whole arrays at a time.  The ciphers only
+#  call into here when numpy imported, see CipherInterface.UseNumpy
+#
+################################################################################
+
+# Max number of arrays in digraph_arrays, two for each Playfair key
+DIGRAPH_ARRAY_CACHE_SIZE = 512
+
+# Playfair digraph arrays keyed by (key_table, pair_func name)
+digraph_arrays = {}
+digraph_arrays_lock = threading.Lock()
+
+################################################################################
+#
+# Function: ToArray
+#
+# Purpose: Turns prepped text into an array of ascii codes.  Anything
+#           outside of ascii is dropped.
+#
+# Input:
+#   text -- string: Prepped text
+#
+# Output:
+#   letters -- numpy.ndarray: uint8 ascii codes
+#
+################################################################################
+def ToArray(text):
+    return numpy.frombuffer(text.encode('ascii', 'ignore'), dtype=numpy.uint8)
+
+################################################################################
+#
+# Function: FromArray
+#
+# Purpose: Turns an array of ascii codes back into text
+#
+# Input:
+#   letters -- numpy.ndarray: uint8 ascii codes
+#
+# Output:
+#   text -- string
+#
+################################################################################
+def FromArray(letters):
+    return letters.tobytes().decode('ascii')
+
+################################################################################
+#
+# Function: Shift
+#
+# Purpose: Shifts every letter of the text by the matching entry in shifts.
+#           shifts is repeated as needed to cover the whole text so a
+#           single shift is a Caesar cipher and a key's shifts are a
+#           Vigenre cipher.
+#
+# Input:
+#   text -- string: Prepped text, a-z only
+#   shifts -- list: Amount to shift each letter by -- int
+#
+# Output:
+#   text -- string: The shifted text
+#
+################################################################################
+def Shift(text, shifts):
+    letters = ToArray(text).astype(numpy.int16) - 97
+    # tile is much faster than resize for short keys
+    key = numpy.tile(numpy.asarray(shifts, dtype=numpy.int16), -(-len(letters) // len(shifts)))[:len(letters)]
+    return FromArray(((letters + key) % 26 + 97).astype(numpy.uint8))
+
+################################################################################
+#
+# Function: IndexArrays
+#
+# Purpose: Turns a permutation into index arrays for both directions
+#
+# Input:
+#   permutation -- list: Index of the letter to take for each position
+#
+# Output:
+#   (forward, inverse) -- tuple (numpy.ndarray, numpy.ndarray): The
+#                          permutation and the one that undoes it
+#
+################################################################################
+def IndexArrays(permutation):
+    forward = numpy.asarray(permutation, dtype=numpy.intp)
+    return (forward, numpy.argsort(forward))
+
+################################################################################
+#
+# Function: Gather
+#
+# Purpose: Reorders the text with an index array
+#
+# Input:
+#   text -- string: Prepped text
+#   indexes -- numpy.ndarray: Index of the letter to take for each position
+#
+# Output:
+#   text -- string: The reordered text
+#
+################################################################################
+def Gather(text, indexes):
+    return FromArray(ToArray(text)[indexes])
+
+################################################################################
+#
+# Function: GetDigraphArray
+#
+# Purpose: Runs pair_func over every pair of letters in the key table and
+#           stores the results in a 26x26 lookup array.  Results are cached
+#           per key table, up to DIGRAPH_ARRAY_CACHE_SIZE arrays.
+#
+# Input:
+#   key_table -- string: The Playfair key table
+#   pair_func -- function: EncryptPair or DecryptPair
+#
+# Output:
+#   digraphs -- numpy.ndarray: (676, 2) uint8 array indexed by
+#                               (first - 97) * 26 + (second - 97)
+#
+################################################################################
+def GetDigraphArray(key_table, pair_func):
+    cache_key = (key_table, pair_func.__name__)
+    digraphs = digraph_arrays.get(cache_key)
+    if digraphs is None:
+        digraphs = numpy.zeros((26 * 26, 2), dtype=numpy.uint8)
+        for first in key_table:
+            for second in key_table:
+                digraphs[(ord(first) - 97) * 26 + ord(second) - 97] = bytearray(pair_func((first, second)).encode('ascii'))
+        with digraph_arrays_lock:
+            # Drop the oldest arrays once the cache is full
+            while len(digraph_arrays) >= DIGRAPH_ARRAY_CACHE_SIZE:
+                del digraph_arrays[next(iter(digraph_arrays))]
+            digraph_arrays[cache_key] = digraphs
+    return digraphs
+
+################################################################################
+#
+# Function: Pad
+#
+# Purpose: Array version of PlayfairCipher.CreatePairs.  An x is put after
+#           every letter that would be paired with itself and at the end if
+#           the length is odd.
+#
+# Input:
+#   letters -- numpy.ndarray: uint8 ascii codes
+#
+# Output:
+#   letters -- numpy.ndarray: Padded codes with an even length
+#
+################################################################################
+def Pad(letters):
+    # A doubled letter only needs an x when it lands at the start of a
+    #  pair.  Each x shifts the pairing by one so walk them in order.
+    inserts = []
+    start = 0
+    for i in numpy.flatnonzero(letters[:-1] == letters[1:]).tolist():
+        if i >= start and (i - start) % 2 == 0:
+            inserts.append(i + 1)
+            start = i + 1
+    letters = numpy.insert(letters, inserts, ord('x'))
+    if len(letters) % 2:
+        letters = numpy.append(letters, numpy.uint8(ord('x')))
+    return letters
+
+################################################################################
+#
+# Function: TranslatePairs
+#
+# Purpose: Pairs up the text and looks every pair up in a digraph array
+#
+# Input:
+#   text -- string: Prepped text, a-z only
+#   digraphs -- numpy.ndarray: Array from GetDigraphArray
+#   pad -- bool: True to pad doubled letters like CreatePairs.  Ciphertext
+#                 is already in pairs and only needs an odd length fixed.
+#
+# Output:
+#   text -- string: The translated text
+#
+################################################################################
+def TranslatePairs(text, digraphs, pad=True):
+    letters = ToArray(text)
+    if pad:
+        letters = Pad(letters)
+    elif len(letters) % 2:
+        letters = numpy.append(letters, numpy.uint8(ord('x')))
+    letters = letters.astype(numpy.intp) - 97
+    return FromArray(digraphs[letters[0::2] * 26 + letters[1::2]])
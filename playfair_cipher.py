@@ -1,6 +1,45 @@
-from cipher_interface import CipherInterface
-from string import lowercase as lowercase_letters
+from alphabet import PLAYFAIR
+from bisect import bisect_left, bisect_right
+from cipher_interface import CipherInterface, PARALLEL_CHUNK_SIZE, ReadWindow
+from itertools import accumulate
+from operator import itemgetter
+import numpy_backend
 import re
+import threading
+
+# Matches one letter pair the way CreatePairs builds it.  The second letter
+#  is only taken when it differs from the first, otherwise it is left empty
+#  and the pair gets an x
+PAIR_PATTERN = re.compile(r'(.)((?!\1).)?')
+BYTES_PAIR_PATTERN = re.compile(br'(.)((?!\1).)?')
+
+# Splits ciphertext bytes into fixed pairs
+BYTES_CIPHER_PAIR_PATTERN = re.compile(br'(.)(.)')
+
+# Letter added to split doubled letters and to finish an odd length text
+PAD_LETTER = 'x'
+
+# Letters between the pair boundaries SpliceIndex records.  An edit reparses
+#  from the boundary before it, a longer spacing keeps the index smaller.
+SPLICE_INDEX_SPACING = 4096
+
+# Letters past an edit EncryptSplice first looks in for the pairing to
+#  line up again, doubled until it does
+SPLICE_WINDOW = 256
+
+# Past this many letters the pairing is taken not to line up again and the
+#  rest of the document is reencrypted.  Without doubled letters a change in
+#  length by an odd number never lines up.
+SPLICE_MAX_WINDOW = 16 * SPLICE_INDEX_SPACING
+
+# Max number of keys in key_tables
+KEY_TABLE_CACHE_SIZE = 256
+
+# Key tables and digraph tables shared by every PlayfairCipher instance
+#  Maps prepped key -> (key_table, letter_locs, encrypt_digraphs,
+#                       decrypt_digraphs)
+key_tables = {}
+key_tables_lock = threading.Lock()
 
 ################################################################################
 #
@@ -8,26 +47,37 @@ import re
 #
 ################################################################################
 class PlayfairCipher(CipherInterface):
+    # i and j share a cell of the key table
+    alphabet = PLAYFAIR
+    normalizer = PLAYFAIR.normalizer
+
+    # Side of the key table
+    grid_size = 5
+
     ############################################################################
     #
-    # Function: PrepStringForCipher
+    # Function: SetAlphabet
     #
-    # Purpose: Prepare input string to be used in the cipher by stripping
-    #           all nonalpha chars
+    # Purpose: Picks the symbols this instance works on.  The key table is
+    #           a square of them, e.g. 6x6 for a-z and 0-9.  Must be called
+    #           before SetKey.
     #
     # Input:
-    #   text -- string: Text that needs to be formatted for cipher
+    #   alphabet -- Alphabet: Symbols to use.  Must fill a square, hold the
+    #                          x used for padding and not pass other chars
+    #                          through since pairs could not be kept apart.
     #
-    # Output:
-    #   text -- string:  String with only alpha chars
+    # Output: Nothing
     #
     ############################################################################
-    def PrepStringForCipher(self, text):
-        # Calling lower to ensure all text is lowercase
-        text = re.sub(r'j', 'i', text.lower())
-        text = re.sub(r'[\W0-9 ]+', '', text)
-        return text
-    
+    def SetAlphabet(self, alphabet):
+        if alphabet.pass_through:
+            raise ValueError('Playfair can not pass other chars through')
+        if PAD_LETTER not in alphabet.letters:
+            raise ValueError('Playfair alphabet needs %r for padding' % PAD_LETTER)
+        self.grid_size = alphabet.GridSize()
+        CipherInterface.SetAlphabet(self, alphabet)
+
     ############################################################################
     #
     # Function: CreateKeyTable
@@ -44,9 +94,42 @@ class PlayfairCipher(CipherInterface):
     #
     ############################################################################
     def CreateKeyTable(self):
-        self.key_table = ''
-        for letter in self.key:
-            self.key_table += letter if letter not in self.key_table else ''
+        # dict keeps the first time each letter is seen and drops the rest
+        self.key_table = ''.join(dict.fromkeys(self.key))
+
+    ############################################################################
+    #
+    # Function: CreateDigraphTables
+    #
+    # Purpose: Works out the encrypted and decrypted form of every possible
+    #           letter pair from key_table.  Sets up letter_locs,
+    #           encrypt_digraphs and decrypt_digraphs.  The digraph tables
+    #           are keyed by the tuples CreatePairs returns.  A pair with an
+    #           empty second letter is the same as one with an x.  Every
+    #           pair is also stored with bytes keys and value for
+    #           EncryptBytes and DecryptBytes.
+    #
+    # Input:
+    #   None
+    #
+    # Output:
+    #   None
+    #
+    ############################################################################
+    def CreateDigraphTables(self):
+        self.letter_locs = dict([(letter, loc) for loc, letter in enumerate(self.key_table)])
+        self.encrypt_digraphs = {}
+        self.decrypt_digraphs = {}
+        for char1 in self.key_table:
+            for char2 in self.key_table:
+                for digraphs, step in [(self.encrypt_digraphs, 1), (self.decrypt_digraphs, -1)]:
+                    char1_loc, char2_loc = self.MovePair(self.letter_locs[char1], self.letter_locs[char2], step)
+                    digraphs[(char1, char2)] = self.key_table[char1_loc] + self.key_table[char2_loc]
+            for digraphs in [self.encrypt_digraphs, self.decrypt_digraphs]:
+                digraphs[(char1, '')] = digraphs[(char1, PAD_LETTER)]
+        for digraphs in [self.encrypt_digraphs, self.decrypt_digraphs]:
+            for (char1, char2), translated in list(digraphs.items()):
+                digraphs[(char1.encode('ascii'), char2.encode('ascii'))] = translated.encode('ascii')
 
     ############################################################################
     #
@@ -55,7 +138,9 @@ class PlayfairCipher(CipherInterface):
     # Purpose: Sets the key for the cipher.  The key is created by the
     #           concatenation of the input and the alphabet.  This ensures
     #           every letter of the alphabet is present at least once.
-    #           This also creates the key table that will be used.
+    #           This also creates the key table and digraph tables that
+    #           will be used.  Both are cached so setting a key that was
+    #           used before is just a lookup.
     #
     # Input:
     #   key -- string: The key to be used in the cipher.  Must be alpha only.
@@ -65,39 +150,98 @@ class PlayfairCipher(CipherInterface):
     #
     ############################################################################
     def SetKey(self, key):
-        # Includes lower case letters to make sure entire alphabet is used
-        self.key = self.PrepStringForCipher(key + lowercase_letters)
-        self.CreateKeyTable()
+        # Includes the alphabet to make sure every symbol is used
+        timer = self.StartTimer('setkey')
+        self.key = self.PrepStringForCipher(key + self.alphabet.letters)
+        builds = 0
+        # Another thread may evict the key at any time, so the tables are
+        #  only taken from the dict once
+        tables = key_tables.get(self.key)
+        if tables is None:
+            builds = 1
+            self.CreateKeyTable()
+            self.CreateDigraphTables()
+            tables = (self.key_table, self.letter_locs, self.encrypt_digraphs, self.decrypt_digraphs)
+            with key_tables_lock:
+                # Drop the oldest keys once the cache is full
+                while len(key_tables) >= KEY_TABLE_CACHE_SIZE:
+                    del key_tables[next(iter(key_tables))]
+                key_tables[self.key] = tables
+        self.key_table, self.letter_locs, self.encrypt_digraphs, self.decrypt_digraphs = tables
+        if timer:
+            timer.Stage('key_table')
+            timer.Done(key_table_builds=builds)
 
     ############################################################################
     #
-    # Function: CreatePairs
+    # Function: SplitPairs
     #
-    # Purpose: Creates letter pairs that will be used in the encryption.
+    # Purpose: Creates letter pairs for as much of the text as can be paired.
+    #           A trailing letter is handed back so more text can be added
+    #           to it before deciding its pair.
     #
     # Input:
     #   text -- string: The text to be encrypted.
     #
     # Output:
-    #   piars -- list:  A list of tuples containg the letter pairs of the text
-    #                    If the letter is paired with itself the second letter
-    #                    is replaced with an x and put back in front of the list
+    #   (pairs, remainder) -- tuple (list, string): The letter pairs as
+    #                          described in CreatePairs and the unpaired last
+    #                          letter or an empty string
     #
     ############################################################################
-    def CreatePairs(self, text):
+    def SplitPairs(self, text):
         i = 0
         pairs = []
         while i < len(text) - 1:
-            if text[i] is not text[i+1]:
+            if text[i] != text[i+1]:
                 pairs.append((text[i], text[i+1]))
                 i += 2
             else:
-                pairs.append((text[i], 'x'))
+                pairs.append((text[i], PAD_LETTER))
                 i += 1
+        return (pairs, text[i:])
+
+    ############################################################################
+    #
+    # Function: SplitCipherPairs
+    #
+    # Purpose: Splits ciphertext into pairs.  Ciphertext always comes in
+    #           whole pairs so no x padding is added, even for doubled
+    #           letters.  A trailing letter is handed back.
+    #
+    # Input:
+    #   text -- string: The text to be decrypted.
+    #
+    # Output:
+    #   (pairs, remainder) -- tuple (list, string): The letter pairs and the
+    #                          unpaired last letter or an empty string
+    #
+    ############################################################################
+    def SplitCipherPairs(self, text):
+        end = len(text) - len(text) % 2
+        return (list(zip(text[0:end:2], text[1:end:2])), text[end:])
+
+    ############################################################################
+    #
+    # Function: CreatePairs
+    #
+    # Purpose: Creates letter pairs that will be used in the encryption.
+    #
+    # Input:
+    #   text -- string: The text to be encrypted.
+    #
+    # Output:
+    #   piars -- list:  A list of tuples containg the letter pairs of the text
+    #                    If the letter is paired with itself the second letter
+    #                    is replaced with an x and put back in front of the list
+    #
+    ############################################################################
+    def CreatePairs(self, text):
+        pairs, remainder = self.SplitPairs(text)
 
         # This will append the last letter in the text in the 
-        if i is not len(text):
-            pairs.append((text[-1], 'x'))
+        if remainder:
+            pairs.append((remainder, PAD_LETTER))
         return pairs
 
     ############################################################################
@@ -117,8 +261,9 @@ class PlayfairCipher(CipherInterface):
     #
     ############################################################################
     def HandleBoxPair(self, char1_loc, char2_loc):
-        distance = abs(char1_loc % 5 - char2_loc % 5)
-        if char1_loc % 5 > char2_loc % 5:
+        size = self.grid_size
+        distance = abs(char1_loc % size - char2_loc % size)
+        if char1_loc % size > char2_loc % size:
             char1_loc -= distance
             char2_loc += distance
         else:
@@ -126,12 +271,44 @@ class PlayfairCipher(CipherInterface):
             char2_loc -= distance
         return (char1_loc, char2_loc)
 
+    ############################################################################
+    #
+    # Function: MovePair
+    #
+    # Purpose: Applies the Playfair rules to a pair of locations in the key
+    #           table.  Letters in the same column move down a row, letters
+    #           in the same row move right a column, anything else is a box.
+    #           Moves wrap around the edges of the table.
+    #
+    # Input:
+    #   char1_loc -- int: The location where char1 is located in the key table
+    #   char2_loc -- int: The location where char2 is located in the key table
+    #   step -- int: 1 to encrypt, -1 to decrypt
+    #
+    # Output:
+    #   (char1_loc, char2_loc) -- tuple (int, int): a tuple of ints with the
+    #                                                new location of each char
+    #
+    ############################################################################
+    def MovePair(self, char1_loc, char2_loc, step):
+        size = self.grid_size
+        row1, col1 = divmod(char1_loc, size)
+        row2, col2 = divmod(char2_loc, size)
+        # This handles vertical cases
+        if col1 == col2:
+            return (((row1 + step) % size) * size + col1, ((row2 + step) % size) * size + col2)
+        # This handles horizontal cases
+        elif row1 == row2:
+            return (row1 * size + (col1 + step) % size, row2 * size + (col2 + step) % size)
+        # This handles box cases
+        return self.HandleBoxPair(char1_loc, char2_loc)
+
     ############################################################################
     #
     # Function: EncryptPair
     #
-    # Purpose: Encrypts each letter pair based off the rules of their locations
-    #           in the key table.
+    # Purpose: Encrypts each letter pair by looking it up in the table built
+    #           by CreateDigraphTables
     #
     # Input:
     #   pair -- tuple (char, char): A tuple of chars that need to be encrypted
@@ -139,53 +316,26 @@ class PlayfairCipher(CipherInterface):
     # Output:
     #   Returns the encrypted letters as a string.
     #
-    ############################################################################    
+    ############################################################################
     def EncryptPair(self, pair):
-        char1_loc, char2_loc = [self.key_table.find(x) for x in pair]
-        # This handles vertical cases
-        if char1_loc % 5 is char2_loc % 5:
-            char1_loc = (char1_loc + 5) % 25
-            char2_loc = (char2_loc + 5) % 25
-        # This handles horizontal cases
-        elif char1_loc / 5 is char2_loc / 5:
-            char1_loc = char1_loc + 1 if (char1_loc + 1) % 5 is not 0 else char1_loc - 4
-            char2_loc = char2_loc + 1 if (char2_loc + 1) % 5 is not 0 else char1_loc - 4
-        # This handles box cases
-        else:
-            char1_loc, char2_loc = self.HandleBoxPair(char1_loc, char2_loc)
-        return self.key_table[char1_loc] + self.key_table[char2_loc]
+        return self.encrypt_digraphs[pair]
 
     ############################################################################
     #
     # Function: DecryptPair
     #
-    # Purpose: Decrypts each letter pair based off the rules of their locations
-    #           in the key table.
+    # Purpose: Decrypts each letter pair by looking it up in the table built
+    #           by CreateDigraphTables
     #
     # Input:
-    #   pair -- tuple (char, char): A tuple of chars that need to be encrypted
+    #   pair -- tuple (char, char): A tuple of chars that need to be decrypted
     #
     # Output:
     #   Returns the decrypted letters as a string.
     #
     ############################################################################
     def DecryptPair(self, pair):
-        char1_loc, char2_loc = [self.key_table.find(x) for x in pair]
-        # This handles vertical cases
-        # If char_loc - 5 is negative we need to wrap around to the other side
-        #  of the table
-        if char1_loc % 5 is char2_loc % 5:
-            char1_loc = char1_loc - 5 if char1_loc - 5 >=0 else char1_loc + 20
-            char2_loc = char2_loc - 5 if char2_loc - 5 >=0 else char2_loc + 20
-        # This handles horizontal cases
-        # If char_loc -1 if less than char_loc / 5 we need to wrap around
-        elif char1_loc / 5 is char2_loc / 5:
-            char1_loc = char1_loc - 1 if char1_loc - 1 >= char1_loc / 5 else char1_loc + 4
-            char2_loc = char2_loc - 1 if char2_loc - 1 >= char2_loc / 5 else char2_loc + 4
-        # This handles box cases
-        else:
-            char1_loc, char2_loc = self.HandleBoxPair(char1_loc, char2_loc)
-        return self.key_table[char1_loc] + self.key_table[char2_loc]
+        return self.decrypt_digraphs[pair]
 
     ############################################################################
     #
@@ -194,15 +344,36 @@ class PlayfairCipher(CipherInterface):
     # Purpose: Gets the letter pairs and returns the encrypted string
     #
     # Input:
-    #   plaintext -- string: Text to be encrypted
+    #   plaintext -- string: Text to be encrypted.  bytes, bytearray and
+    #                         memoryview go through EncryptBytes
     #
     # Output:
     #   Returns the plaintext encrypted
     #
     ############################################################################
     def Encrypt(self, plaintext):
-        plaintext = self.PrepStringForCipher(plaintext)
-        return ''.join([self.EncryptPair(x) for x in self.CreatePairs(plaintext)])
+        if not isinstance(plaintext, str):
+            return self.EncryptBytes(plaintext)
+        timer = self.StartTimer('encrypt')
+        letters = self.PrepStringForCipher(plaintext)
+        if timer:
+            timer.Stage('normalize')
+        if self.UseNumpy():
+            encrypted = numpy_backend.TranslatePairs(letters, numpy_backend.GetDigraphArray(self.key_table, self.EncryptPair))
+            if timer:
+                timer.Stage('numpy')
+        else:
+            # Pairing and lookup are each a single pass
+            pairs = PAIR_PATTERN.findall(letters)
+            if timer:
+                timer.Stage('pair')
+            encrypted = ''.join(map(self.encrypt_digraphs.__getitem__, pairs))
+            if timer:
+                timer.Stage('lookup')
+        if timer:
+            timer.Done(chars_in=len(plaintext), chars_out=len(encrypted), pairs=len(encrypted) // 2,
+                       padding=len(encrypted) - len(letters))
+        return encrypted
 
     ############################################################################
     #
@@ -211,15 +382,428 @@ class PlayfairCipher(CipherInterface):
     # Purpose: Gets the letter pairs and returns the decrypted string
     #
     # Input:
-    #   ciphertext -- string: Text to be decrypted
+    #   ciphertext -- string: Text to be decrypted.  bytes, bytearray and
+    #                          memoryview go through DecryptBytes
     #
     # Output:
     #   Returns the decrypted ciphertext
     #
     ############################################################################
     def Decrypt(self, ciphertext):
-        ciphertext = self.PrepStringForCipher(ciphertext)
-        return ''.join([self.DecryptPair(x) for x in self.CreatePairs(ciphertext)])
+        if not isinstance(ciphertext, str):
+            return self.DecryptBytes(ciphertext)
+        timer = self.StartTimer('decrypt')
+        letters = self.PrepStringForCipher(ciphertext)
+        if timer:
+            timer.Stage('normalize')
+        if self.UseNumpy():
+            decrypted = numpy_backend.TranslatePairs(letters, numpy_backend.GetDigraphArray(self.key_table, self.DecryptPair), False)
+        else:
+            # Ciphertext is read in fixed pairs.  A doubled letter in it
+            #  comes from an xx pair and must not be split
+            pairs = zip(letters[0::2], letters[1::2] + PAD_LETTER * (len(letters) % 2))
+            decrypted = ''.join(map(self.decrypt_digraphs.__getitem__, pairs))
+        if timer:
+            timer.Stage('numpy' if self.UseNumpy() else 'lookup')
+            timer.Done(chars_in=len(ciphertext), chars_out=len(decrypted), pairs=len(decrypted) // 2,
+                       padding=len(decrypted) - len(letters))
+        return decrypted
+
+    ############################################################################
+    #
+    # Function: EncryptBytes
+    #
+    # Purpose: Encrypts ascii data without going through str
+    #
+    # Input:
+    #   data -- bytes, bytearray or memoryview: Data to be encrypted
+    #
+    # Output:
+    #   Encrypted data -- bytes
+    #
+    ############################################################################
+    def EncryptBytes(self, data):
+        timer = self.StartTimer('encrypt_bytes')
+        letters = self.normalizer.TranslateBytes(data)
+        if timer:
+            timer.Stage('normalize')
+        pairs = BYTES_PAIR_PATTERN.findall(letters)
+        if timer:
+            timer.Stage('pair')
+        encrypted = b''.join(map(self.encrypt_digraphs.__getitem__, pairs))
+        if timer:
+            timer.Stage('lookup')
+            timer.Done(chars_in=len(data), chars_out=len(encrypted), pairs=len(pairs), padding=2 * len(pairs) - len(letters))
+        return encrypted
+
+    ############################################################################
+    #
+    # Function: DecryptBytes
+    #
+    # Purpose: Decrypts ascii data without going through str
+    #
+    # Input:
+    #   data -- bytes, bytearray or memoryview: Data to be decrypted
+    #
+    # Output:
+    #   Decrypted data -- bytes
+    #
+    ############################################################################
+    def DecryptBytes(self, data):
+        timer = self.StartTimer('decrypt_bytes')
+        letters = self.normalizer.TranslateBytes(data)
+        if timer:
+            timer.Stage('normalize')
+        padding = len(letters) % 2
+        if padding:
+            letters += PAD_LETTER.encode('ascii')
+        pairs = BYTES_CIPHER_PAIR_PATTERN.findall(letters)
+        if timer:
+            timer.Stage('pair')
+        decrypted = b''.join(map(self.decrypt_digraphs.__getitem__, pairs))
+        if timer:
+            timer.Stage('lookup')
+            timer.Done(chars_in=len(data), chars_out=len(decrypted), pairs=len(pairs), padding=padding)
+        return decrypted
+
+    ############################################################################
+    #
+    # Function: MaxOutputLength
+    #
+    # Purpose: Gives the most bytes Encrypt can return for an input.  Every
+    #           letter can end up paired with an x.
+    #
+    # Input:
+    #   length -- int: Length of the input
+    #
+    # Output:
+    #   length -- int
+    #
+    ############################################################################
+    def MaxOutputLength(self, length):
+        return 2 * length
+
+    ############################################################################
+    #
+    # Function: ParallelAlignment
+    #
+    # Purpose: Ciphertext is read in fixed pairs so it can be split on any
+    #           even offset.  Plaintext is split by EncryptParallel instead.
+    #
+    # Input:
+    #   None
+    #
+    # Output:
+    #   alignment -- int: Always 2
+    #
+    ############################################################################
+    def ParallelAlignment(self):
+        return 2
+
+    ############################################################################
+    #
+    # Function: RangeAlignment
+    #
+    # Purpose: Ciphertext is read in fixed pairs, so a range can start on
+    #           any even offset
+    #
+    # Input:
+    #   None
+    #
+    # Output:
+    #   alignment -- int: Always 2
+    #
+    ############################################################################
+    def RangeAlignment(self):
+        return 2
+
+    ############################################################################
+    #
+    # Function: DecryptWindow
+    #
+    # Purpose: Decrypts the pairs the window touches.  An odd start or end
+    #           reads the other letter of its pair as well.
+    #
+    # Input:
+    #   ciphertext -- string, bytes or mmap: Ciphertext as Encrypt returned
+    #                  it
+    #   start -- int: First position wanted
+    #   end -- int: Position after the last one wanted
+    #
+    # Output:
+    #   Decrypted window -- string for string input, otherwise bytes
+    #
+    ############################################################################
+    def DecryptWindow(self, ciphertext, start, end):
+        first = start - start % 2
+        last = min(end + end % 2, len(ciphertext))
+        return self.Decrypt(ReadWindow(ciphertext, first, last))[start - first:end - first]
+
+    ############################################################################
+    #
+    # Function: SpliceIndex
+    #
+    # Purpose: Records where pairs start in the plaintext and ciphertext
+    #           about every SPLICE_INDEX_SPACING letters.  Which letters
+    #           pair up depends on every doubled letter before them, so
+    #           EncryptSplice needs a known boundary near the edit.
+    #
+    # Input:
+    #   plaintext -- bytearray: Normalized letters of the document
+    #
+    # Output:
+    #   index -- list: (plaintext position, ciphertext position) tuples in
+    #                   order, starting with (0, 0)
+    #
+    ############################################################################
+    def SpliceIndex(self, plaintext):
+        return [(0, 0)] + self.IndexFrom(plaintext, 0, 0, None)
+
+    ############################################################################
+    #
+    # Function: IndexFrom
+    #
+    # Purpose: Pairs the plaintext from a pair boundary to the end one
+    #           piece at a time, recording the boundary after each piece
+    #
+    # Input:
+    #   plaintext -- bytearray: Normalized letters
+    #   position -- int: Pair boundary to start at
+    #   cipher_position -- int: Where that boundary is in the ciphertext
+    #   encrypted -- list: Gets the ciphertext of each piece, None to only
+    #                       build the index
+    #
+    # Output:
+    #   index -- list: (plaintext position, ciphertext position) tuples
+    #
+    ############################################################################
+    def IndexFrom(self, plaintext, position, cipher_position, encrypted):
+        index = []
+        while position < len(plaintext):
+            piece = bytes(plaintext[position:position + SPLICE_INDEX_SPACING])
+            pairs = BYTES_PAIR_PATTERN.findall(piece)
+            position += len(piece)
+            # Every letter is in a pair, but how the last one pairs depends
+            #  on the letter after the piece
+            if position < len(plaintext) and not pairs[-1][1]:
+                pairs.pop()
+                position -= 1
+            if encrypted is not None:
+                encrypted.append(b''.join(map(self.encrypt_digraphs.__getitem__, pairs)))
+            cipher_position += 2 * len(pairs)
+            if position < len(plaintext):
+                index.append((position, cipher_position))
+        return index
+
+    ############################################################################
+    #
+    # Function: PairBoundaries
+    #
+    # Purpose: Pairs a piece of plaintext that starts on a pair boundary
+    #
+    # Input:
+    #   piece -- bytes: Normalized letters
+    #   base -- int: Position of the piece in the document
+    #   final -- bool: The piece runs to the end of the document, so a
+    #                   last single letter is padded instead of left out
+    #
+    # Output:
+    #   (pairs, ends) -- tuple (list, list): The pairs, and the document
+    #                     position after each of them
+    #
+    ############################################################################
+    def PairBoundaries(self, piece, base, final):
+        pairs = BYTES_PAIR_PATTERN.findall(piece)
+        if not final and pairs and not pairs[-1][1]:
+            pairs.pop()
+        ends = list(accumulate(map(len, map(b''.join, pairs)), initial=base))[1:]
+        return (pairs, ends)
+
+    ############################################################################
+    #
+    # Function: EncryptSplice
+    #
+    # Purpose: Repairs the text from the last indexed boundary before the
+    #           edit until the new pairing lines up with the old one again,
+    #           which happens at the first doubled letter that splits the
+    #           old pairs.  Only the ciphertext of those pairs is replaced.
+    #
+    # Input:
+    #   plaintext -- bytearray: Normalized letters, updated in place
+    #   ciphertext -- bytearray: Encrypted letters, updated in place
+    #   start -- int: First letter replaced
+    #   end -- int: Letter after the last one replaced
+    #   letters -- bytes: Normalized letters put in their place
+    #   index -- list: From SpliceIndex, updated in place
+    #
+    # Output:
+    #   None
+    #
+    ############################################################################
+    def EncryptSplice(self, plaintext, ciphertext, start, end, letters, index):
+        # A boundary at start could depend on the letter at start
+        i = max(bisect_left(index, start, key=itemgetter(0)) - 1, 0)
+        origin, cipher_origin = index[i]
+        delta = len(letters) - (end - start)
+        window = SPLICE_WINDOW
+        while True:
+            stop = min(end + window, len(plaintext))
+            final = stop == len(plaintext)
+            old = bytes(plaintext[origin:stop])
+            new = old[:start - origin] + letters + old[end - origin:]
+            old_ends = self.PairBoundaries(old, origin, final)[1]
+            new_pairs, new_ends = self.PairBoundaries(new, origin, final)
+            # Number of old pairs before each old boundary past the edit
+            old_counts = dict([(position, count) for count, position in enumerate(old_ends, 1) if position >= end])
+            synced = next(((count, position) for count, position in enumerate(new_ends, 1)
+                           if position >= start + len(letters) and position - delta in old_counts), None)
+            if synced or final or window >= SPLICE_MAX_WINDOW:
+                break
+            window *= 2
+
+        if synced:
+            count, position = synced
+            encrypted = b''.join(map(self.encrypt_digraphs.__getitem__, new_pairs[:count]))
+            old_count = old_counts[position - delta]
+            ciphertext[cipher_origin:cipher_origin + 2 * old_count] = encrypted
+            plaintext[start:end] = letters
+            # Boundaries inside the repaired text are gone, the ones after
+            #  it move with the edit
+            later = bisect_right(index, position - delta, lo=i + 1, key=itemgetter(0))
+            index[i + 1:later] = [(position, cipher_origin + len(encrypted))]
+            cipher_delta = len(encrypted) - 2 * old_count
+            if delta or cipher_delta:
+                index[i + 2:] = [(x + delta, y + cipher_delta) for x, y in index[i + 2:]]
+        else:
+            # Only the end of the document lines up
+            plaintext[start:end] = letters
+            encrypted = []
+            index[i + 1:] = self.IndexFrom(plaintext, origin, cipher_origin, encrypted)
+            ciphertext[cipher_origin:] = b''.join(encrypted)
+
+    ############################################################################
+    #
+    # Function: EncryptPieceVariants
+    #
+    # Purpose: Encrypts a piece of prepped plaintext both ways it can be
+    #           paired.  Either the piece starts a new pair, or the last
+    #           letter of the previous piece was left unpaired and the piece
+    #           continues it.
+    #
+    # Input:
+    #   previous -- string: Last letter of the previous piece, or empty
+    #   piece -- string: Piece of prepped plaintext.  bytes work too, the
+    #                     results are then bytes
+    #
+    # Output:
+    #   (fresh, carried) -- tuple: (encrypted, remainder) for each case.
+    #                        remainder is the unpaired last letter or empty
+    #
+    ############################################################################
+    def EncryptPieceVariants(self, previous, piece):
+        pattern = PAIR_PATTERN if isinstance(piece, str) else BYTES_PAIR_PATTERN
+        empty = piece[:0]
+        variants = []
+        for text in (piece, previous + piece):
+            pairs = pattern.findall(text)
+            # A single letter at the very end has no partner yet
+            remainder = pairs.pop()[0] if pairs and not pairs[-1][1] else empty
+            variants.append((empty.join(map(self.encrypt_digraphs.__getitem__, pairs)), remainder))
+        return tuple(variants)
+
+    ############################################################################
+    #
+    # Function: EncryptParallel
+    #
+    # Purpose: Encrypts plaintext across a pool of worker processes.  Pair
+    #           boundaries depend on everything before them, so each worker
+    #           encrypts its piece both ways it can be paired and the
+    #           pieces are then chained together in order.
+    #
+    # Input:
+    #   plaintext -- string or bytes: Text to be encrypted
+    #   workers -- int: Number of processes, None for one per cpu
+    #   chunk_size -- int: Approximate number of chars per worker task
+    #
+    # Output:
+    #   Encrypted text -- string
+    #
+    ############################################################################
+    def EncryptParallel(self, plaintext, workers=None, chunk_size=PARALLEL_CHUNK_SIZE):
+        plaintext = self.PrepStringForCipher(plaintext)
+        if len(plaintext) <= chunk_size:
+            return self.Encrypt(plaintext)
+        # Slicing keeps this working for both str and bytes
+        empty = plaintext[:0]
+        args = [(plaintext[max(i - 1, 0):i], plaintext[i:i + chunk_size]) for i in range(0, len(plaintext), chunk_size)]
+        encrypted = []
+        remainder = empty
+        for fresh, carried in self.MapParallel('EncryptPieceVariants', args, workers):
+            translated, remainder = carried if remainder else fresh
+            encrypted.append(translated)
+        if remainder:
+            encrypted.append(self.EncryptPair((remainder, empty)))
+        return empty.join(encrypted)
+
+    ############################################################################
+    #
+    # Function: StreamPairs
+    #
+    # Purpose: Runs pair_func over the letter pairs of text that arrives in
+    #           chunks.  An unpaired letter at the end of a chunk is held
+    #           until the next chunk so pairs match a single call over the
+    #           whole text.
+    #
+    # Input:
+    #   chunks -- iterable: Strings to be translated
+    #   pair_func -- function: EncryptPair or DecryptPair
+    #   split_func -- function: SplitPairs or SplitCipherPairs
+    #
+    # Output:
+    #   Yields translated text -- string
+    #
+    ############################################################################
+    def StreamPairs(self, chunks, pair_func, split_func):
+        remainder = ''
+        for chunk in chunks:
+            pairs, remainder = split_func(remainder + self.PrepStringForCipher(chunk))
+            translated = ''.join([pair_func(x) for x in pairs])
+            if translated:
+                yield translated
+        if remainder:
+            yield pair_func((remainder, PAD_LETTER))
+
+    ############################################################################
+    #
+    # Function: EncryptStream
+    #
+    # Purpose: Encrypts text that arrives in chunks
+    #
+    # Input:
+    #   chunks -- iterable: Strings to be encrypted
+    #
+    # Output:
+    #   Yields encrypted text -- string
+    #
+    ############################################################################
+    def EncryptStream(self, chunks):
+        return self.StreamPairs(chunks, self.EncryptPair, self.SplitPairs)
+
+    ############################################################################
+    #
+    # Function: DecryptStream
+    #
+    # Purpose: Decrypts text that arrives in chunks
+    #
+    # Input:
+    #   chunks -- iterable: Strings to be decrypted
+    #
+    # Output:
+    #   Yields decrypted text -- string
+    #
+    ############################################################################
+    def DecryptStream(self, chunks):
+        return self.StreamPairs(chunks, self.DecryptPair, self.SplitCipherPairs)
     
 ################################################################################
 #
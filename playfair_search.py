@@ -0,0 +1,593 @@
+from concurrent.futures import ProcessPoolExecutor
+from playfair_cipher import PlayfairCipher
+import math
+import random
+import time
+
+################################################################################
+#
+# Playfair Key Search
+#
+# Recovers a Playfair key from ciphertext by hill climbing over key tables.
+#  The key table is a mutable 25 cell grid and every move is a handful of
+#  cell swaps.  The ciphertext is split into digraphs once; after a single
+#  swap only the digraphs it can reach are decrypted again, and only the
+#  quadgrams around the ones whose decryption changed are rescored.
+#
+################################################################################
+
+# Letters of the key table, j shares a cell with i
+TABLE_LETTERS = 'abcdefghiklmnopqrstuvwxyz'
+
+# Number of entries in a quadgram table, one per 4 letter combination
+QUADGRAM_COUNT = 26 ** 4
+
+# Log probability given to quadgrams that were never seen, as a count
+QUADGRAM_FLOOR_COUNT = 0.01
+
+# Starting temperature for accepting worse key tables.  It falls to 0 over
+#  a climb, so the end of every climb is plain hill climbing.
+TEMPERATURE = 5.0
+
+# Chance of each kind of move.  Swapping two cells is the small step, row
+#  and column swaps get out of spots single swaps can not.
+ROW_SWAP_CHANCE = 0.05
+COLUMN_SWAP_CHANCE = 0.05
+
+# Location of each letter pair after decryption, by location before.
+#  Built from PlayfairCipher.MovePair so the rules are the cipher's own.
+DECRYPT_MOVES = [[PlayfairCipher().MovePair(loc1, loc2, -1) for loc2 in range(25)] for loc1 in range(25)]
+
+# Locations of the letter pairs whose decryption lands on each cell, by
+#  cell.  Swapping two cells only changes the digraphs that hold one of the
+#  swapped letters or that decrypt onto one of the two cells.
+DECRYPT_SOURCES = [[] for cell in range(25)]
+for loc1 in range(25):
+    for loc2 in range(25):
+        for cell in set(DECRYPT_MOVES[loc1][loc2]):
+            DECRYPT_SOURCES[cell].append((loc1, loc2))
+
+# Quadgram table used by the worker processes
+worker_quadgrams = None
+
+################################################################################
+#
+# Function: QuadgramIndex
+#
+# Purpose: Turns four letters into an index into a quadgram table
+#
+# Input:
+#   letters -- string: Four letters a-z
+#
+# Output:
+#   index -- int
+#
+################################################################################
+def QuadgramIndex(letters):
+    index = 0
+    for letter in letters:
+        index = index * 26 + ord(letter) - 97
+    return index
+
+################################################################################
+#
+# Function: MakeQuadgramTable
+#
+# Purpose: Turns quadgram counts into a table of log probabilities
+#
+# Input:
+#   counts -- dict: Four letter string -> count
+#
+# Output:
+#   quadgrams -- list: log10 probability for every QuadgramIndex
+#
+################################################################################
+def MakeQuadgramTable(counts):
+    total = float(sum(counts.values()))
+    if not total:
+        raise ValueError('No quadgrams to build a table from')
+    quadgrams = [math.log10(QUADGRAM_FLOOR_COUNT / total)] * QUADGRAM_COUNT
+    for letters, count in counts.items():
+        quadgrams[QuadgramIndex(letters)] = math.log10(count / total)
+    return quadgrams
+
+################################################################################
+#
+# Function: BuildQuadgrams
+#
+# Purpose: Counts the quadgrams of a sample of English text.  The text is
+#           normalized the way Playfair plaintext is, so j becomes i.
+#
+# Input:
+#   corpus -- string: English text
+#
+# Output:
+#   quadgrams -- list: Table from MakeQuadgramTable
+#
+################################################################################
+def BuildQuadgrams(corpus):
+    letters = PlayfairCipher().PrepStringForCipher(corpus)
+    counts = {}
+    for i in range(len(letters) - 3):
+        quadgram = letters[i:i + 4]
+        counts[quadgram] = counts.get(quadgram, 0) + 1
+    return MakeQuadgramTable(counts)
+
+################################################################################
+#
+# Function: LoadQuadgrams
+#
+# Purpose: Reads quadgram counts from a file with one 'TION 13168375' line
+#           per quadgram, the layout most published tables use
+#
+# Input:
+#   path -- string: File to read
+#
+# Output:
+#   quadgrams -- list: Table from MakeQuadgramTable
+#
+################################################################################
+def LoadQuadgrams(path):
+    counts = {}
+    with open(path) as infile:
+        for line in infile:
+            fields = line.split()
+            if len(fields) == 2 and len(fields[0]) == 4 and fields[0].isalpha():
+                letters = fields[0].lower().replace('j', 'i')
+                counts[letters] = counts.get(letters, 0) + int(fields[1])
+    return MakeQuadgramTable(counts)
+
+################################################################################
+#
+# KeyTable
+#
+# A Playfair key table that can be changed in place.  grid holds the
+#  letter at each location and locs the location of each letter so moves
+#  and lookups are O(1).  Letters are stored as 0 - 25.
+#
+################################################################################
+class KeyTable:
+    ############################################################################
+    #
+    # Function: __init__
+    #
+    # Purpose: Sets up the grid from a key table string
+    #
+    # Input:
+    #   key_table -- string: The 25 letters of the table in order
+    #
+    # Output:
+    #   None
+    #
+    ############################################################################
+    def __init__(self, key_table):
+        if sorted(key_table) != sorted(TABLE_LETTERS):
+            raise ValueError('Key table must hold every letter but j once')
+        self.grid = [ord(x) - 97 for x in key_table]
+        self.locs = [-1] * 26
+        for loc, letter in enumerate(self.grid):
+            self.locs[letter] = loc
+
+    ############################################################################
+    #
+    # Function: Swap
+    #
+    # Purpose: Swaps the letters in two cells
+    #
+    # Input:
+    #   loc1 -- int: Location of the first cell, 0 - 24
+    #   loc2 -- int: Location of the second cell, 0 - 24
+    #
+    # Output:
+    #   None
+    #
+    ############################################################################
+    def Swap(self, loc1, loc2):
+        grid = self.grid
+        grid[loc1], grid[loc2] = grid[loc2], grid[loc1]
+        self.locs[grid[loc1]] = loc1
+        self.locs[grid[loc2]] = loc2
+
+    ############################################################################
+    #
+    # Function: RowSwaps
+    #
+    # Purpose: Lists the cell swaps that swap two rows
+    #
+    # Input:
+    #   row1 -- int: First row, 0 - 4
+    #   row2 -- int: Second row, 0 - 4
+    #
+    # Output:
+    #   swaps -- list: (loc1, loc2) for each cell
+    #
+    ############################################################################
+    def RowSwaps(self, row1, row2):
+        return [(row1 * 5 + col, row2 * 5 + col) for col in range(5)]
+
+    ############################################################################
+    #
+    # Function: ColumnSwaps
+    #
+    # Purpose: Lists the cell swaps that swap two columns
+    #
+    # Input:
+    #   col1 -- int: First column, 0 - 4
+    #   col2 -- int: Second column, 0 - 4
+    #
+    # Output:
+    #   swaps -- list: (loc1, loc2) for each cell
+    #
+    ############################################################################
+    def ColumnSwaps(self, col1, col2):
+        return [(row * 5 + col1, row * 5 + col2) for row in range(5)]
+
+    ############################################################################
+    #
+    # Function: Key
+    #
+    # Purpose: Turns the grid back into a key that PlayfairCipher.SetKey
+    #           builds the same table from
+    #
+    # Input:
+    #   None
+    #
+    # Output:
+    #   key -- string
+    #
+    ############################################################################
+    def Key(self):
+        return ''.join([chr(x + 97) for x in self.grid])
+
+################################################################################
+#
+# end KeyTable
+#
+################################################################################
+
+################################################################################
+#
+# Climber
+#
+# Keeps the decryption and quadgram score of one key table up to date as
+#  the table is changed.  A single cell swap decrypts again only the
+#  distinct ciphertext digraphs it can reach, see DECRYPT_SOURCES.  Row and
+#  column swaps move most of the table and decrypt every distinct digraph.
+#  Only the places where a decryption changed are rewritten.
+#
+################################################################################
+class Climber:
+    ############################################################################
+    #
+    # Function: __init__
+    #
+    # Purpose: Splits the ciphertext into digraphs and finds where each
+    #           distinct digraph appears.  The plaintext is kept as one
+    #           pair code, first * 26 + second, per digraph.
+    #
+    # Input:
+    #   ciphertext -- string: Playfair ciphertext
+    #   quadgrams -- list: Table from BuildQuadgrams or LoadQuadgrams
+    #
+    # Output:
+    #   None
+    #
+    ############################################################################
+    def __init__(self, ciphertext, quadgrams):
+        letters = PlayfairCipher().PrepStringForCipher(ciphertext)
+        if len(letters) < 6:
+            raise ValueError('Ciphertext needs at least 6 letters')
+        if len(letters) % 2:
+            letters += 'x'
+        self.quadgrams = quadgrams
+        positions = {}
+        for i in range(0, len(letters), 2):
+            positions.setdefault((ord(letters[i]) - 97, ord(letters[i + 1]) - 97), []).append(i // 2)
+        self.digraphs = list(positions)
+        self.positions = [positions[x] for x in self.digraphs]
+        # Index of each digraph, and the digraphs holding each letter
+        self.digraph_indexes = dict([(digraph, i) for i, digraph in enumerate(self.digraphs)])
+        self.letter_digraphs = [[] for i in range(26)]
+        for digraph_index, (char1, char2) in enumerate(self.digraphs):
+            self.letter_digraphs[char1].append(digraph_index)
+            if char2 != char1:
+                self.letter_digraphs[char2].append(digraph_index)
+        self.pairs = [0] * (len(letters) // 2)
+        self.outputs = [None] * len(self.digraphs)
+        self.table = None
+        self.score = 0.0
+
+    ############################################################################
+    #
+    # Function: SetTable
+    #
+    # Purpose: Decrypts all of the ciphertext with a new key table and
+    #           scores it from scratch
+    #
+    # Input:
+    #   table -- KeyTable: Table to climb from
+    #
+    # Output:
+    #   None
+    #
+    ############################################################################
+    def SetTable(self, table):
+        self.table = table
+        grid, locs = table.grid, table.locs
+        pairs = self.pairs
+        for digraph_index, (char1, char2) in enumerate(self.digraphs):
+            loc1, loc2 = DECRYPT_MOVES[locs[char1]][locs[char2]]
+            output = self.outputs[digraph_index] = grid[loc1] * 26 + grid[loc2]
+            for k in self.positions[digraph_index]:
+                pairs[k] = output
+        self.score = self.ScoreBlocks(range(len(pairs) - 1))
+
+    ############################################################################
+    #
+    # Function: ScoreBlocks
+    #
+    # Purpose: Sums the quadgram scores for blocks of the plaintext.  Block
+    #           k is the two quadgrams that start in pair k, so it depends
+    #           on pairs k to k + 2.  The last block only has the quadgram
+    #           that starts on the pair boundary.
+    #
+    # Input:
+    #   blocks -- iterable: Block numbers, ones past the end are skipped
+    #
+    # Output:
+    #   score -- float
+    #
+    ############################################################################
+    def ScoreBlocks(self, blocks):
+        quadgrams = self.quadgrams
+        pairs = self.pairs
+        last = len(pairs) - 2
+        score = 0.0
+        for k in blocks:
+            if 0 <= k < last:
+                middle = pairs[k + 1]
+                score += quadgrams[pairs[k] * 676 + middle] + quadgrams[(pairs[k] % 26 * 676 + middle) * 26 + pairs[k + 2] // 26]
+            elif k == last:
+                score += quadgrams[pairs[k] * 676 + pairs[k + 1]]
+        return score
+
+    ############################################################################
+    #
+    # Function: SwapDigraphs
+    #
+    # Purpose: Finds the digraphs whose decryption a swap of two cells can
+    #           change: the ones holding a swapped letter, and the ones that
+    #           decrypt onto one of the cells
+    #
+    # Input:
+    #   loc1 -- int: Location of the first cell, already swapped
+    #   loc2 -- int: Location of the second cell, already swapped
+    #
+    # Output:
+    #   digraph_indexes -- set: Indexes into digraphs
+    #
+    ############################################################################
+    def SwapDigraphs(self, loc1, loc2):
+        grid = self.table.grid
+        letter_digraphs = self.letter_digraphs
+        found = set(letter_digraphs[grid[loc1]])
+        found.update(letter_digraphs[grid[loc2]])
+        digraph_indexes = self.digraph_indexes
+        for cell in (loc1, loc2):
+            for source1, source2 in DECRYPT_SOURCES[cell]:
+                digraph_index = digraph_indexes.get((grid[source1], grid[source2]))
+                if digraph_index is not None:
+                    found.add(digraph_index)
+        return found
+
+    ############################################################################
+    #
+    # Function: Move
+    #
+    # Purpose: Applies cell swaps to the key table and updates the
+    #           decryption and score.  The digraphs a single swap reaches
+    #           all change, about a third of the distinct ones in English
+    #           text, and the quadgrams around every place they appear are
+    #           rescored.  That rescoring is most of the cost of a move and
+    #           still grows with the length of the ciphertext.
+    #
+    # Input:
+    #   swaps -- list: (loc1, loc2) cell swaps
+    #
+    # Output:
+    #   undo -- tuple: Pass to Undo to put everything back
+    #
+    ############################################################################
+    def Move(self, swaps):
+        table = self.table
+        for loc1, loc2 in swaps:
+            table.Swap(loc1, loc2)
+        grid, locs = table.grid, table.locs
+
+        outputs = self.outputs
+        digraphs = self.digraphs
+        if len(swaps) == 1:
+            digraph_indexes = self.SwapDigraphs(*swaps[0])
+        else:
+            digraph_indexes = range(len(digraphs))
+        changed = []
+        for digraph_index in digraph_indexes:
+            char1, char2 = digraphs[digraph_index]
+            loc1, loc2 = DECRYPT_MOVES[locs[char1]][locs[char2]]
+            output = grid[loc1] * 26 + grid[loc2]
+            if output != outputs[digraph_index]:
+                changed.append((digraph_index, outputs[digraph_index]))
+                outputs[digraph_index] = output
+
+        # Blocks that read a changed pair, scored before and after
+        positions = self.positions
+        moved = [k for digraph_index, old_output in changed for k in positions[digraph_index]]
+        blocks = set(moved)
+        blocks.update([k - 1 for k in moved])
+        blocks.update([k - 2 for k in moved])
+        before = self.ScoreBlocks(blocks)
+        pairs = self.pairs
+        for digraph_index, old_output in changed:
+            output = outputs[digraph_index]
+            for k in self.positions[digraph_index]:
+                pairs[k] = output
+        delta = self.ScoreBlocks(blocks) - before
+        self.score += delta
+        return (swaps, changed, delta)
+
+    ############################################################################
+    #
+    # Function: Undo
+    #
+    # Purpose: Reverses a Move
+    #
+    # Input:
+    #   undo -- tuple: What Move returned
+    #
+    # Output:
+    #   None
+    #
+    ############################################################################
+    def Undo(self, undo):
+        swaps, changed, delta = undo
+        for loc1, loc2 in reversed(swaps):
+            self.table.Swap(loc1, loc2)
+        pairs = self.pairs
+        for digraph_index, old_output in changed:
+            self.outputs[digraph_index] = old_output
+            for k in self.positions[digraph_index]:
+                pairs[k] = old_output
+        self.score -= delta
+
+    ############################################################################
+    #
+    # Function: Climb
+    #
+    # Purpose: Hill climbs from a random key table.  Worse tables are taken
+    #           now and then while the temperature is above 0 so the climb
+    #           can leave a local peak.  The best table seen is kept.
+    #
+    # Input:
+    #   rng -- random.Random: Source of moves
+    #   iterations -- int: Number of candidate tables to score
+    #   temperature -- float: Starting temperature, 0 for plain hill
+    #                          climbing
+    #
+    # Output:
+    #   (score, key) -- tuple (float, string): Best score and its key table
+    #
+    ############################################################################
+    def Climb(self, rng, iterations, temperature=TEMPERATURE):
+        letters = list(TABLE_LETTERS)
+        rng.shuffle(letters)
+        table = KeyTable(''.join(letters))
+        self.SetTable(table)
+        best_score, best_key = self.score, table.Key()
+
+        for iteration in range(iterations):
+            move = rng.random()
+            if move < ROW_SWAP_CHANCE:
+                swaps = table.RowSwaps(*rng.sample(range(5), 2))
+            elif move < ROW_SWAP_CHANCE + COLUMN_SWAP_CHANCE:
+                swaps = table.ColumnSwaps(*rng.sample(range(5), 2))
+            else:
+                swaps = [rng.sample(range(25), 2)]
+            undo = self.Move(swaps)
+            delta = undo[2]
+            if delta < 0:
+                current = temperature * (1 - iteration / float(iterations))
+                if current <= 0 or rng.random() >= math.exp(delta / current):
+                    self.Undo(undo)
+                    continue
+            if self.score > best_score:
+                best_score, best_key = self.score, table.Key()
+        return (best_score, best_key)
+
+################################################################################
+#
+# end Climber
+#
+################################################################################
+
+################################################################################
+#
+# Function: InitWorker
+#
+# Purpose: Hands the quadgram table to a worker process once so it is not
+#           sent with every restart
+#
+# Input:
+#   quadgrams -- list: Table from BuildQuadgrams or LoadQuadgrams
+#
+# Output:
+#   None
+#
+################################################################################
+def InitWorker(quadgrams):
+    global worker_quadgrams
+    worker_quadgrams = quadgrams
+
+################################################################################
+#
+# Function: ClimbWorker
+#
+# Purpose: Runs one independent climb in a worker process
+#
+# Input:
+#   ciphertext -- string: Playfair ciphertext
+#   seed -- int: Seed for the climb's moves
+#   iterations -- int: Number of candidate tables to score
+#   temperature -- float: Starting temperature
+#
+# Output:
+#   (score, key) -- tuple (float, string)
+#
+################################################################################
+def ClimbWorker(ciphertext, seed, iterations, temperature):
+    return Climber(ciphertext, worker_quadgrams).Climb(random.Random(seed), iterations, temperature)
+
+################################################################################
+#
+# Function: SearchKey
+#
+# Purpose: Runs independent climbs across a pool of worker processes and
+#           decrypts the ciphertext once with the best key found
+#
+# Input:
+#   ciphertext -- string: Playfair ciphertext
+#   quadgrams -- list: Table from BuildQuadgrams or LoadQuadgrams
+#   restarts -- int: Number of climbs
+#   iterations -- int: Candidate tables scored per climb
+#   workers -- int: Number of processes, 1 runs in this process, None for
+#                    one per cpu
+#   seed -- int: Seed for the climbs, None for a random one
+#   temperature -- float: Starting temperature of every climb
+#
+# Output:
+#   (key, plaintext, stats) -- tuple (string, string, dict): stats holds
+#                               the best score, the number of candidates
+#                               scored and candidates per second
+#
+################################################################################
+def SearchKey(ciphertext, quadgrams, restarts=8, iterations=30000, workers=None, seed=None, temperature=TEMPERATURE):
+    rng = random.Random(seed)
+    seeds = [rng.getrandbits(32) for i in range(restarts)]
+    start = time.perf_counter()
+    if workers == 1:
+        results = [Climber(ciphertext, quadgrams).Climb(random.Random(x), iterations, temperature) for x in seeds]
+    else:
+        with ProcessPoolExecutor(workers, initializer=InitWorker, initargs=(quadgrams,)) as pool:
+            results = list(pool.map(ClimbWorker, [ciphertext] * restarts, seeds, [iterations] * restarts, [temperature] * restarts))
+    elapsed = time.perf_counter() - start
+
+    score, key = max(results)
+    cipher = PlayfairCipher()
+    cipher.SetKey(key)
+    candidates = restarts * iterations
+    stats = {
+        'score': score,
+        'candidates': candidates,
+        'seconds': elapsed,
+        'candidates_per_second': candidates / elapsed if elapsed else 0.0,
+    }
+    return (key, cipher.Decrypt(ciphertext), stats)
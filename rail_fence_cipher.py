@@ -1,11 +1,161 @@
-from cipher_interface import CipherInterface
+from cipher_interface import CipherInterface, CHUNK_SIZE, ReadWindow
+from functools import lru_cache
+from operator import itemgetter
+import numpy_backend
 import re
+import tempfile
+
+# Number of (length, num_rails) permutations kept around.  A permutation
+#  holds one int per letter so this is kept small.
+PERMUTATION_CACHE_SIZE = 32
+
+# Longest text reordered with a cached gatherer.  A gatherer costs about 100
+#  bytes per letter, and past a few thousand letters slicing the text into
+#  rails is faster anyway, so longer texts are sliced and nothing is cached.
+CACHED_PERMUTATION_LENGTH = 8 * 1024
+
+################################################################################
+#
+# Function: RailCycle
+#
+# Purpose: Gives the rail each position of the text lands on for one full
+#           zigzag of the fence.  The text goes down the rails and back up
+#           again, touching the top and bottom rails once per cycle and
+#           the middle rails twice.
+#
+# Input:
+#   num_rails -- int: Number of rails
+#
+# Output:
+#   cycle -- list: Rail number for each position in one cycle
+#
+################################################################################
+def RailCycle(num_rails):
+    return list(range(num_rails)) + list(range(num_rails - 2, 0, -1))
+
+################################################################################
+#
+# Function: BuildPermutation
+#
+# Purpose: Works out the order the letters of a text are read off the fence
+#
+# Input:
+#   length -- int: Length of the text
+#   num_rails -- int: Number of rails
+#
+# Output:
+#   permutation -- list: Index into the plaintext for each position of the
+#                         ciphertext
+#
+################################################################################
+def BuildPermutation(length, num_rails):
+    cycle = RailCycle(num_rails)
+    period = len(cycle)
+    permutation = []
+    for rail in range(num_rails):
+        indexes = [range(start, length, period) for start in range(period) if cycle[start] == rail]
+        # Middle rails get two letters per cycle which need to be interleaved
+        rail_indexes = [0] * sum([len(x) for x in indexes])
+        for i, index_range in enumerate(indexes):
+            rail_indexes[i::len(indexes)] = index_range
+        permutation.extend(rail_indexes)
+    return permutation
+
+# BuildPermutation with its results kept per (length, num_rails)
+CachedPermutation = lru_cache(maxsize=PERMUTATION_CACHE_SIZE)(BuildPermutation)
+
+################################################################################
+#
+# Function: GetPermutation
+#
+# Purpose: Gives the order the letters of a text are read off the fence.
+#           Results are cached per (length, num_rails) up to
+#           CACHED_PERMUTATION_LENGTH letters, longer ones are built each
+#           time since they cost about 36 bytes per letter.
+#
+# Input:
+#   length -- int: Length of the text
+#   num_rails -- int: Number of rails
+#
+# Output:
+#   permutation -- list: Index into the plaintext for each position of the
+#                         ciphertext
+#
+################################################################################
+def GetPermutation(length, num_rails):
+    if length > CACHED_PERMUTATION_LENGTH:
+        return BuildPermutation(length, num_rails)
+    return CachedPermutation(length, num_rails)
+
+################################################################################
+#
+# Function: GetGatherers
+#
+# Purpose: Builds functions that pull the letters of a text into encrypted
+#           or decrypted order in a single pass.  Results are cached per
+#           (length, num_rails).
+#
+# Input:
+#   length -- int: Length of the text, must be at least 2
+#   num_rails -- int: Number of rails
+#
+# Output:
+#   (encrypt, decrypt) -- tuple (itemgetter, itemgetter): Each returns a
+#                          tuple of the reordered letters
+#
+################################################################################
+@lru_cache(maxsize=PERMUTATION_CACHE_SIZE)
+def GetGatherers(length, num_rails):
+    permutation = GetPermutation(length, num_rails)
+    inverse = [0] * length
+    for position, index in enumerate(permutation):
+        inverse[index] = position
+    return (itemgetter(*permutation), itemgetter(*inverse))
+
+################################################################################
+#
+# Function: GetPermutationArrays
+#
+# Purpose: numpy backend version of GetGatherers.  Results are cached per
+#           (length, num_rails).
+#
+# Input:
+#   length -- int: Length of the text
+#   num_rails -- int: Number of rails
+#
+# Output:
+#   (encrypt, decrypt) -- tuple (numpy.ndarray, numpy.ndarray): Index arrays
+#                          for each direction
+#
+################################################################################
+@lru_cache(maxsize=PERMUTATION_CACHE_SIZE)
+def GetPermutationArrays(length, num_rails):
+    return numpy_backend.IndexArrays(GetPermutation(length, num_rails))
 ################################################################################
 #
 # RailFenceCipher
 #
 ################################################################################
 class RailFenceCipher(CipherInterface):
+    ############################################################################
+    #
+    # Function: SetAlphabet
+    #
+    # Purpose: Picks the symbols this instance works on
+    #
+    # Input:
+    #   alphabet -- Alphabet: Symbols to use.  Must not pass other chars
+    #                          through, the bytes and stream functions move
+    #                          single ascii bytes around.
+    #
+    # Output: Nothing
+    #
+    ############################################################################
+    def SetAlphabet(self, alphabet):
+        if alphabet.pass_through:
+            raise ValueError('Rail Fence can not pass other chars through')
+        CipherInterface.SetAlphabet(self, alphabet)
+
     ############################################################################
     #
     # Function: SetKey
@@ -21,7 +171,10 @@ class RailFenceCipher(CipherInterface):
     #
     ############################################################################
     def SetKey(self, key):
-        self.num_rails = int(key)
+        num_rails = int(key)
+        if num_rails < 1:
+            raise ValueError('Rail Fence needs at least 1 rail, got %d' % num_rails)
+        self.num_rails = num_rails
 
     ############################################################################
     #
@@ -30,23 +183,30 @@ class RailFenceCipher(CipherInterface):
     # Purpose: Encrypts plaintext
     #
     # Input:
-    #   plaintext -- string: Text to be encrypted
+    #   plaintext -- string: Text to be encrypted.  bytes, bytearray and
+    #                         memoryview go through EncryptBytes
     #
     # Output:
     #   Encrypted text -- string
     #
     ############################################################################
     def Encrypt(self, plaintext):
-        rails = []
-        plaintext = self.PrepStringForCipher(plaintext)
-        for i in range(self.num_rails):
-            rails.append('')
-
-        i = 0
-        while i < len(plaintext):
-            rails[i % self.num_rails] += plaintext[i]
-            i += 1
-        return ''.join(rails)
+        if not isinstance(plaintext, str):
+            return self.EncryptBytes(plaintext)
+        timer = self.StartTimer('encrypt')
+        letters = self.PrepStringForCipher(plaintext)
+        if timer:
+            timer.Stage('normalize')
+        if self.UseNumpy() and 2 <= len(letters) <= CACHED_PERMUTATION_LENGTH:
+            stage = 'numpy'
+            encrypted = numpy_backend.Gather(letters, GetPermutationArrays(len(letters), self.num_rails)[0])
+        else:
+            stage = self.ReorderStage(len(letters))
+            encrypted = self.Reorder(letters, 0)
+        if timer:
+            timer.Stage(stage)
+            timer.Done(chars_in=len(plaintext), chars_out=len(encrypted))
+        return encrypted
 
     ############################################################################
     #
@@ -55,32 +215,432 @@ class RailFenceCipher(CipherInterface):
     # Purpose: Decrypt the inputted cipher text
     #
     # Input:
-    #   plaintext -- string: Text to be decrypted
+    #   plaintext -- string: Text to be decrypted.  bytes, bytearray and
+    #                         memoryview go through DecryptBytes
     #
     # Output:
     #   Returns decrypted version of ciphertext
     #
     ############################################################################
     def Decrypt(self, ciphertext):
+        if not isinstance(ciphertext, str):
+            return self.DecryptBytes(ciphertext)
+        timer = self.StartTimer('decrypt')
+        letters = self.PrepStringForCipher(ciphertext)
+        if timer:
+            timer.Stage('normalize')
+        if self.UseNumpy() and 2 <= len(letters) <= CACHED_PERMUTATION_LENGTH:
+            stage = 'numpy'
+            decrypted = numpy_backend.Gather(letters, GetPermutationArrays(len(letters), self.num_rails)[1])
+        else:
+            stage = self.ReorderStage(len(letters))
+            decrypted = self.Reorder(letters, 1)
+        if timer:
+            timer.Stage(stage)
+            timer.Done(chars_in=len(ciphertext), chars_out=len(decrypted))
+        return decrypted
+
+    ############################################################################
+    #
+    # Function: EncryptBytes
+    #
+    # Purpose: Encrypts ascii data without going through str
+    #
+    # Input:
+    #   data -- bytes, bytearray or memoryview: Data to be encrypted
+    #
+    # Output:
+    #   Encrypted data -- bytes
+    #
+    ############################################################################
+    def EncryptBytes(self, data):
+        timer = self.StartTimer('encrypt_bytes')
+        letters = self.normalizer.TranslateBytes(data)
+        if timer:
+            timer.Stage('normalize')
+        encrypted = self.Reorder(letters, 0)
+        if timer:
+            timer.Stage(self.ReorderStage(len(letters)))
+            timer.Done(chars_in=len(data), chars_out=len(encrypted))
+        return encrypted
+
+    ############################################################################
+    #
+    # Function: DecryptBytes
+    #
+    # Purpose: Decrypts ascii data without going through str
+    #
+    # Input:
+    #   data -- bytes, bytearray or memoryview: Data to be decrypted
+    #
+    # Output:
+    #   Decrypted data -- bytes
+    #
+    ############################################################################
+    def DecryptBytes(self, data):
+        timer = self.StartTimer('decrypt_bytes')
+        letters = self.normalizer.TranslateBytes(data)
+        if timer:
+            timer.Stage('normalize')
+        decrypted = self.Reorder(letters, 1)
+        if timer:
+            timer.Stage(self.ReorderStage(len(letters)))
+            timer.Done(chars_in=len(data), chars_out=len(decrypted))
+        return decrypted
+
+    ############################################################################
+    #
+    # Function: Reorder
+    #
+    # Purpose: Moves normalized letters into encrypted or decrypted order.
+    #           Up to CACHED_PERMUTATION_LENGTH letters this is one pass of a
+    #           cached gatherer, longer texts are cut into rails by slicing.
+    #
+    # Input:
+    #   letters -- string or bytes: Normalized letters
+    #   direction -- int: 0 to encrypt, 1 to decrypt
+    #
+    # Output:
+    #   Reordered letters -- the same type as letters
+    #
+    ############################################################################
+    def Reorder(self, letters, direction):
+        # Nothing to move around with less than 2 letters
+        if len(letters) < 2:
+            return letters
+        if len(letters) <= CACHED_PERMUTATION_LENGTH:
+            gathered = GetGatherers(len(letters), self.num_rails)[direction](letters)
+            return ''.join(gathered) if isinstance(letters, str) else bytes(gathered)
+        if direction == 0:
+            rails = self.SplitIntoRails(letters, 0)
+            return ''.join(rails) if isinstance(letters, str) else b''.join(rails)
+        rails = []
+        rail_start = 0
+        for rail_length in self.RailLengths(len(letters)):
+            rails.append(letters[rail_start:rail_start + rail_length])
+            rail_start += rail_length
+        return self.JoinRails(rails, 0)
+
+    ############################################################################
+    #
+    # Function: ReorderStage
+    #
+    # Purpose: Names the way Reorder moves a text of some length, for the
+    #           metrics hooks
+    #
+    # Input:
+    #   length -- int: Number of letters
+    #
+    # Output:
+    #   stage -- string: 'gather' or 'slice'
+    #
+    ############################################################################
+    def ReorderStage(self, length):
+        return 'gather' if length <= CACHED_PERMUTATION_LENGTH else 'slice'
+
+    ############################################################################
+    #
+    # Function: Permutation
+    #
+    # Purpose: The fence only reorders the letters
+    #
+    # Input:
+    #   length -- int: Number of letters
+    #
+    # Output:
+    #   permutation -- list: Index into the plaintext for each position of
+    #                         the ciphertext
+    #
+    ############################################################################
+    def Permutation(self, length):
+        return GetPermutation(length, self.num_rails)
+
+    ############################################################################
+    #
+    # Function: RailCycle
+    #
+    # Purpose: Gives the rail each position of the text lands on for one
+    #           full cycle of the fence.  The pattern repeats after that.
+    #
+    # Input:
+    #   None
+    #
+    # Output:
+    #   cycle -- list: Rail number for each position in one cycle
+    #
+    ############################################################################
+    def RailCycle(self):
+        return RailCycle(self.num_rails)
+
+    ############################################################################
+    #
+    # Function: RailStarts
+    #
+    # Purpose: Finds where each rail's letters start inside a piece of text
+    #           that begins at offset in the full text
+    #
+    # Input:
+    #   offset -- int: Position of the piece in the full text
+    #
+    # Output:
+    #   starts -- list: For each rail a sorted list of start indexes.  Every
+    #                    start is stepped through by the cycle length.
+    #
+    ############################################################################
+    def RailStarts(self, offset):
+        cycle = self.RailCycle()
+        starts = [[] for i in range(self.num_rails)]
+        for position, rail in enumerate(cycle):
+            starts[rail].append((position - offset) % len(cycle))
+        for rail_starts in starts:
+            rail_starts.sort()
+        return starts
+
+    ############################################################################
+    #
+    # Function: SplitIntoRails
+    #
+    # Purpose: Splits a piece of text into the letters that land on each rail
+    #
+    # Input:
+    #   text -- string or bytes: Piece of text to split
+    #   offset -- int: Position of the piece in the full text
+    #
+    # Output:
+    #   rails -- list: The letters on each rail in order, the same type as
+    #                   text
+    #
+    ############################################################################
+    def SplitIntoRails(self, text, offset):
+        period = len(self.RailCycle())
         rails = []
-        ciphertext = self.PrepStringForCipher(ciphertext)
-        plaintext = ''
-        row_len = len(ciphertext) / self.num_rails
-        row_start = 0
-        row_end = row_len + (len(ciphertext) % self.num_rails)
-        for i in range(self.num_rails):
-            rails.append('')
-            rails[i] = ciphertext[row_start:row_end]
-            row_start = row_end
-            row_end += row_len
-
-        i = 0
-        while len(plaintext) is not len(ciphertext):
-            for rail in rails:
-                if i < len(rail):
-                    plaintext += rail[i]
-            i += 1
-        return plaintext
+        for rail_starts in self.RailStarts(offset):
+            pieces = [text[start::period] for start in rail_starts]
+            # A rail can be visited more than once per cycle.  Since the
+            #  starts are sorted the pieces interleave in order.
+            if isinstance(text, str):
+                letters = [''] * sum([len(piece) for piece in pieces])
+            else:
+                letters = bytearray(sum([len(piece) for piece in pieces]))
+            for i, piece in enumerate(pieces):
+                letters[i::len(pieces)] = piece
+            rails.append(''.join(letters) if isinstance(text, str) else bytes(letters))
+        return rails
+
+    ############################################################################
+    #
+    # Function: JoinRails
+    #
+    # Purpose: Undoes SplitIntoRails
+    #
+    # Input:
+    #   rails -- list: The letters on each rail for the piece -- string or
+    #                   bytes
+    #   offset -- int: Position of the piece in the full text
+    #
+    # Output:
+    #   text -- string or bytes: The piece of text, the same type as the
+    #                             rails
+    #
+    ############################################################################
+    def JoinRails(self, rails, offset):
+        period = len(self.RailCycle())
+        length = sum([len(rail) for rail in rails])
+        as_str = not rails or isinstance(rails[0], str)
+        letters = [''] * length if as_str else bytearray(length)
+        for rail, rail_starts in zip(rails, self.RailStarts(offset)):
+            for i, start in enumerate(rail_starts):
+                letters[start::period] = rail[i::len(rail_starts)]
+        return ''.join(letters) if as_str else bytes(letters)
+
+    ############################################################################
+    #
+    # Function: RailLengths
+    #
+    # Purpose: Counts how many letters of a text land on each rail
+    #
+    # Input:
+    #   length -- int: Length of the text
+    #
+    # Output:
+    #   lengths -- list: Number of letters on each rail -- int
+    #
+    ############################################################################
+    def RailLengths(self, length):
+        cycle = self.RailCycle()
+        full_cycles, leftover = divmod(length, len(cycle))
+        lengths = [0] * self.num_rails
+        for position, rail in enumerate(cycle):
+            lengths[rail] += full_cycles + (1 if position < leftover else 0)
+        return lengths
+
+    ############################################################################
+    #
+    # Function: RangeAlignment
+    #
+    # Purpose: Where each position sits in the ciphertext follows from the
+    #           full length and the number of rails, so a range can start
+    #           anywhere
+    #
+    # Input:
+    #   None
+    #
+    # Output:
+    #   alignment -- int: Always 1
+    #
+    ############################################################################
+    def RangeAlignment(self):
+        return 1
+
+    ############################################################################
+    #
+    # Function: DecryptWindow
+    #
+    # Purpose: Decrypts a window of the plaintext.  The window's letters on
+    #           each rail are one run of the ciphertext: the rail starts
+    #           after the rails above it and the run after the rail's
+    #           letters that come before start.  Only those runs are read
+    #           and then woven back together.
+    #
+    # Input:
+    #   ciphertext -- string, bytes or mmap: Ciphertext as Encrypt returned
+    #                  it
+    #   start -- int: First position wanted
+    #   end -- int: Position after the last one wanted
+    #
+    # Output:
+    #   Decrypted window -- string for string input, otherwise bytes
+    #
+    ############################################################################
+    def DecryptWindow(self, ciphertext, start, end):
+        if len(ciphertext) < 2:
+            return ReadWindow(ciphertext, start, end)
+        rail_start = 0
+        rails = []
+        for rail_length, before, upto in zip(self.RailLengths(len(ciphertext)), self.RailLengths(start), self.RailLengths(end)):
+            rails.append(ReadWindow(ciphertext, rail_start + before, rail_start + upto))
+            rail_start += rail_length
+        return self.JoinRails(rails, start)
+
+    ############################################################################
+    #
+    # Function: EncryptSplice
+    #
+    # Purpose: An edit that keeps the length keeps the fence, so the new
+    #           letters on each rail are written over one run of the
+    #           ciphertext, the same runs DecryptWindow reads.  Any other
+    #           edit moves every letter after it, so each rail keeps its
+    #           letters from before the edit and gets the rest again.
+    #
+    # Input:
+    #   plaintext -- bytearray: Normalized letters, updated in place
+    #   ciphertext -- bytearray: Encrypted letters, updated in place
+    #   start -- int: First letter replaced
+    #   end -- int: Letter after the last one replaced
+    #   letters -- bytes: Normalized letters put in their place
+    #   index -- Not used
+    #
+    # Output:
+    #   None
+    #
+    ############################################################################
+    def EncryptSplice(self, plaintext, ciphertext, start, end, letters, index):
+        old_lengths = self.RailLengths(len(plaintext))
+        plaintext[start:end] = letters
+        if len(letters) == end - start:
+            rail_start = 0
+            for rail_length, before, rail in zip(old_lengths, self.RailLengths(start), self.SplitIntoRails(letters, start)):
+                ciphertext[rail_start + before:rail_start + before + len(rail)] = rail
+                rail_start += rail_length
+            return
+        pieces = []
+        rail_start = 0
+        for rail_length, before, rail in zip(old_lengths, self.RailLengths(start), self.SplitIntoRails(bytes(plaintext[start:]), start)):
+            pieces.append(ciphertext[rail_start:rail_start + before])
+            pieces.append(rail)
+            rail_start += rail_length
+        ciphertext[:] = b''.join(pieces)
+
+    ############################################################################
+    #
+    # Function: EncryptStream
+    #
+    # Purpose: Encrypts text that arrives in chunks.  Each rail is spooled
+    #           to its own temporary file so memory use stays at about one
+    #           chunk no matter how long the text is.
+    #
+    # Input:
+    #   chunks -- iterable: Strings to be encrypted
+    #   chunk_size -- int: Number of chars read back from the spool at a time
+    #
+    # Output:
+    #   Yields encrypted text -- string
+    #
+    ############################################################################
+    def EncryptStream(self, chunks, chunk_size=CHUNK_SIZE):
+        spools = [tempfile.TemporaryFile() for i in range(self.num_rails)]
+        try:
+            offset = 0
+            for chunk in chunks:
+                chunk = self.PrepStringForCipher(chunk)
+                for spool, rail in zip(spools, self.SplitIntoRails(chunk, offset)):
+                    spool.write(rail.encode('ascii'))
+                offset += len(chunk)
+
+            for spool in spools:
+                spool.seek(0)
+                while True:
+                    block = spool.read(chunk_size)
+                    if not block:
+                        break
+                    yield block.decode('ascii')
+        finally:
+            for spool in spools:
+                spool.close()
+
+    ############################################################################
+    #
+    # Function: DecryptStream
+    #
+    # Purpose: Decrypts text that arrives in chunks.  The ciphertext is
+    #           spooled to a temporary file since the rail lengths depend on
+    #           the full length.  It is then read back a block at a time
+    #           from every rail.
+    #
+    # Input:
+    #   chunks -- iterable: Strings to be decrypted
+    #   chunk_size -- int: Approximate number of chars decrypted at a time
+    #
+    # Output:
+    #   Yields decrypted text -- string
+    #
+    ############################################################################
+    def DecryptStream(self, chunks, chunk_size=CHUNK_SIZE):
+        with tempfile.TemporaryFile() as spool:
+            length = 0
+            for chunk in chunks:
+                chunk = self.PrepStringForCipher(chunk).encode('ascii')
+                spool.write(chunk)
+                length += len(chunk)
+
+            # Where each rail starts in the spool
+            rail_locs = [0]
+            for rail_length in self.RailLengths(length)[:-1]:
+                rail_locs.append(rail_locs[-1] + rail_length)
+
+            period = len(self.RailCycle())
+            block_size = max(period, chunk_size // period * period)
+            offset = 0
+            while offset < length:
+                end = min(offset + block_size, length)
+                counts = [b - a for a, b in zip(self.RailLengths(offset), self.RailLengths(end))]
+                rails = []
+                for i, count in enumerate(counts):
+                    spool.seek(rail_locs[i])
+                    rails.append(spool.read(count).decode('ascii'))
+                    rail_locs[i] += count
+                yield self.JoinRails(rails, offset)
+                offset = end
 ################################################################################
 #
 # end RailFenceCipher
@@ -0,0 +1,92 @@
+from alphabet import Alphabet
+from caesar_cipher import CaesarCipher
+from playfair_cipher import PlayfairCipher
+from rail_fence_cipher import RailFenceCipher
+from string import ascii_letters
+from vigenre_cipher import VigenreCipher
+import pytest
+
+################################################################################
+#
+# Alphabet Tests
+#
+# Ciphers on alphabets other than a-z: mixed case, digits for a 6x6 Playfair
+#  grid, and pass through alphabets that leave other chars where they are.
+#
+# Run with:
+#   python -m pytest test_alphabet.py
+#
+################################################################################
+
+# a-z and 0-9, which fills a 6x6 Playfair grid
+ALPHANUMERIC = 'abcdefghijklmnopqrstuvwxyz0123456789'
+
+# Text with chars outside every alphabet here
+TEXT = 'Héllo, wörld!  Meet at 10pm.'
+
+################################################################################
+#
+# Function: MakeCipher
+#
+# Purpose: Builds a cipher on an alphabet and keys it
+#
+# Input:
+#   cipher_class -- class: Cipher to build
+#   alphabet -- Alphabet: Symbols to use
+#   key -- Key for the cipher
+#
+# Output:
+#   cipher -- CipherInterface
+#
+################################################################################
+def MakeCipher(cipher_class, alphabet, key):
+    cipher = cipher_class()
+    cipher.SetAlphabet(alphabet)
+    cipher.SetKey(key)
+    return cipher
+
+def test_mixed_case_caesar():
+    cipher = MakeCipher(CaesarCipher, Alphabet(ascii_letters), 1)
+    # z runs on to A and Z wraps around to a
+    assert cipher.Encrypt('Hello, Zz!') == 'IfmmpaA'
+    assert cipher.Decrypt('IfmmpaA') == 'HelloZz'
+
+@pytest.mark.parametrize('cipher_class, key', [(CaesarCipher, 3), (VigenreCipher, 'lemon')])
+def test_pass_through(cipher_class, key):
+    cipher = MakeCipher(cipher_class, Alphabet(pass_through=True), key)
+    encrypted = cipher.Encrypt(TEXT)
+    # Only the symbols change
+    assert [x for x in encrypted if not x.isalpha() or not x.isascii()] == [x for x in TEXT.lower() if not x.isalpha() or not x.isascii()]
+    assert cipher.Decrypt(encrypted) == TEXT.lower()
+    assert cipher.EncryptBytes(TEXT.encode('utf-8')) == encrypted.encode('utf-8')
+    assert cipher.DecryptBytes(encrypted.encode('utf-8')) == TEXT.lower().encode('utf-8')
+    assert ''.join(cipher.EncryptStream([TEXT[:7], TEXT[7:]])) == encrypted
+
+def test_playfair_grid():
+    cipher = MakeCipher(PlayfairCipher, Alphabet(ALPHANUMERIC), 'k3y')
+    assert cipher.grid_size == 6
+    encrypted = cipher.Encrypt(TEXT)
+    assert set(encrypted) <= set(ALPHANUMERIC)
+    assert cipher.Decrypt(encrypted).replace('x', '') == cipher.PrepStringForCipher(TEXT).replace('x', '')
+
+@pytest.mark.parametrize('cipher_class, key', [(VigenreCipher, 'a9'), (RailFenceCipher, 4)])
+def test_alphanumeric(cipher_class, key):
+    cipher = MakeCipher(cipher_class, Alphabet(ALPHANUMERIC), key)
+    prepped = cipher.PrepStringForCipher(TEXT)
+    assert '10' in prepped
+    assert cipher.Decrypt(cipher.Encrypt(TEXT)) == prepped
+    assert ''.join(cipher.EncryptStream([TEXT[:9], TEXT[9:]])) == cipher.Encrypt(TEXT)
+
+@pytest.mark.parametrize('cipher_class', [PlayfairCipher, RailFenceCipher])
+def test_pass_through_refused(cipher_class):
+    with pytest.raises(ValueError):
+        cipher_class().SetAlphabet(Alphabet(pass_through=True))
+
+def test_playfair_needs_padding_letter():
+    with pytest.raises(ValueError):
+        PlayfairCipher().SetAlphabet(Alphabet('abcdefghijklmnopqrstuvwyz'))
+
+@pytest.mark.parametrize('letters', ['', 'abca', 'abcé'])
+def test_bad_symbols(letters):
+    with pytest.raises(ValueError):
+        Alphabet(letters)
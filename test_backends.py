@@ -0,0 +1,124 @@
+from caesar_cipher import CaesarCipher
+from playfair_cipher import PlayfairCipher
+from rail_fence_cipher import CACHED_PERMUTATION_LENGTH, GetPermutation, RailFenceCipher
+from vigenre_cipher import VigenreCipher
+import metrics
+import numpy_backend
+import pytest
+import random
+
+################################################################################
+#
+# Backend Tests
+#
+# Runs every cipher on the python and numpy backends over random texts and
+#  keys.  Both backends must give the same output.
+#
+# Run with:
+#   python -m pytest test_backends.py
+#
+################################################################################
+
+pytestmark = pytest.mark.skipif(numpy_backend.numpy is None, reason='numpy is not installed')
+
+# Symbols the random texts are made of, including ones the ciphers drop
+TEXT_SYMBOLS = 'abcdefghijklmnopqrstuvwxyzAEIXZ ,.!0123'
+
+# Random texts per cipher
+TRIALS = 200
+
+################################################################################
+#
+# Function: MakeKeys
+#
+# Purpose: Gives a function making random keys for each cipher
+#
+# Input:
+#   rng -- random.Random: Source of the keys
+#
+# Output:
+#   key_makers -- list: (cipher class, function returning a key) tuples
+#
+################################################################################
+def MakeKeys(rng):
+    return [(CaesarCipher, lambda: str(rng.randint(-30, 30))),
+            (VigenreCipher, lambda: ''.join(rng.choice('abcxyz') for i in range(rng.randint(1, 9)))),
+            (RailFenceCipher, lambda: str(rng.randint(1, 12))),
+            (PlayfairCipher, lambda: ''.join(rng.choice('abjkxyz') for i in range(rng.randint(0, 9))))]
+
+################################################################################
+#
+# Function: CheckBackendsMatch
+#
+# Purpose: Encrypts and decrypts text on both backends and checks the
+#           outputs are the same
+#
+# Input:
+#   cipher_class -- class: Cipher to check
+#   key -- string: Key for the cipher
+#   text -- string: Text to encrypt and decrypt
+#
+# Output:
+#   None
+#
+################################################################################
+def CheckBackendsMatch(cipher_class, key, text):
+    python_cipher = cipher_class()
+    numpy_cipher = cipher_class()
+    numpy_cipher.SetBackend('numpy')
+    python_cipher.SetKey(key)
+    numpy_cipher.SetKey(key)
+    for func in ('Encrypt', 'Decrypt'):
+        expected = getattr(python_cipher, func)(text)
+        actual = getattr(numpy_cipher, func)(text)
+        assert actual == expected, (cipher_class.__name__, func, key, text)
+
+@pytest.mark.parametrize('index', range(4))
+def test_random_texts(index):
+    rng = random.Random(index)
+    cipher_class, MakeKey = MakeKeys(rng)[index]
+    for i in range(TRIALS):
+        text = ''.join(rng.choice(TEXT_SYMBOLS) for i in range(rng.randint(0, 300)))
+        # Doubled letters exercise the Playfair x padding
+        text += rng.choice('abx') * rng.randint(0, 5)
+        CheckBackendsMatch(cipher_class, MakeKey(), text)
+
+@pytest.mark.parametrize('length', [CACHED_PERMUTATION_LENGTH, CACHED_PERMUTATION_LENGTH + 1, 3 * CACHED_PERMUTATION_LENGTH + 7])
+def test_rail_fence_long_texts(length):
+    # Past CACHED_PERMUTATION_LENGTH the text is sliced into rails instead of
+    #  gathered, which must still follow the permutation
+    rng = random.Random(length)
+    text = ''.join(rng.choice('abcdefghijklmnopqrstuvwxyz') for i in range(length))
+    for num_rails in (2, 3, 7):
+        CheckBackendsMatch(RailFenceCipher, str(num_rails), text)
+        cipher = RailFenceCipher()
+        cipher.SetKey(num_rails)
+        assert cipher.Encrypt(text) == ''.join([text[x] for x in GetPermutation(length, num_rails)])
+
+def test_digraph_arrays_bounded():
+    cipher = PlayfairCipher()
+    cipher.SetBackend('numpy')
+    for i in range(numpy_backend.DIGRAPH_ARRAY_CACHE_SIZE):
+        cipher.SetKey(''.join(random.Random(i).sample('abcdefghiklmnopqrstuvwxyz', 8)))
+        cipher.Encrypt('hello world')
+        cipher.Decrypt('hello world')
+    assert len(numpy_backend.digraph_arrays) <= numpy_backend.DIGRAPH_ARRAY_CACHE_SIZE
+
+@pytest.mark.parametrize('backend, length, stage', [('numpy', 100, 'numpy'), ('numpy', CACHED_PERMUTATION_LENGTH + 1, 'slice'),
+                                                    ('python', 100, 'gather'), ('python', CACHED_PERMUTATION_LENGTH + 1, 'slice')])
+def test_rail_fence_stage_names(backend, length, stage):
+    # The metrics name the branch that did the work
+    events = []
+    cipher = RailFenceCipher()
+    cipher.SetBackend(backend)
+    cipher.SetKey(3)
+    hook = events.append
+    metrics.AddHook(hook)
+    try:
+        cipher.Encrypt('a' * length)
+        cipher.Decrypt('a' * length)
+        cipher.EncryptBytes(b'a' * length)
+    finally:
+        metrics.RemoveHook(hook)
+    expected = [stage, stage, 'slice' if length > CACHED_PERMUTATION_LENGTH else 'gather']
+    assert [[x for x in event['stages'] if x != 'normalize'] for event in events] == [[x] for x in expected]
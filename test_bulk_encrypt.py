@@ -0,0 +1,137 @@
+from playfair_cipher import PlayfairCipher
+from vigenre_cipher import VigenreCipher
+import bulk_encrypt
+import json
+import os
+import pytest
+import random
+
+################################################################################
+#
+# Bulk Encryption Tests
+#
+# Runs bulk_encrypt.RunJob over small trees in a temporary directory and
+#  checks the outputs, the manifest and what a second run redoes.
+#
+# Run with:
+#   python -m pytest test_bulk_encrypt.py
+#
+################################################################################
+
+# Files in each test tree
+FILES = 40
+
+################################################################################
+#
+# Function: MakeTree
+#
+# Purpose: Writes random text files into a few subdirectories
+#
+# Input:
+#   in_dir -- pathlib.Path: Directory to fill
+#
+# Output:
+#   relpaths -- list: Path of each file relative to in_dir, in the order
+#                      RunJob finishes them with one worker
+#
+################################################################################
+def MakeTree(in_dir):
+    rng = random.Random(0)
+    for i in range(FILES):
+        path = in_dir / ('d%d' % (i % 4)) / ('f%02d.txt' % i)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text(''.join(rng.choices('abcdefghijklmnopqrstuvwxyz ,.', k=rng.randrange(2000))))
+    return [relpath for relpath, size, mtime_ns in bulk_encrypt.WalkFiles(str(in_dir))]
+
+################################################################################
+#
+# Function: CheckOutputs
+#
+# Purpose: Checks every output against encrypting its input directly and
+#           that no .partial file is left behind
+#
+# Input:
+#   cipher -- CipherInterface: Keyed cipher the job used
+#   in_dir -- pathlib.Path: Input root
+#   out_dir -- pathlib.Path: Output root
+#   relpaths -- list: Files to check
+#
+# Output:
+#   None
+#
+################################################################################
+def CheckOutputs(cipher, in_dir, out_dir, relpaths):
+    for relpath in relpaths:
+        assert (out_dir / relpath).read_bytes() == cipher.EncryptBytes((in_dir / relpath).read_bytes()), relpath
+    assert not [x for x in out_dir.rglob('*') if x.name.endswith(bulk_encrypt.PARTIAL_SUFFIX)]
+
+@pytest.fixture
+def tree(tmp_path):
+    in_dir = tmp_path / 'in'
+    out_dir = tmp_path / 'out'
+    return (in_dir, out_dir, MakeTree(in_dir))
+
+@pytest.mark.parametrize('workers', [1, 2])
+def test_run_and_skip_unchanged(tree, workers):
+    in_dir, out_dir, relpaths = tree
+    cipher = PlayfairCipher()
+    cipher.SetKey('monarchy')
+    # Small batches so the pool gets many tasks
+    totals = bulk_encrypt.RunJob(PlayfairCipher, 'monarchy', str(in_dir), str(out_dir), workers, batch_bytes=4096)
+    assert (totals['files'], totals['skipped'], totals['failed']) == (FILES, 0, 0)
+    CheckOutputs(cipher, in_dir, out_dir, relpaths)
+    done = bulk_encrypt.LoadManifest(str(out_dir / bulk_encrypt.MANIFEST_NAME), bulk_encrypt.JobId(PlayfairCipher, 'monarchy', 'encrypt'))
+    assert sorted(done) == sorted(relpaths)
+
+    totals = bulk_encrypt.RunJob(PlayfairCipher, 'monarchy', str(in_dir), str(out_dir), workers)
+    assert (totals['files'], totals['skipped']) == (0, FILES)
+
+    changed = relpaths[::7]
+    for relpath in changed:
+        with open(in_dir / relpath, 'a') as outfile:
+            outfile.write('changed')
+    totals = bulk_encrypt.RunJob(PlayfairCipher, 'monarchy', str(in_dir), str(out_dir), workers)
+    assert (totals['files'], totals['skipped']) == (len(changed), FILES - len(changed))
+    CheckOutputs(cipher, in_dir, out_dir, relpaths)
+
+def test_resume_after_interrupted_run(tree):
+    in_dir, out_dir, relpaths = tree
+    cipher = VigenreCipher()
+    cipher.SetKey('lemon')
+    bulk_encrypt.RunJob(VigenreCipher, 'lemon', str(in_dir), str(out_dir), 1)
+
+    # Leave the manifest as a run killed part way through a line would,
+    #  with the outputs after it missing and one of them half written
+    manifest_path = out_dir / bulk_encrypt.MANIFEST_NAME
+    lines = manifest_path.read_text().splitlines(True)
+    finished = 15
+    manifest_path.write_text(''.join(lines[:1 + finished]) + lines[1 + finished][:10])
+    for relpath in relpaths[finished:]:
+        (out_dir / relpath).unlink()
+    partial_path = out_dir / (relpaths[finished] + bulk_encrypt.PARTIAL_SUFFIX)
+    partial_path.write_bytes(b'half written')
+
+    totals = bulk_encrypt.RunJob(VigenreCipher, 'lemon', str(in_dir), str(out_dir), 1)
+    assert (totals['files'], totals['skipped'], totals['failed']) == (FILES - finished, finished, 0)
+    assert not partial_path.exists()
+    CheckOutputs(cipher, in_dir, out_dir, relpaths)
+    # The half line was ended so every later line still reads
+    records = manifest_path.read_text().splitlines()
+    assert len(records) == 1 + finished + 1 + FILES - finished
+    assert sorted([json.loads(x)[0] for x in records[1:] if x.startswith('[') and x.endswith(']')]) == sorted(relpaths)
+
+def test_manifest_of_another_job(tree):
+    in_dir, out_dir, relpaths = tree
+    bulk_encrypt.RunJob(VigenreCipher, 'lemon', str(in_dir), str(out_dir), 1)
+    with pytest.raises(ValueError):
+        bulk_encrypt.RunJob(VigenreCipher, 'other', str(in_dir), str(out_dir), 1)
+
+def test_decrypt_round_trip(tree, tmp_path):
+    in_dir, out_dir, relpaths = tree
+    bulk_encrypt.RunJob(VigenreCipher, 'lemon', str(in_dir), str(out_dir), 1, suffix='.enc')
+    back_dir = tmp_path / 'back'
+    totals = bulk_encrypt.RunJob(VigenreCipher, 'lemon', str(out_dir), str(back_dir), 1, command='decrypt')
+    assert totals['files'] == FILES
+    cipher = VigenreCipher()
+    for relpath in relpaths:
+        assert (back_dir / (relpath + '.enc')).read_bytes() == cipher.PrepStringForCipher((in_dir / relpath).read_text()).encode('ascii')
@@ -0,0 +1,91 @@
+from caesar_cipher import CaesarCipher
+from cipher_chain import CipherChain
+from playfair_cipher import PlayfairCipher
+from rail_fence_cipher import CACHED_PERMUTATION_LENGTH, RailFenceCipher
+from vigenre_cipher import VigenreCipher
+import pytest
+import random
+
+################################################################################
+#
+# CipherChain Tests
+#
+# Every chain must give the same output as running its stages one after
+#  the other, whatever its plan fused them into.
+#
+# Run with:
+#   python -m pytest test_cipher_chain.py
+#
+################################################################################
+
+# Stages and keys of each chain, with the kinds of step its plan should have
+CHAINS = [
+    # Shifts fuse into one schedule
+    ([(CaesarCipher, 3), (VigenreCipher, 'lemon'), (CaesarCipher, 5)], ['shift']),
+    # Shifts that cancel out leave nothing
+    ([(CaesarCipher, 3), (CaesarCipher, 23)], []),
+    # Rail Fence stages compose into one permutation
+    ([(RailFenceCipher, 3), (RailFenceCipher, 4), (RailFenceCipher, 2)], ['permute']),
+    # A Caesar shift moves across the reordering
+    ([(VigenreCipher, 'lemon'), (RailFenceCipher, 3), (CaesarCipher, 7)], ['shift', 'permute']),
+    # Playfair keeps the steps around it apart
+    ([(VigenreCipher, 'key'), (RailFenceCipher, 5), (PlayfairCipher, 'monarchy'), (CaesarCipher, 2), (RailFenceCipher, 3)],
+     ['shift', 'permute', 'stage', 'shift', 'permute']),
+]
+
+# Text lengths, including ones past the cached permutation length
+LENGTHS = [0, 1, 2, 7, 101, 1001, CACHED_PERMUTATION_LENGTH, CACHED_PERMUTATION_LENGTH + 1, 3 * CACHED_PERMUTATION_LENGTH + 5]
+
+################################################################################
+#
+# Function: MakeChain
+#
+# Purpose: Builds a chain from a list of (cipher class, key) tuples
+#
+# Input:
+#   stage_keys -- list: (cipher class, key) tuples
+#
+# Output:
+#   chain -- CipherChain
+#
+################################################################################
+def MakeChain(stage_keys):
+    return CipherChain([cipher_class() for cipher_class, key in stage_keys], tuple([key for cipher_class, key in stage_keys]))
+
+################################################################################
+#
+# Function: NaiveTranslate
+#
+# Purpose: Runs text through the stages of a chain one after the other
+#
+# Input:
+#   chain -- CipherChain: Chain whose stages to run
+#   text -- string or bytes: Text to translate
+#   func -- string: 'Encrypt' or 'Decrypt'
+#
+# Output:
+#   Translated text -- the same type as text
+#
+################################################################################
+def NaiveTranslate(chain, text, func):
+    stages = chain.stages if func == 'Encrypt' else reversed(chain.stages)
+    for stage in stages:
+        text = getattr(stage, func)(text)
+    return text
+
+@pytest.mark.parametrize('stage_keys, steps', CHAINS)
+def test_plan(stage_keys, steps):
+    assert [kind for kind, value in MakeChain(stage_keys).plan] == steps
+
+@pytest.mark.parametrize('length', LENGTHS)
+@pytest.mark.parametrize('stage_keys, steps', CHAINS)
+def test_matches_naive(stage_keys, steps, length):
+    rng = random.Random(length)
+    # Symbols outside a-z are dropped by the first stage
+    text = ''.join(rng.choices('abcdefghijklmnopqrstuvwxyzABC ,.', k=length))
+    chain = MakeChain(stage_keys)
+    encrypted = chain.Encrypt(text)
+    assert encrypted == NaiveTranslate(chain, text, 'Encrypt')
+    assert chain.Decrypt(encrypted) == NaiveTranslate(chain, encrypted, 'Decrypt')
+    assert chain.EncryptBytes(text.encode('ascii')) == encrypted.encode('ascii')
+    assert chain.DecryptBytes(encrypted.encode('ascii')) == chain.Decrypt(encrypted).encode('ascii')
@@ -0,0 +1,31 @@
+import ciphers
+import pytest
+
+################################################################################
+#
+# Command Line Tests
+#
+# Run with:
+#   python -m pytest test_ciphers_cli.py
+#
+################################################################################
+
+@pytest.mark.parametrize('paths', [[], ['-', 'out.txt'], ['in.txt'], ['in.txt', '-']])
+def test_workers_need_files(paths):
+    # Pipes run in one process, so more workers would be ignored
+    with pytest.raises(SystemExit):
+        ciphers.ParseArgs(['encrypt', '--cipher', 'caesar', '--key', '3', '--workers', '2'] + paths)
+
+def test_workers_at_least_one():
+    with pytest.raises(SystemExit):
+        ciphers.ParseArgs(['encrypt', 'in.txt', 'out.txt', '--cipher', 'caesar', '--key', '3', '--workers', '0'])
+
+@pytest.mark.parametrize('workers', [1, 2])
+def test_file_round_trip(tmp_path, workers):
+    text = 'Attack at dawn, then retreat! ' * 1000
+    (tmp_path / 'in.txt').write_text(text)
+    paths = [str(tmp_path / x) for x in ('in.txt', 'enc.txt', 'dec.txt')]
+    args = ['--cipher', 'vigenere', '--key', 'lemon', '--workers', str(workers), '--chunk-size', '4096']
+    assert ciphers.Main(['encrypt', paths[0], paths[1]] + args) == 0
+    assert ciphers.Main(['decrypt', paths[1], paths[2]] + args) == 0
+    assert (tmp_path / 'dec.txt').read_text() == text.lower().replace(' ', '').replace(',', '').replace('!', '')
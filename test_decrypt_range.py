@@ -0,0 +1,104 @@
+from caesar_cipher import CaesarCipher
+from playfair_cipher import PlayfairCipher
+from rail_fence_cipher import RailFenceCipher
+from vigenre_cipher import VigenreCipher
+import pytest
+import random
+
+################################################################################
+#
+# DecryptRange Tests
+#
+# Every range must match the same slice of a full Decrypt, whichever way the
+#  ciphertext is handed over.
+#
+# Run with:
+#   python -m pytest test_decrypt_range.py
+#
+################################################################################
+
+# Ciphers and keys.  Vigenre's key length and Rail Fence's cycle of 8 for 5
+#  rails do not divide the text lengths, so windows start part way through
+#  a key or a cycle and the rails are uneven.
+CIPHERS = [(CaesarCipher, 3), (VigenreCipher, 'lemon'), (RailFenceCipher, 1), (RailFenceCipher, 3),
+           (RailFenceCipher, 5), (PlayfairCipher, 'monarchy')]
+
+# Plaintext lengths
+LENGTHS = [0, 1, 2, 13, 101]
+
+################################################################################
+#
+# Function: MakeCipherText
+#
+# Purpose: Encrypts random letters
+#
+# Input:
+#   cipher_class -- class: Cipher to use
+#   key -- Key for the cipher
+#   length -- int: Number of letters
+#
+# Output:
+#   (cipher, ciphertext) -- tuple (CipherInterface, string)
+#
+################################################################################
+def MakeCipherText(cipher_class, key, length):
+    cipher = cipher_class()
+    cipher.SetKey(key)
+    rng = random.Random(length)
+    return (cipher, cipher.Encrypt(''.join(rng.choices('abcdefghijklmnopqrstuvwxyz', k=length))))
+
+################################################################################
+#
+# Function: Ranges
+#
+# Purpose: Lists the ranges to check for a ciphertext length.  Starts at
+#           0, at the end and past it, odd and even, and part way through
+#           the key and rail cycles.
+#
+# Input:
+#   length -- int: Length of the ciphertext
+#
+# Output:
+#   ranges -- list: (start, length) tuples
+#
+################################################################################
+def Ranges(length):
+    starts = sorted(set([0, 1, 2, 3, 4, 5, 7, 8, 9, length // 2, length // 2 + 1, length - 1, length, length + 3]))
+    return [(start, size) for start in starts if start >= 0 for size in (0, 1, 2, 3, 5, 11, length)]
+
+@pytest.mark.parametrize('length', LENGTHS)
+@pytest.mark.parametrize('cipher_class, key', CIPHERS)
+def test_in_memory(cipher_class, key, length):
+    cipher, ciphertext = MakeCipherText(cipher_class, key, length)
+    full = cipher.Decrypt(ciphertext)
+    data = ciphertext.encode('ascii')
+    for start, size in Ranges(len(ciphertext)):
+        expected = full[start:start + size]
+        assert cipher.DecryptRange(ciphertext, start, size) == expected, (start, size)
+        assert cipher.DecryptRange(data, start, size) == expected.encode('ascii'), (start, size)
+        assert cipher.DecryptRange(bytearray(data), start, size) == expected.encode('ascii'), (start, size)
+        assert cipher.DecryptRange(memoryview(data), start, size) == expected.encode('ascii'), (start, size)
+        end = min(start + size, len(ciphertext))
+        if start < end:
+            assert cipher.DecryptWindow(ciphertext, start, end) == expected, (start, end)
+
+@pytest.mark.parametrize('length', LENGTHS)
+@pytest.mark.parametrize('cipher_class, key', CIPHERS)
+def test_file(tmp_path, cipher_class, key, length):
+    cipher, ciphertext = MakeCipherText(cipher_class, key, length)
+    full = cipher.Decrypt(ciphertext).encode('ascii')
+    path = tmp_path / 'ciphertext'
+    path.write_bytes(ciphertext.encode('ascii'))
+    with open(path, 'rb') as infile:
+        for start, size in Ranges(len(ciphertext)):
+            expected = full[start:start + size]
+            assert cipher.DecryptFileRange(str(path), start, size) == expected, (start, size)
+            # An open file is mapped the same way
+            assert cipher.DecryptRange(infile, start, size) == expected, (start, size)
+
+def test_negative_range():
+    cipher, ciphertext = MakeCipherText(VigenreCipher, 'lemon', 20)
+    with pytest.raises(ValueError):
+        cipher.DecryptRange(ciphertext, -1, 5)
+    with pytest.raises(ValueError):
+        cipher.DecryptRange(ciphertext, 2, -5)
@@ -0,0 +1,46 @@
+from playfair_cipher import PlayfairCipher
+import playfair_search
+import pytest
+import random
+
+################################################################################
+#
+# Playfair Key Search Tests
+#
+# Run with:
+#   python -m pytest test_playfair_search.py
+#
+################################################################################
+
+# English-like sample for the quadgram table and the plaintext
+SAMPLE = ('it was the best of times it was the worst of times it was the age of wisdom it was the age of '
+          'foolishness it was the epoch of belief it was the epoch of incredulity it was the season of light ')
+
+@pytest.mark.parametrize('seed', range(5))
+def test_moves_match_full_decryption(seed):
+    # After any run of moves and undos the pairs and score must be what
+    #  decrypting and scoring from scratch gives
+    rng = random.Random(seed)
+    quadgrams = playfair_search.BuildQuadgrams(SAMPLE * 20)
+    cipher = PlayfairCipher()
+    cipher.SetKey('monarchy')
+    climber = playfair_search.Climber(cipher.Encrypt(SAMPLE * 2), quadgrams)
+    letters = list(playfair_search.TABLE_LETTERS)
+    rng.shuffle(letters)
+    table = playfair_search.KeyTable(''.join(letters))
+    climber.SetTable(table)
+    for i in range(500):
+        move = rng.random()
+        if move < 0.1:
+            swaps = table.RowSwaps(*rng.sample(range(5), 2))
+        elif move < 0.2:
+            swaps = table.ColumnSwaps(*rng.sample(range(5), 2))
+        else:
+            swaps = [rng.sample(range(25), 2)]
+        undo = climber.Move(swaps)
+        if rng.random() < 0.5:
+            climber.Undo(undo)
+        pairs, score = list(climber.pairs), climber.score
+        climber.SetTable(table)
+        assert pairs == climber.pairs
+        assert score == pytest.approx(climber.score)
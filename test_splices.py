@@ -0,0 +1,136 @@
+from playfair_cipher import PlayfairCipher
+from rail_fence_cipher import RailFenceCipher
+from vigenre_cipher import VigenreCipher
+import playfair_cipher
+import pytest
+import random
+
+################################################################################
+#
+# Splice Tests
+#
+# Applies random edits to encrypted documents with EncryptSplices and checks
+#  the ciphertext against encrypting the whole edited document after every
+#  edit.
+#
+# Run with:
+#   python -m pytest test_splices.py
+#
+################################################################################
+
+# Edits applied to each document
+EDITS = 300
+
+################################################################################
+#
+# Function: MakeEdit
+#
+# Purpose: Picks a random insert, delete or replace.  Edits are drawn to
+#           land on both sides of pair boundaries and at the end of the
+#           document, and often repeat the letter next to them to make or
+#           split doubled letters.
+#
+# Input:
+#   rng -- random.Random: Source of the edit
+#   plaintext -- bytearray: Normalized letters of the document
+#   symbols -- string: Letters new text is made of
+#
+# Output:
+#   (start, end, text) -- tuple (int, int, string): The splice
+#
+################################################################################
+def MakeEdit(rng, plaintext, symbols):
+    length = len(plaintext)
+    if length and rng.random() < 0.2:
+        # Near the end, where an odd length gets padded
+        start = rng.randint(max(length - 3, 0), length)
+    else:
+        start = rng.randint(0, length)
+    kind = rng.choice(['insert', 'delete', 'replace'])
+    end = start if kind == 'insert' else min(start + rng.randint(1, 4), length)
+    if kind == 'delete':
+        return (start, end, '')
+    text = ''.join(rng.choices(symbols, k=rng.randint(1, 5)))
+    neighbours = plaintext[start - 1:start] + plaintext[end:end + 1]
+    if neighbours and rng.random() < 0.5:
+        # Doubles a letter next to the edit
+        text = chr(rng.choice(neighbours)) * rng.randint(1, 2)
+    return (start, end, text)
+
+################################################################################
+#
+# Function: CheckEdits
+#
+# Purpose: Applies random edits to an encrypted document one at a time and
+#           compares the ciphertext with a full EncryptBytes after each
+#
+# Input:
+#   cipher -- CipherInterface: Keyed cipher
+#   seed -- int: Seed for the document and the edits
+#   symbols -- string: Letters the document and edits are made of
+#
+# Output:
+#   None
+#
+################################################################################
+def CheckEdits(cipher, seed, symbols):
+    rng = random.Random(seed)
+    plaintext = bytearray(''.join(rng.choices(symbols, k=rng.randint(0, 120))).encode('ascii'))
+    ciphertext = bytearray(cipher.EncryptBytes(plaintext))
+    index = cipher.SpliceIndex(plaintext)
+    for i in range(EDITS):
+        splice = MakeEdit(rng, plaintext, symbols)
+        cipher.EncryptSplices(plaintext, ciphertext, [splice], index)
+        assert bytes(ciphertext) == cipher.EncryptBytes(plaintext), (seed, i, splice)
+
+@pytest.fixture
+def small_splice_index(monkeypatch):
+    # A short spacing and window make every edit cross indexed boundaries
+    #  and grow the window
+    monkeypatch.setattr(playfair_cipher, 'SPLICE_INDEX_SPACING', 8)
+    monkeypatch.setattr(playfair_cipher, 'SPLICE_WINDOW', 2)
+    monkeypatch.setattr(playfair_cipher, 'SPLICE_MAX_WINDOW', 32)
+
+@pytest.mark.parametrize('symbols', ['abx', 'abcdefghiklmnopqrstuvwxyz'])
+@pytest.mark.parametrize('seed', range(10))
+def test_playfair(small_splice_index, seed, symbols):
+    cipher = PlayfairCipher()
+    cipher.SetKey('monarchy')
+    CheckEdits(cipher, seed, symbols)
+
+@pytest.mark.parametrize('seed', range(10))
+def test_playfair_index(small_splice_index, seed):
+    # Every indexed boundary must still be a pair boundary of the edited
+    #  document, so the text before it encrypts to the ciphertext before it
+    rng = random.Random(seed)
+    cipher = PlayfairCipher()
+    cipher.SetKey('playfair')
+    plaintext = bytearray(''.join(rng.choices('abx', k=80)).encode('ascii'))
+    ciphertext = bytearray(cipher.EncryptBytes(plaintext))
+    index = cipher.SpliceIndex(plaintext)
+    for i in range(EDITS):
+        cipher.EncryptSplices(plaintext, ciphertext, [MakeEdit(rng, plaintext, 'abx')], index)
+        for position, cipher_position in index:
+            assert cipher.EncryptBytes(plaintext[:position]) == ciphertext[:cipher_position]
+
+@pytest.mark.parametrize('seed', range(10))
+def test_vigenre(seed):
+    # Most edits change the length by something other than a multiple of
+    #  the key length, so the tail is reencrypted
+    cipher = VigenreCipher()
+    cipher.SetKey('lemon')
+    CheckEdits(cipher, seed, 'abcdefghijklmnopqrstuvwxyz')
+
+@pytest.mark.parametrize('num_rails', [1, 2, 3, 7])
+@pytest.mark.parametrize('seed', range(5))
+def test_rail_fence(seed, num_rails):
+    cipher = RailFenceCipher()
+    cipher.SetKey(num_rails)
+    CheckEdits(cipher, seed, 'abcdefghijklmnopqrstuvwxyz')
+
+def test_splice_outside_document():
+    cipher = VigenreCipher()
+    cipher.SetKey('lemon')
+    plaintext = bytearray(b'hello')
+    with pytest.raises(ValueError):
+        cipher.EncryptSplices(plaintext, bytearray(cipher.EncryptBytes(plaintext)), [(3, 9, 'x')])
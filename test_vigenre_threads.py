@@ -0,0 +1,55 @@
+from vigenre_cipher import VigenreCipher
+import random
+import threading
+
+################################################################################
+#
+# Vigenre Thread Tests
+#
+# One VigenreCipher is shared by many threads.  Every thread mixes one shot
+#  calls and streams of different lengths and checks each result against a
+#  private instance.
+#
+# Run with:
+#   python -m pytest test_vigenre_threads.py
+#
+################################################################################
+
+# Number of threads sharing the cipher
+THREADS = 16
+
+# Calls made by each thread
+ROUNDS = 200
+
+# Symbols the random texts are made of, including ones the cipher drops
+TEXT_SYMBOLS = 'abcdefghijklmnopqrstuvwxyzABCXYZ ,.'
+
+def test_shared_cipher():
+    shared = VigenreCipher()
+    shared.SetKey('concurrency')
+    mismatches = []
+
+    def Work(seed):
+        rng = random.Random(seed)
+        private = VigenreCipher()
+        private.SetKey('concurrency')
+        try:
+            for i in range(ROUNDS):
+                text = ''.join(rng.choices(TEXT_SYMBOLS, k=rng.randint(1, 3000)))
+                expected = private.Encrypt(text)
+                chunks = [text[x:x + 97] for x in range(0, len(text), 97)]
+                if shared.Encrypt(text) != expected or ''.join(shared.EncryptStream(chunks)) != expected:
+                    mismatches.append((seed, i, 'encrypt'))
+                decrypted = private.Decrypt(expected)
+                if shared.Decrypt(expected) != decrypted or ''.join(shared.DecryptStream([expected])) != decrypted:
+                    mismatches.append((seed, i, 'decrypt'))
+        # An exception in a thread would otherwise only be printed
+        except Exception as e:
+            mismatches.append((seed, repr(e)))
+
+    workers = [threading.Thread(target=Work, args=(x,)) for x in range(THREADS)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    assert mismatches == []
@@ -0,0 +1,220 @@
+from string import ascii_lowercase
+
+################################################################################
+#
+# TextNormalizer
+#
+# Turns any text into the letters the ciphers work on, lowercase a-z unless
+#  told otherwise.  All of the work is done by bytes.translate so stripping,
+#  lowering and merging letters is a single pass in C.
+#
+################################################################################
+class TextNormalizer:
+    ############################################################################
+    #
+    # Function: __init__
+    #
+    # Purpose: Builds the translation and deletion tables
+    #
+    # Input:
+    #   merges -- dict: Letters to replace with another letter, e.g.
+    #                    {'j': 'i'} for Playfair.  Applies to both cases.
+    #   letters -- string: Ascii chars that are kept.  When none of them are
+    #                       uppercase, uppercase text is lowered to match.
+    #   keep_others -- bool: Leave every char that is not one of letters in
+    #                         place instead of stripping it
+    #
+    # Output:
+    #   None
+    #
+    ############################################################################
+    def __init__(self, merges=None, letters=ascii_lowercase, keep_others=False):
+        self.merges = dict(merges or {})
+        self.letters = letters
+        self.keep_others = keep_others
+        # Only alphabets without uppercase letters fold case
+        self.folds_case = letters == letters.lower()
+        table = bytearray(range(256))
+        delete = []
+        for x in range(256):
+            normalized = self.NormalizeChar(chr(x))
+            if normalized is None:
+                delete.append(x)
+            else:
+                table[x] = ord(normalized)
+        self.table = bytes(table)
+        # Every byte that is not one of the letters
+        self.delete = b'' if keep_others else bytes(delete)
+        # Same but keeps NUL, which separates messages in NormalizeMany
+        self.delete_keep_nul = self.delete.replace(b'\0', b'')
+        # Maps translation table -> that table applied after self.table
+        self.composed_tables = {}
+
+    ############################################################################
+    #
+    # Function: NormalizeChar
+    #
+    # Purpose: Works out what a single char becomes.  Only used to build
+    #           the tables.
+    #
+    # Input:
+    #   char -- char: Char to be normalized
+    #
+    # Output:
+    #   char -- char: One of letters, or None if the char is not a letter
+    #
+    ############################################################################
+    def NormalizeChar(self, char):
+        if char in self.merges:
+            return self.merges[char]
+        if char in self.letters:
+            return char
+        if self.folds_case and char.lower() != char:
+            return self.NormalizeChar(char.lower())
+        return None
+
+    ############################################################################
+    #
+    # Function: ComposeTable
+    #
+    # Purpose: Folds a translation table for normalized letters into the
+    #           normalization table so both run in one pass.  Results are
+    #           cached per table.
+    #
+    # Input:
+    #   table -- bytes: 256 byte table that maps letters to the cipher's
+    #                    output
+    #
+    # Output:
+    #   composed -- bytes: 256 byte table that takes raw text to the output
+    #
+    ############################################################################
+    def ComposeTable(self, table):
+        if table not in self.composed_tables:
+            self.composed_tables[table] = bytes([table[x] for x in self.table])
+        return self.composed_tables[table]
+
+    ############################################################################
+    #
+    # Function: TranslateBytes
+    #
+    # Purpose: Strips nonalpha bytes from ascii data and maps what is left
+    #           through table.  Bytes outside of ascii count as nonalpha.
+    #           With keep_others nothing is stripped.
+    #
+    # Input:
+    #   data -- bytes: Ascii data, a bytearray, memoryview or anything else
+    #                   with the buffer protocol
+    #   table -- bytes: Table from ComposeTable, or None to just normalize
+    #   keep_nul -- bool: Leave NUL bytes in place
+    #
+    # Output:
+    #   data -- bytes
+    #
+    ############################################################################
+    def TranslateBytes(self, data, table=None, keep_nul=False):
+        table = self.table if table is None else self.ComposeTable(table)
+        # Other buffers are copied once so the result is always bytes
+        if not isinstance(data, bytes):
+            data = bytes(data)
+        return data.translate(table, self.delete_keep_nul if keep_nul else self.delete)
+
+    ############################################################################
+    #
+    # Function: Translate
+    #
+    # Purpose: Normalizes text and maps the letters through table in the
+    #           same pass
+    #
+    # Input:
+    #   text -- string: Text to be translated.  Anything else goes to
+    #                    TranslateBytes
+    #   table -- bytes: 256 byte table for normalized letters, or None to
+    #                    just normalize
+    #   keep_nul -- bool: Leave NUL chars in place
+    #
+    # Output:
+    #   text -- string: Only the chars table maps the letters to, plus the
+    #                    other chars with keep_others
+    #
+    ############################################################################
+    def Translate(self, text, table=None, keep_nul=False):
+        if not isinstance(text, str):
+            return self.TranslateBytes(text, table, keep_nul)
+        # Ascii text goes straight to bytes.  Anything else is lowered first
+        #  so letters like the Kelvin sign become ascii, the rest is dropped
+        if not text.isascii():
+            if self.keep_others:
+                # Multibyte chars are never letters so they pass through
+                #  the tables untouched
+                return self.TranslateBytes(text.encode('utf-8'), table, keep_nul).decode('utf-8')
+            if self.folds_case:
+                text = text.lower()
+        return self.TranslateBytes(text.encode('ascii', 'ignore'), table, keep_nul).decode('ascii')
+
+    ############################################################################
+    #
+    # Function: Normalize
+    #
+    # Purpose: Lowercases text, applies the merges and strips everything
+    #           that is not a letter
+    #
+    # Input:
+    #   text -- string: Text to be normalized
+    #
+    # Output:
+    #   text -- string: a-z only
+    #
+    ############################################################################
+    def Normalize(self, text):
+        return self.Translate(text)
+
+    ############################################################################
+    #
+    # Function: TranslateMany
+    #
+    # Purpose: Translates a list of messages in a single pass by joining them
+    #           with NUL chars that the translation keeps
+    #
+    # Input:
+    #   messages -- list: Strings to be translated
+    #   table -- bytes: 256 byte table for normalized letters, or None to
+    #                    just normalize
+    #
+    # Output:
+    #   Translated messages -- list
+    #
+    ############################################################################
+    def TranslateMany(self, messages, table=None):
+        if not messages:
+            return []
+        joined = '\0'.join(messages)
+        # A NUL inside a message would split it, do those one at a time
+        if joined.count('\0') != len(messages) - 1:
+            return [self.Translate(x, table) for x in messages]
+        return self.Translate(joined, table, True).split('\0')
+
+    ############################################################################
+    #
+    # Function: NormalizeMany
+    #
+    # Purpose: Normalizes a list of messages in a single pass
+    #
+    # Input:
+    #   messages -- list: Strings to be normalized
+    #
+    # Output:
+    #   Normalized messages -- list
+    #
+    ############################################################################
+    def NormalizeMany(self, messages):
+        return self.TranslateMany(messages)
+
+################################################################################
+#
+# end TextNormalizer
+#
+################################################################################
+
+# Plain a-z, used by most ciphers
+LETTERS = TextNormalizer()
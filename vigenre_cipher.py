@@ -1,4 +1,5 @@
-from cipher_interface import CipherInterface
+from cipher_interface import CipherInterface, ReadWindow
+import numpy_backend
 ################################################################################
 #
 # Vigenre Cipher
@@ -9,8 +10,10 @@ class VigenreCipher(CipherInterface):
     #
     # Function: SetKey
     #
-    # Purpose: Sets the key property for the class as well the the loc_in_key
-    #           property and reset key loc
+    # Purpose: Sets the key property for the class and the amount each
+    #           letter of the key shifts by.  Nothing else is kept on the
+    #           instance, the position in the key is local to each call, so
+    #           one instance can be used from many threads at once.
     #
     # Input:
     #  key  -- string: Key for cipher
@@ -20,9 +23,14 @@ class VigenreCipher(CipherInterface):
     #
     ############################################################################
     def SetKey(self, key):
-        self.key = self.PrepStringForCipher(key)
-        self.loc_in_key = 0
-        self.reset_key_loc = False
+        key = self.PrepStringForCipher(key)
+        if self.alphabet.pass_through:
+            # Only the symbols of the key shift
+            key = self.alphabet.Letters(key.encode('utf-8')).decode('ascii')
+        self.key = key
+        if not self.key:
+            raise ValueError('Vigenere key needs at least one letter')
+        self.key_shifts = [self.alphabet.indexes[x] for x in self.key.encode('ascii')]
 
     ############################################################################
     #
@@ -32,47 +40,39 @@ class VigenreCipher(CipherInterface):
     #
     # Input:
     #   plaintext -- char: Letter to be encrypted
-    #   key -- char: Letter from key to be used in encryption
+    #   loc_in_key -- int: Position of the letter in the keystream
     #
     # Output:
     #   Returns the encrypted letter
     #
     ############################################################################
-    def EncryptLetter(self, plaintext):
-        if self.reset_key_loc:
-            self.loc_in_key = 0
-            self.reset_key_loc = False
-        # a = ord(plaintext) - 97 normalizes value
-        # b = ord(self.key[self.loc_in_key]) - 97 normalizes that value
+    def EncryptLetter(self, plaintext, loc_in_key):
+        # a = the index of plaintext in the alphabet
+        # b = the shift of the key letter at loc_in_key
         # c = a + b gives us our offset
-        # d = c % 26 to catch overflow
-        # e = d + 97 puts value back into lowercase ascii range
-        encrypted = chr((((ord(plaintext) - 97) + (ord(self.key[self.loc_in_key]) - 97)) % 26) + 97)
-        self.loc_in_key = (self.loc_in_key + 1) % len(self.key)
-        return encrypted
+        # d = c % size to catch overflow
+        # e = the symbol at d
+        alphabet = self.alphabet
+        return chr(alphabet.chars[(alphabet.indexes[ord(plaintext)] + self.key_shifts[loc_in_key % len(self.key_shifts)]) % alphabet.size])
 
     ############################################################################
     #
     # Function: DecryptLetter
     #
-    # Purpose: Encrypts the letter wth its matching letter from the key
+    # Purpose: Decrypts the letter wth its matching letter from the key
     #
     # Input:
-    #   plaintext -- char: Letter to be encrypted
-    #   key -- char: Letter from key to be used in encryption
+    #   ciphertext -- char: Letter to be decrypted
+    #   loc_in_key -- int: Position of the letter in the keystream
     #
     # Output:
-    #   Returns the encrypted letter
+    #   Returns the decrypted letter
     #
     ############################################################################
-    def DecryptLetter(self, plaintext):
-        if self.reset_key_loc:
-            self.loc_in_key = 0
-            self.reset_key_loc = False
-        decrypted = chr((ord(plaintext) - 97) - (ord(self.key[self.loc_in_key]) - 97) + 97) if (ord(plaintext) - 97) - (ord(self.key[self.loc_in_key]) - 97) >=0 else chr((ord(plaintext) - 97) - (ord(self.key[self.loc_in_key]) - 97) + 26 + 97)
-        self.loc_in_key = (self.loc_in_key + 1) % len(self.key)
-        return decrypted
-    
+    def DecryptLetter(self, ciphertext, loc_in_key):
+        alphabet = self.alphabet
+        return chr(alphabet.chars[(alphabet.indexes[ord(ciphertext)] - self.key_shifts[loc_in_key % len(self.key_shifts)]) % alphabet.size])
+
     ############################################################################
     #
     # Function: Encrypt
@@ -80,15 +80,29 @@ class VigenreCipher(CipherInterface):
     # Purpose: Encrypts the inputted plain text
     #
     # Input:
-    #   plaintext -- string: Text to be encrypted
+    #   plaintext -- string: Text to be encrypted.  bytes, bytearray and
+    #                         memoryview go through EncryptBytes
     #
     # Output:
     #   Returns encrypted version of plaintext
     #
     ############################################################################
     def Encrypt(self, plaintext):
-        encrypted = ''.join([self.EncryptLetter(x) for x in self.PrepStringForCipher(plaintext)])
-        self.reset_key_loc = True
+        if not isinstance(plaintext, str):
+            return self.EncryptBytes(plaintext)
+        timer = self.StartTimer('encrypt')
+        letters = self.PrepStringForCipher(plaintext)
+        if timer:
+            timer.Stage('normalize')
+        if self.UseNumpy():
+            encrypted = numpy_backend.Shift(letters, self.key_shifts)
+        else:
+            # Every call starts at the top of the key and keeps no state, so
+            #  one instance can be shared between threads
+            encrypted = self.ShiftText(letters.encode(self.alphabet.encoding), 0)[0].decode(self.alphabet.encoding)
+        if timer:
+            timer.Stage('numpy' if self.UseNumpy() else 'shift')
+            timer.Done(chars_in=len(plaintext), chars_out=len(encrypted))
         return encrypted
 
     ############################################################################
@@ -98,16 +112,371 @@ class VigenreCipher(CipherInterface):
     # Purpose: Decrypt the inputted cipher text
     #
     # Input:
-    #   plaintext -- string: Text to be decrypted
+    #   plaintext -- string: Text to be decrypted.  bytes, bytearray and
+    #                         memoryview go through DecryptBytes
     #
     # Output:
     #   Returns decrypted version of ciphertext
     #
     ############################################################################
     def Decrypt(self, ciphertext):
-        decrypted = ''.join([self.DecryptLetter(x) for x in self.PrepStringForCipher(ciphertext)])
-        self.reset_key_loc = True
+        if not isinstance(ciphertext, str):
+            return self.DecryptBytes(ciphertext)
+        timer = self.StartTimer('decrypt')
+        letters = self.PrepStringForCipher(ciphertext)
+        if timer:
+            timer.Stage('normalize')
+        if self.UseNumpy():
+            decrypted = numpy_backend.Shift(letters, [-x for x in self.key_shifts])
+        else:
+            # Every call starts at the top of the key and keeps no state, so
+            #  one instance can be shared between threads
+            decrypted = self.ShiftText(letters.encode(self.alphabet.encoding), 1)[0].decode(self.alphabet.encoding)
+        if timer:
+            timer.Stage('numpy' if self.UseNumpy() else 'shift')
+            timer.Done(chars_in=len(ciphertext), chars_out=len(decrypted))
         return decrypted
+
+    ############################################################################
+    #
+    # Function: ParallelAlignment
+    #
+    # Purpose: Pieces that start on a multiple of the key length start at
+    #           the top of the key.  Pass through text can not be split
+    #           since the other chars do not move the key.
+    #
+    # Input:
+    #   None
+    #
+    # Output:
+    #   alignment -- int: The key length, or None
+    #
+    ############################################################################
+    def ParallelAlignment(self):
+        if self.alphabet.pass_through:
+            return None
+        return len(self.key)
+
+    ############################################################################
+    #
+    # Function: RangeAlignment
+    #
+    # Purpose: A range can start anywhere, the key picks up at start modulo
+    #           the key length.  In pass through text the other chars do
+    #           not move the key so everything before start is needed.
+    #
+    # Input:
+    #   None
+    #
+    # Output:
+    #   alignment -- int: 1, or None with a pass through alphabet
+    #
+    ############################################################################
+    def RangeAlignment(self):
+        if self.alphabet.pass_through:
+            return None
+        return 1
+
+    ############################################################################
+    #
+    # Function: DecryptWindow
+    #
+    # Purpose: Decrypts only the chars of the window, starting part way
+    #           into the key
+    #
+    # Input:
+    #   ciphertext -- string, bytes or mmap: Ciphertext as Encrypt returned
+    #                  it
+    #   start -- int: First position wanted
+    #   end -- int: Position after the last one wanted
+    #
+    # Output:
+    #   Decrypted window -- string for string input, otherwise bytes
+    #
+    ############################################################################
+    def DecryptWindow(self, ciphertext, start, end):
+        if self.alphabet.pass_through:
+            return CipherInterface.DecryptWindow(self, ciphertext, start, end)
+        window = ReadWindow(ciphertext, start, end)
+        offset = start % len(self.key_shifts)
+        if isinstance(window, str):
+            return self.ShiftBytes(window.encode('ascii'), 1, offset).decode('ascii')
+        return self.ShiftBytes(window, 1, offset)
+
+    ############################################################################
+    #
+    # Function: EncryptSplice
+    #
+    # Purpose: Encrypts the new letters starting at start modulo the key
+    #           length.  When the edit changes the length by something
+    #           other than a multiple of the key length, every letter after
+    #           it moves to another key letter and is reencrypted too.
+    #
+    # Input:
+    #   plaintext -- bytearray: Normalized letters, updated in place
+    #   ciphertext -- bytearray: Encrypted letters, updated in place
+    #   start -- int: First letter replaced
+    #   end -- int: Letter after the last one replaced
+    #   letters -- bytes: Normalized letters put in their place
+    #   index -- Not used
+    #
+    # Output:
+    #   None
+    #
+    ############################################################################
+    def EncryptSplice(self, plaintext, ciphertext, start, end, letters, index):
+        # Other chars in pass through text do not move the key
+        if self.alphabet.pass_through:
+            return CipherInterface.EncryptSplice(self, plaintext, ciphertext, start, end, letters, index)
+        period = len(self.key_shifts)
+        plaintext[start:end] = letters
+        if (len(letters) - (end - start)) % period == 0:
+            ciphertext[start:end] = self.ShiftBytes(letters, 0, start % period)
+        else:
+            ciphertext[start:] = self.ShiftBytes(bytes(plaintext[start:]), 0, start % period)
+
+    ############################################################################
+    #
+    # Function: KeySchedule
+    #
+    # Purpose: Letters are shifted by the key letters in turn.  Other chars
+    #           in pass through text do not move the key, so that is not a
+    #           plain schedule.
+    #
+    # Input:
+    #   None
+    #
+    # Output:
+    #   shifts -- list: Shift of each key letter, or None
+    #
+    ############################################################################
+    def KeySchedule(self):
+        if self.alphabet.pass_through:
+            return None
+        return list(self.key_shifts)
+
+    ############################################################################
+    #
+    # Function: ShiftBytes
+    #
+    # Purpose: Shifts normalized letters by the key.  Each position in the
+    #           key is one Caesar translation over a strided slice so the
+    #           work is done in len(key) passes in C.
+    #
+    # Input:
+    #   letters -- bytes: Normalized letters, NUL bytes are left alone
+    #   direction -- int: 0 to encrypt, 1 to decrypt
+    #   offset -- int: Position in the keystream of the first letter
+    #
+    # Output:
+    #   Shifted letters -- bytes
+    #
+    ############################################################################
+    def ShiftBytes(self, letters, direction, offset=0):
+        period = len(self.key_shifts)
+        shift_tables = self.alphabet.ShiftTables
+        shifted = bytearray(letters)
+        for loc in range(period):
+            shift = self.key_shifts[(loc + offset) % period]
+            shifted[loc::period] = letters[loc::period].translate(shift_tables(shift)[direction])
+        return bytes(shifted)
+
+    ############################################################################
+    #
+    # Function: ShiftText
+    #
+    # Purpose: Shifts normalized text by the key.  With a pass through
+    #           alphabet only the symbols move through the key, they are
+    #           pulled out, shifted and put back around the other chars.
+    #
+    # Input:
+    #   data -- bytes: Normalized text
+    #   direction -- int: 0 to encrypt, 1 to decrypt
+    #   offset -- int: Position in the keystream of the first symbol
+    #
+    # Output:
+    #   (shifted, count) -- tuple (bytes, int): The shifted text and the
+    #                        number of symbols in it
+    #
+    ############################################################################
+    def ShiftText(self, data, direction, offset=0):
+        if not self.alphabet.pass_through:
+            return (self.ShiftBytes(data, direction, offset), len(data))
+        letters = self.alphabet.Letters(data)
+        return (self.alphabet.Scatter(data, self.ShiftBytes(letters, direction, offset)), len(letters))
+
+    ############################################################################
+    #
+    # Function: EncryptBytes
+    #
+    # Purpose: Encrypts ascii data without going through str
+    #
+    # Input:
+    #   data -- bytes, bytearray or memoryview: Data to be encrypted
+    #
+    # Output:
+    #   Encrypted data -- bytes
+    #
+    ############################################################################
+    def EncryptBytes(self, data):
+        timer = self.StartTimer('encrypt_bytes')
+        letters = self.normalizer.TranslateBytes(data)
+        if timer:
+            timer.Stage('normalize')
+        encrypted = self.ShiftText(letters, 0)[0]
+        if timer:
+            timer.Stage('shift')
+            timer.Done(chars_in=len(data), chars_out=len(encrypted))
+        return encrypted
+
+    ############################################################################
+    #
+    # Function: DecryptBytes
+    #
+    # Purpose: Decrypts ascii data without going through str
+    #
+    # Input:
+    #   data -- bytes, bytearray or memoryview: Data to be decrypted
+    #
+    # Output:
+    #   Decrypted data -- bytes
+    #
+    ############################################################################
+    def DecryptBytes(self, data):
+        timer = self.StartTimer('decrypt_bytes')
+        letters = self.normalizer.TranslateBytes(data)
+        if timer:
+            timer.Stage('normalize')
+        decrypted = self.ShiftText(letters, 1)[0]
+        if timer:
+            timer.Stage('shift')
+            timer.Done(chars_in=len(data), chars_out=len(decrypted))
+        return decrypted
+
+    ############################################################################
+    #
+    # Function: TranslateBatch
+    #
+    # Purpose: Translates a list of messages in bulk.  Every message is
+    #           padded out to a multiple of the key length so they all start
+    #           at the top of the key, then the whole batch is shifted at
+    #           once.
+    #
+    # Input:
+    #   messages -- list: Strings to be translated
+    #   direction -- int: 0 to encrypt, 1 to decrypt
+    #
+    # Output:
+    #   Translated messages -- list
+    #
+    ############################################################################
+    def TranslateBatch(self, messages, direction):
+        # The NUL padding would be left in place around the other chars
+        if self.alphabet.pass_through:
+            return [self.ShiftText(x.encode('utf-8'), direction)[0].decode('utf-8') for x in self.normalizer.NormalizeMany(messages)]
+        # Normalizes every message in one pass
+        prepped = self.normalizer.NormalizeMany(messages)
+        period = len(self.key_shifts)
+        padded = ''.join([x + '\0' * (-len(x) % period) for x in prepped]).encode('ascii')
+        letters = self.ShiftBytes(padded, direction).decode('ascii')
+
+        results = []
+        start = 0
+        for message in prepped:
+            results.append(letters[start:start + len(message)])
+            start += len(message) + (-len(message) % period)
+        return results
+
+    ############################################################################
+    #
+    # Function: EncryptBatch
+    #
+    # Purpose: Encrypts a list of messages in bulk
+    #
+    # Input:
+    #   messages -- list: Strings to be encrypted
+    #
+    # Output:
+    #   Encrypted messages -- list
+    #
+    ############################################################################
+    def EncryptBatch(self, messages):
+        return self.TranslateBatch(messages, 0)
+
+    ############################################################################
+    #
+    # Function: DecryptBatch
+    #
+    # Purpose: Decrypts a list of messages in bulk
+    #
+    # Input:
+    #   messages -- list: Strings to be decrypted
+    #
+    # Output:
+    #   Decrypted messages -- list
+    #
+    ############################################################################
+    def DecryptBatch(self, messages):
+        return self.TranslateBatch(messages, 1)
+
+    ############################################################################
+    #
+    # Function: StreamLetters
+    #
+    # Purpose: Shifts every chunk by the key.  The position in the key is
+    #           carried from one chunk to the next in the generator so the
+    #           output matches a single call over the whole text, and other
+    #           calls on the instance do not disturb it.
+    #
+    # Input:
+    #   chunks -- iterable: Strings to be translated
+    #   direction -- int: 0 to encrypt, 1 to decrypt
+    #
+    # Output:
+    #   Yields translated text -- string
+    #
+    ############################################################################
+    def StreamLetters(self, chunks, direction):
+        loc_in_key = 0
+        encoding = self.alphabet.encoding
+        for chunk in chunks:
+            letters = self.PrepStringForCipher(chunk).encode(encoding)
+            if letters:
+                shifted, count = self.ShiftText(letters, direction, loc_in_key)
+                yield shifted.decode(encoding)
+                loc_in_key = (loc_in_key + count) % len(self.key_shifts)
+
+    ############################################################################
+    #
+    # Function: EncryptStream
+    #
+    # Purpose: Encrypts text that arrives in chunks
+    #
+    # Input:
+    #   chunks -- iterable: Strings to be encrypted
+    #
+    # Output:
+    #   Yields encrypted text -- string
+    #
+    ############################################################################
+    def EncryptStream(self, chunks):
+        return self.StreamLetters(chunks, 0)
+
+    ############################################################################
+    #
+    # Function: DecryptStream
+    #
+    # Purpose: Decrypts text that arrives in chunks
+    #
+    # Input:
+    #   chunks -- iterable: Strings to be decrypted
+    #
+    # Output:
+    #   Yields decrypted text -- string
+    #
+    ############################################################################
+    def DecryptStream(self, chunks):
+        return self.StreamLetters(chunks, 1)
         
 ################################################################################
 #